@@ -0,0 +1,170 @@
+import logging
+import selectors
+import socket
+import threading
+import time
+from typing import *
+
+import transport
+import utils
+
+
+class _Pending:
+
+    def __init__(self, args: tuple, process: Optional[Any] = None) -> None:
+        """
+        Create a game that waits for its client to connect.
+
+            Parameters:
+                args (tuple):       The arguments to hand to the connect callback with the connection.
+                process (Process):  The process of the client, default None.
+        """
+        self.args = args
+        self.process = process
+        self.created = time.monotonic()
+
+
+class Acceptor(threading.Thread):
+
+    def __init__(self, listeners: List[socket.socket], on_connect: Callable[..., None], timeout: float = 30) -> None:
+        """
+        Create a thread that accepts the connections of the clients and matches them to their pending games.
+        A client identifies itself by sending its id as the first message after it connected.
+
+            Parameters:
+                listeners (list):       The listening sockets to accept on.
+                on_connect (callable):  Called as on_connect(conn, client_id, *args) for every matched connection.
+                timeout (float):        Seconds a game waits for its client, and a connection for its id, default 30.
+        """
+        super().__init__(daemon=True)
+        self.listeners = listeners
+        self.on_connect = on_connect
+        self.timeout = timeout
+        self.selector = selectors.DefaultSelector()
+        self.pending = {}  # client id -> _Pending
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.logger = logging.getLogger('Acceptor')
+
+    def expect(self, client_id: int, args: tuple, process: Optional[Any] = None) -> None:
+        """
+        Register a game that waits for its client, returns right away.
+
+            Parameters:
+                client_id (int):    The id the client will identify with.
+                args (tuple):       The arguments to hand to the connect callback with the connection.
+                process (Process):  The process of the client, the game is dropped if it dies, default None.
+        """
+        with self.lock:
+            self.pending[client_id] = _Pending(args, process)
+
+    def attach(self, client_id: int, process: Any) -> None:
+        """
+        Set the process of a game that is still pending, i.e. once its client was launched.
+
+            Parameters:
+                client_id (int):    The id of the client.
+                process (Process):  The process of the client, the game is dropped if it dies.
+        """
+        with self.lock:
+            if client_id in self.pending:
+                self.pending[client_id].process = process
+
+    def run(self) -> None:
+        """
+        Accept the connections and read their ids until stopped.
+        """
+        for listener in self.listeners:
+            listener.setblocking(False)
+            self.selector.register(listener, selectors.EVENT_READ)
+
+        while not self.stop_event.is_set():
+            for key, _ in self.selector.select(timeout=0.5):
+                if key.data is None:
+                    self.accept(key.fileobj)
+                else:
+                    self.identify(key.fileobj)
+            self.expire()
+
+        for key in list(self.selector.get_map().values()):
+            if key.data is not None:
+                key.fileobj.close()
+        self.selector.close()
+
+    def stop(self) -> None:
+        """
+        Stop accepting, the connections that did not identify yet are closed.
+        """
+        self.stop_event.set()
+
+    def accept(self, listener: socket.socket) -> None:
+        """
+        Accept a new connection and wait for its id.
+
+            Parameters:
+                listener (socket): The listening socket that is ready.
+        """
+        try:
+            conn, _ = listener.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        conn.setblocking(False)
+        transport.set_low_latency(conn)
+        self.selector.register(conn, selectors.EVENT_READ, time.monotonic())
+
+    def identify(self, conn: socket.socket) -> None:
+        """
+        Read the id of a new connection and hand it to its pending game.
+
+            Parameters:
+                conn (socket): The connection that is ready.
+        """
+        try:
+            data = conn.recv(1024)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = None
+
+        self.selector.unregister(conn)
+        try:
+            #   the id is the first message, the messages that arrived with it are kept for the game
+            data, _, rest = data.partition(utils.DELIMITER)
+            client_id = int(data)
+        except (AttributeError, ValueError):
+            client_id, rest = None, b''
+
+        with self.lock:
+            pending = self.pending.pop(client_id, None)
+        if pending is None:
+            self.logger.warning('closing connection with unknown id {}'.format(data))
+            conn.close()
+            return
+
+        conn.setblocking(True)
+        if rest:
+            utils.push_data(conn, rest)
+        self.logger.debug('Client({}) connected after {:.1f}ms'.format(
+            client_id, (time.monotonic() - pending.created) * 1000))
+        try:
+            self.on_connect(conn, client_id, *pending.args)
+        except Exception as e:
+            self.logger.error('Client({}) connect failed: {}'.format(client_id, str(e)))
+            conn.close()
+
+    def expire(self) -> None:
+        """
+        Drop the games whose client died or did not connect in time, and the connections that did not identify.
+        """
+        now = time.monotonic()
+        with self.lock:
+            for client_id, pending in list(self.pending.items()):
+                dead = pending.process is not None and pending.process.exitcode is not None
+                if dead or now - pending.created > self.timeout:
+                    self.logger.warning('Client({}) did not connect, dropping its game'.format(client_id))
+                    del self.pending[client_id]
+
+        for key in list(self.selector.get_map().values()):
+            if key.data is not None and now - key.data > self.timeout:
+                self.selector.unregister(key.fileobj)
+                key.fileobj.close()
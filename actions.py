@@ -15,6 +15,13 @@ class Actions(enum.Enum):
     UNDO = 6
     ILLEGAL_LOCATION = 7
     ILLEGAL_DATA = 8
+    PROFILE = 9
+    NEW_GAME = 10
+    RESUME = 11
+    HEARTBEAT = 12
+    SPECTATE = 13
+    SNAPSHOT = 14
+    JOIN = 15
 
     UNKNOWN = 100
 
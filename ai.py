@@ -0,0 +1,384 @@
+import random
+import threading
+from typing import *
+
+import numpy as np
+
+import evalstate
+import geometry
+import utils
+import zobrist
+
+WIN_SCORE = 1000000
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class SearchCancelled(Exception):
+    pass
+
+
+def center_order(cols: int) -> List[int]:
+    """
+    Get the columns ordered from the center outwards, the center columns take part in more lines.
+
+        Parameters:
+            cols (int): Number of columns.
+
+        Returns:
+            columns (list): The column indices.
+    """
+    return sorted(range(cols), key=lambda c: (abs(2 * c - (cols - 1)), c))
+
+
+def evaluate(board: np.ndarray, player: int, n: int) -> int:
+    """
+    Static evaluation of a non terminal board, from the point of view of a given player.
+    Every line that is still open for a single player is worth 4^(pieces - 1) to that player.
+
+        Parameters:
+            board (np.ndarray): The board to evaluate.
+            player (int):       The player to evaluate for.
+            n (int):            Value for n-in-a-row.
+
+        Returns:
+            score (int): Positive if the board is better for the player.
+    """
+    rows, cols = board.shape
+    geo = geometry.get_geometry(rows, cols, n)
+    cells = board.ravel()[geo.lines]
+    mine = (cells == player).sum(axis=1)
+    theirs = (cells == (1 if player == 2 else 2)).sum(axis=1)
+    weights = np.concatenate(([0], 4 ** np.arange(n)))
+    return int(weights[mine[theirs == 0]].sum() - weights[theirs[mine == 0]].sum())
+
+
+def drop(board: np.ndarray, column: int, player: int, geo: geometry.Geometry) -> Tuple[np.ndarray, int, bool]:
+    """
+    Drop a piece and check whether it won, only the lines through the new piece are checked.
+
+        Parameters:
+            board (np.ndarray):     The board, the column must be a valid location.
+            column (int):           The column index to add.
+            player (int):           The player id to add.
+            geo (Geometry):         The geometry of the board configuration.
+
+        Returns:
+            result (tuple): The new board, the row of the new piece and whether the player won.
+    """
+    row = int(np.flatnonzero(board[:, column] == 0)[-1])
+    child = board.copy()
+    child[row, column] = player
+    return child, row, geo.is_won_at(child, player, row, column)
+
+
+class Player:
+    name = 'player'
+
+    def choose(self, board: np.ndarray, player: int, n: int) -> int:
+        """
+        Choose the column to play.
+
+            Parameters:
+                board (np.ndarray): The current board.
+                player (int):       The player id to play for.
+                n (int):            Value for n-in-a-row.
+
+            Returns:
+                column (int): A valid column index.
+        """
+        raise NotImplementedError
+
+
+class RandomPlayer(Player):
+    name = 'random'
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        """
+        Create a player that plays uniformly random valid columns.
+
+            Parameters:
+                seed (int): Seed of the random generator, default None.
+        """
+        self.rng = random.Random(seed)
+
+    def choose(self, board: np.ndarray, player: int, n: int) -> int:
+        valid = [c for c in range(board.shape[1]) if utils.is_valid_location(c, board)]
+        return self.rng.choice(valid)
+
+
+class NegamaxPlayer(Player):
+    name = 'negamax'
+
+    def __init__(self, depth: int = 4, max_table_size: int = 1000000) -> None:
+        """
+        Create a player that searches with alpha-beta negamax and a transposition table.
+
+            Parameters:
+                depth (int):            Search depth in plies, default 4.
+                max_table_size (int):   Maximum entries in the transposition table before it is cleared,
+                                        default 1000000.
+        """
+        self.depth = depth
+        self.max_table_size = max_table_size
+        self.table = {}
+        self.nodes = 0
+        self.stop_event = None
+
+    def choose(self, board: np.ndarray, player: int, n: int) -> int:
+        if len(self.table) > self.max_table_size:
+            self.table.clear()
+
+        state = evalstate.EvalState.from_board(board, n)
+        table = zobrist.get_table(state.rows, state.cols)
+        key, mirror = table.hash_board(state.board)
+        other = 1 if player == 2 else 2
+        best_column, best_score = None, -WIN_SCORE * 2
+        alpha, beta = -WIN_SCORE * 2, WIN_SCORE * 2
+        for column in state.order_columns(player, center_order(state.cols)):
+            row = state.drop(column, player)
+            if row is None:
+                continue
+            if state.last_won:
+                return column
+            cell_key, cell_mirror = table.cell_keys(row, column, player)
+            score = -self.search(state, other, self.depth - 1, -beta, -alpha, key ^ cell_key, mirror ^ cell_mirror)
+            state.undo()
+            if score > best_score:
+                best_column, best_score = column, score
+            alpha = max(alpha, score)
+        return best_column
+
+    def negamax(self, board: np.ndarray, player: int, depth: int, alpha: int, beta: int, n: int, key: int,
+                mirror: int) -> int:
+        """
+        Score a board for the player to move.
+        Mirrored positions have the same score, so they share their transposition table entry.
+
+            Parameters:
+                board (np.ndarray): The board to score.
+                player (int):       The player to move.
+                depth (int):        Remaining depth in plies.
+                alpha (int):        Lower bound of the search window.
+                beta (int):         Upper bound of the search window.
+                n (int):            Value for n-in-a-row.
+                key (int):          The zobrist key of the board.
+                mirror (int):       The zobrist key of the mirrored board.
+
+            Returns:
+                score (int): The score of the board for the player to move.
+        """
+        return self.search(evalstate.EvalState.from_board(board, n), player, depth, alpha, beta, key, mirror)
+
+    def search(self, state: evalstate.EvalState, player: int, depth: int, alpha: int, beta: int, key: int,
+               mirror: int) -> int:
+        """
+        Score the position of an evaluation state for the player to move, see negamax.
+        The moves are dropped on the state and undone, so every node updates the lines through a single cell instead
+        of copying and scanning the board.
+
+            Parameters:
+                state (EvalState):  The position, it is back to the same position when the search returns.
+                player (int):       The player to move.
+                depth (int):        Remaining depth in plies.
+                alpha (int):        Lower bound of the search window.
+                beta (int):         Upper bound of the search window.
+                key (int):          The zobrist key of the board.
+                mirror (int):       The zobrist key of the mirrored board.
+
+            Returns:
+                score (int): The score of the board for the player to move.
+        """
+        self.nodes += 1
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchCancelled()
+        if depth <= 0:
+            return state.score(player)
+
+        table = zobrist.get_table(state.rows, state.cols)
+        entry_key = zobrist.canonical(key, mirror) ^ (table.side if player == 2 else 0)
+        entry = self.table.get(entry_key)
+        if entry is not None and entry[0] >= depth:
+            _, value, flag = entry
+            if flag == EXACT:
+                return value
+            elif flag == LOWER:
+                alpha = max(alpha, value)
+            elif flag == UPPER:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+
+        original_alpha = alpha
+        other = 1 if player == 2 else 2
+        columns = center_order(state.cols)
+        if depth > 1:
+            #   the winning and blocking columns first, they are the most likely to cut the search
+            columns = state.order_columns(player, columns)
+        best = None
+        for column in columns:
+            row = state.drop(column, player)
+            if row is None:
+                continue
+            if state.last_won:
+                #   prefer faster wins
+                score = WIN_SCORE + depth
+            else:
+                cell_key, cell_mirror = table.cell_keys(row, column, player)
+                score = -self.search(state, other, depth - 1, -beta, -alpha, key ^ cell_key, mirror ^ cell_mirror)
+            state.undo()
+            if best is None or score > best:
+                best = score
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        #   no valid location, the board is full
+        if best is None:
+            return 0
+
+        flag = UPPER if best <= original_alpha else LOWER if best >= beta else EXACT
+        self.table[entry_key] = (depth, best, flag)
+        return best
+
+    def ponder(self, board: np.ndarray, player: int, n: int, stop_event: threading.Event) -> None:
+        """
+        Search the positions after the opponent's likely replies while the opponent thinks, so the transposition
+        table already holds them when the real reply arrives. Cancelled searches leave no partial entries.
+
+            Parameters:
+                board (np.ndarray):         The current board.
+                player (int):               The opponent, who moves next.
+                n (int):                    Value for n-in-a-row.
+                stop_event (Event):         Set when the real reply arrived.
+        """
+        board = np.asarray(board, dtype=np.int8)
+        geo = geometry.get_geometry(board.shape[0], board.shape[1], n)
+        other = 1 if player == 2 else 2
+
+        replies = []
+        for column in center_order(board.shape[1]):
+            if not utils.is_valid_location(column, board):
+                continue
+            child, _, won = drop(board, column, player, geo)
+            if not won:
+                replies.append((evaluate(child, player, n), child))
+
+        self.stop_event = stop_event
+        try:
+            #   the replies that look best for the opponent first
+            for _, child in sorted(replies, key=lambda r: -r[0]):
+                if stop_event.is_set():
+                    break
+                self.choose(child, other, n)
+        except SearchCancelled:
+            pass
+        finally:
+            self.stop_event = None
+
+
+class Ponderer:
+
+    def __init__(self, slots: threading.Semaphore) -> None:
+        """
+        Run a player's ponder in the background of a single game.
+
+            Parameters:
+                slots (Semaphore): Slots shared by all the games of the server, a game only ponders if one is free.
+        """
+        self.slots = slots
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self, player: Player, board: np.ndarray, turn: int, n: int) -> bool:
+        """
+        Start pondering, if the player supports it and a slot is free.
+
+            Parameters:
+                player (Player):        The AI player.
+                board (np.ndarray):     The current board.
+                turn (int):             The opponent, who moves next.
+                n (int):                Value for n-in-a-row.
+
+            Returns:
+                started (bool): True if pondering started, False otherwise.
+        """
+        if not hasattr(player, 'ponder') or not self.slots.acquire(blocking=False):
+            return False
+
+        self.stop_event = threading.Event()
+
+        def run():
+            try:
+                player.ponder(board, turn, n, self.stop_event)
+            finally:
+                self.slots.release()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self) -> None:
+        """
+        Cancel pondering and wait for it to return, the player can be used again right after.
+        """
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+
+class NetworkPlayer(Player):
+    name = 'network'
+
+    def __init__(self, evaluator) -> None:
+        """
+        Create a player that scores every reply with a policy/value network and plays the best one.
+        All the replies are sent to the evaluator as a single request, which is batched with the other games.
+
+            Parameters:
+                evaluator (BatchEvaluator): The evaluator of the board size.
+        """
+        self.evaluator = evaluator
+
+    def choose(self, board: np.ndarray, player: int, n: int) -> int:
+        board = np.asarray(board, dtype=np.int8)
+        geo = geometry.get_geometry(board.shape[0], board.shape[1], n)
+        other = 1 if player == 2 else 2
+
+        columns, children = [], []
+        for column in center_order(board.shape[1]):
+            if not utils.is_valid_location(column, board):
+                continue
+            child, _, won = drop(board, column, player, geo)
+            if won:
+                return column
+            columns.append(column)
+            children.append(child)
+
+        #   the values are for the opponent, who moves next on the children
+        _, values = self.evaluator.evaluate(np.stack(children), np.full(len(children), other))
+        if values is None:
+            return columns[0]
+        return columns[int(np.argmin(values))]
+
+
+def create_player(spec: str, evaluator=None) -> Player:
+    """
+    Create a player out of its spec, i.e. 'random', 'random:7', 'negamax:3' or 'network'.
+
+        Parameters:
+            spec (str):                 The name of the player and an optional argument separated by a colon.
+            evaluator (BatchEvaluator): The evaluator for network players, default None.
+
+        Returns:
+            player (Player): The new player.
+    """
+    name, _, arg = spec.partition(':')
+    if name == RandomPlayer.name:
+        return RandomPlayer(int(arg) if arg else None)
+    elif name == NegamaxPlayer.name:
+        return NegamaxPlayer(int(arg) if arg else 4)
+    elif name == NetworkPlayer.name and evaluator is not None:
+        return NetworkPlayer(evaluator)
+    raise ValueError('unknown player {}'.format(spec))
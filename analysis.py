@@ -0,0 +1,318 @@
+import argparse
+import concurrent.futures
+import functools
+import json
+import logging
+import os
+import time
+from typing import *
+
+import numpy as np
+
+import ai
+import geometry
+import record
+import utils
+import zobrist
+
+#   number of games analyzed by a single task of the pool
+DEFAULT_CHUNK = 256
+#   loss in evaluation of a played move, compared to the best one, that flags it as a blunder
+DEFAULT_BLUNDER = 100
+
+_analyzer = None
+_readers = {}
+
+
+class Analyzer:
+
+    def __init__(self, depth: int = 4, max_cache_size: int = 1000000) -> None:
+        """
+        Create an analyzer that scores every valid column of every position of a game with the negamax search.
+        The scores of a position are cached by its zobrist key, so the positions shared between games, i.e. the
+        openings, are searched once. Mirrored positions share their entry.
+
+            Parameters:
+                depth (int):            Search depth in plies of every column, default 4.
+                max_cache_size (int):   Maximum positions in the cache before it is cleared, default 1000000.
+        """
+        self.depth = depth
+        self.max_cache_size = max_cache_size
+        self.search = ai.NegamaxPlayer(depth, max_cache_size)
+        self.cache = {}  # (rows, cols, n) -> canonical key -> scores of the columns in canonical orientation
+        self.config = None
+        self.positions = 0
+        self.hits = 0
+
+    def scores(self, board: np.ndarray, player: int, n: int, key: int, mirror: int) -> List[Optional[int]]:
+        """
+        Score every column of a position for the player to move.
+
+            Parameters:
+                board (np.ndarray): The position.
+                player (int):       The player to move.
+                n (int):            Value for n-in-a-row.
+                key (int):          The zobrist key of the position.
+                mirror (int):       The zobrist key of the mirrored position.
+
+            Returns:
+                scores (list): The score of every column, None for a full column.
+        """
+        rows, cols = board.shape
+        table = zobrist.get_table(rows, cols)
+        cache = self.cache.setdefault((rows, cols, n), {})
+        entry_key = zobrist.canonical(key, mirror) ^ (table.side if player == 2 else 0)
+        #   the entry of a mirrored position holds its columns in reverse
+        flip = key > mirror
+
+        self.positions += 1
+        cached = cache.get(entry_key)
+        if cached is not None:
+            self.hits += 1
+            return list(reversed(cached)) if flip else list(cached)
+
+        geo = geometry.get_geometry(rows, cols, n)
+        other = 1 if player == 2 else 2
+        scores = []
+        for column in range(cols):
+            if not utils.is_valid_location(column, board):
+                scores.append(None)
+                continue
+            child, row, won = ai.drop(board, column, player, geo)
+            if won:
+                scores.append(ai.WIN_SCORE + self.depth)
+                continue
+            cell_key, cell_mirror = table.cell_keys(row, column, player)
+            scores.append(-self.search.negamax(child, other, self.depth - 1, -ai.WIN_SCORE * 2, ai.WIN_SCORE * 2, n,
+                                               key ^ cell_key, mirror ^ cell_mirror))
+
+        if len(cache) > self.max_cache_size:
+            cache.clear()
+        cache[entry_key] = tuple(reversed(scores)) if flip else tuple(scores)
+        return scores
+
+    def analyze(self, game: record.GameRecord, blunder: int = DEFAULT_BLUNDER) -> List[Dict[str, Any]]:
+        """
+        Annotate every move of a recorded game.
+
+            Parameters:
+                game (GameRecord):  The game to analyze.
+                blunder (int):      Loss in evaluation that flags a move as a blunder, default 100.
+
+            Returns:
+                annotations (list): Per move, the column played, the best column, the evaluation of the position
+                                    and of the played move for the player to move, and the blunder and missed win
+                                    flags.
+        """
+        #   the transposition table of the search does not tell configurations apart
+        if len(self.search.table) > self.max_cache_size or self.config != (game.size, game.n):
+            self.search.table.clear()
+            self.config = (game.size, game.n)
+
+        rows, cols = game.size
+        table = zobrist.get_table(rows, cols)
+        board = np.zeros(game.size, dtype=np.int8)
+        key, mirror = 0, 0
+        annotations = []
+        for ply, column in enumerate(game.moves):
+            player = game.player(ply)
+            scores = self.scores(board, player, game.n, key, mirror)
+            best = max(range(cols), key=lambda c: (scores[c] is not None, scores[c] or 0))
+            played = scores[column] if scores[column] is not None else -ai.WIN_SCORE
+            annotations.append({
+                'ply': ply,
+                'player': player,
+                'column': column,
+                'best': best,
+                'eval': scores[best],
+                'played_eval': played,
+                #   a forced win was on the board and the played move lets it go
+                'missed_win': scores[best] >= ai.WIN_SCORE > played,
+                #   either walks into a forced loss, or gives away too much of a position that is still open
+                'blunder': played <= -ai.WIN_SCORE < scores[best] or
+                           (abs(scores[best]) < ai.WIN_SCORE and scores[best] - played >= blunder),
+            })
+
+            row = record.drop(board, column, player)
+            cell_key, cell_mirror = table.cell_keys(row, column, player)
+            key, mirror = key ^ cell_key, mirror ^ cell_mirror
+        return annotations
+
+
+def analyze_chunk(path: str, start: int, stop: int, depth: int, blunder: int) -> Tuple[List[Dict[str, Any]], int, int]:
+    """
+    Analyze a range of games of a records file, run in the worker processes.
+    Every worker keeps its analyzer, so its cache is shared by all the chunks it analyzes.
+
+        Parameters:
+            path (str):     The path of the records file.
+            start (int):    The first game.
+            stop (int):     The game to stop before.
+            depth (int):    Search depth in plies.
+            blunder (int):  Loss in evaluation that flags a move as a blunder.
+
+        Returns:
+            result (tuple): The annotated games, and the number of positions and cache hits of the chunk.
+    """
+    global _analyzer
+    if _analyzer is None or _analyzer.depth != depth:
+        _analyzer = Analyzer(depth)
+    if path not in _readers:
+        _readers[path] = record.RecordReader(path)
+    reader = _readers[path]
+    if stop > len(reader):
+        #   the file grew since the worker opened it
+        reader.refresh()
+
+    positions, hits = _analyzer.positions, _analyzer.hits
+    games = []
+    for index, game in enumerate(reader.iterate(start, stop), start=start):
+        games.append({
+            'file': os.path.basename(path),
+            'game': index,
+            'size': list(game.size),
+            'n': game.n,
+            'result': game.result,
+            'moves': _analyzer.analyze(game, blunder),
+        })
+    return games, _analyzer.positions - positions, _analyzer.hits - hits
+
+
+def find_records(folder: str) -> List[str]:
+    """
+    Find the records files of a folder, the files that have an index next to them.
+
+        Parameters:
+            folder (str): The folder to look in.
+
+        Returns:
+            paths (list): The paths of the records files, sorted by name.
+    """
+    names = [name for name in sorted(os.listdir(folder)) if not name.endswith(record.INDEX_SUFFIX)]
+    paths = [os.path.join(folder, name) for name in names]
+    return [path for path in paths if os.path.exists(path + record.INDEX_SUFFIX)]
+
+
+class BulkAnalysis:
+
+    def __init__(self, folder: str, output: str, workers: Optional[int] = None, depth: int = 4,
+                 chunk: int = DEFAULT_CHUNK, blunder: int = DEFAULT_BLUNDER) -> None:
+        """
+        Create the analysis of all the recorded games of a folder.
+        The annotated games are appended to the output as json lines, and the games already in it are skipped,
+        so a stopped analysis continues from where it stopped.
+
+            Parameters:
+                folder (str):   The folder of the records files.
+                output (str):   The path of the json lines file to write the annotated games to.
+                workers (int):  Number of worker processes, default None for the number of cores.
+                depth (int):    Search depth in plies, default 4.
+                chunk (int):    Number of games per task, default 256.
+                blunder (int):  Loss in evaluation that flags a move as a blunder, default 100.
+        """
+        self.folder = folder
+        self.output = output
+        self.workers = workers or os.cpu_count()
+        self.depth = depth
+        self.chunk = max(chunk, 1)
+        self.blunder = blunder
+        self.done = set()  # (file name, game index)
+        self.logger = logging.getLogger('Analysis')
+
+        if os.path.exists(output):
+            self.load()
+
+    def load(self) -> None:
+        """
+        Read the games that were already analyzed, a line cut by a stop is dropped from the output.
+        """
+        with open(self.output, 'rb+') as f:
+            end = 0
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                game = json.loads(line)
+                self.done.add((game['file'], game['game']))
+                end += len(line)
+            f.truncate(end)
+        self.logger.info('resumed {} analyzed games from {}'.format(len(self.done), self.output))
+
+    def chunks(self) -> Iterator[Tuple[str, int, int]]:
+        """
+        Split the games that were not analyzed yet into tasks, only the indexes of the files are read.
+
+            Returns:
+                chunks (iterator): The path, first game and game to stop before of every task.
+        """
+        for path in find_records(self.folder):
+            name = os.path.basename(path)
+            reader = record.RecordReader(path)
+            count = len(reader)
+            reader.close()
+            for start in range(0, count, self.chunk):
+                stop = min(start + self.chunk, count)
+                if any((name, i) not in self.done for i in range(start, stop)):
+                    yield path, start, stop
+
+    def run(self) -> int:
+        """
+        Analyze the games across the worker pool, the results are written as soon as each task is done.
+        Only a few tasks per worker are queued at once, so a folder of any size is streamed.
+
+            Returns:
+                games (int): Number of games analyzed.
+        """
+        start = time.perf_counter()
+        last_report = start
+        games = positions = hits = 0
+        analyze = functools.partial(analyze_chunk, depth=self.depth, blunder=self.blunder)
+        chunks = self.chunks()
+
+        with concurrent.futures.ProcessPoolExecutor(self.workers) as executor, open(self.output, 'a') as out:
+            running = set()
+            while True:
+                for path, first, stop in chunks:
+                    running.add(executor.submit(analyze, path, first, stop))
+                    if len(running) >= self.workers * 4:
+                        break
+                if not running:
+                    break
+
+                finished, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    results, chunk_positions, chunk_hits = future.result()
+                    #   a task of a resumed analysis may hold games that were already written
+                    lines = [json.dumps(g) + '\n' for g in results if (g['file'], g['game']) not in self.done]
+                    out.write(''.join(lines))
+                    out.flush()
+                    self.done.update((g['file'], g['game']) for g in results)
+                    games += len(lines)
+                    positions += chunk_positions
+                    hits += chunk_hits
+
+                now = time.perf_counter()
+                if now - last_report >= 5 or not running:
+                    elapsed = now - start
+                    self.logger.info('{} games, {:.1f} games/s, {:.0f} positions/s, {:.0%} cached'.format(
+                        games, games / elapsed, positions / elapsed, hits / positions if positions else 0))
+                    last_report = now
+        return games
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Annotate every move of the recorded games of a folder.')
+    parser.add_argument('folder', type=str, help='folder of the records files written by the server')
+    parser.add_argument('--output', default='analysis.jsonl', type=str,
+                        help='json lines file of the annotated games, a stopped analysis resumes from it')
+    parser.add_argument('--workers', default=None, type=int, help='worker processes, default number of cores')
+    parser.add_argument('--depth', default=4, type=int, help='search depth in plies')
+    parser.add_argument('--chunk', default=DEFAULT_CHUNK, type=int, help='games per task')
+    parser.add_argument('--blunder', default=DEFAULT_BLUNDER, type=int,
+                        help='loss in evaluation that flags a move as a blunder')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)-10s %(levelname)-8s; %(message)s;')
+
+    analysis = BulkAnalysis(args.folder, args.output, workers=args.workers, depth=args.depth, chunk=args.chunk,
+                            blunder=args.blunder)
+    analysis.run()
@@ -0,0 +1,267 @@
+import argparse
+import random
+import time
+from typing import *
+
+import numpy as np
+
+import utils
+from actions import Actions
+from game import Game, create_game
+
+
+class BitBoard:
+
+    def __init__(self, rows: int, cols: int, n: int) -> None:
+        """
+        Create a board of any size kept as a python int bitboard per player, with the occupied cells of every player
+        in a set, so nothing is allocated per cell.
+        The bits go up the columns from the bottom, with a spare bit on top of every column that stays empty, so a
+        line that runs off the board never wraps into the next column.
+
+            Parameters:
+                rows (int): Number of rows.
+                cols (int): Number of columns.
+                n (int):    Value for n-in-a-row.
+        """
+        self.rows, self.cols, self.n = rows, cols, n
+        self.stride = rows + 1
+        #   vertical, horizontal, diagonal and anti-diagonal steps between the bits of a line
+        self.directions = (1, self.stride, self.stride + 1, self.stride - 1)
+        self.bits = [0, 0]  # player 1 is index 0
+        self.cells = (set(), set())
+        self.heights = [0] * cols
+        self.moves = []  # (column, player)
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    def is_valid(self, column: int) -> bool:
+        """
+        Check if a column is on the board and not full.
+
+            Parameters:
+                column (int): The column index.
+
+            Returns:
+                valid (bool): True if a piece can be dropped in the column, False otherwise.
+        """
+        return self.cols > column >= 0 and self.heights[column] < self.rows
+
+    def is_full(self) -> bool:
+        """
+        Check if the board is full.
+
+            Returns:
+                full (bool): True if there are no valid locations, False otherwise.
+        """
+        return len(self.moves) == self.rows * self.cols
+
+    def drop(self, column: int, player: int) -> Optional[int]:
+        """
+        Drop a piece.
+
+            Parameters:
+                column (int):   The column index to add.
+                player (int):   The player id to add.
+
+            Returns:
+                row (int): The row of the new piece counted from the top like the numpy boards, or None if the column
+                           is not a valid location.
+        """
+        if not self.is_valid(column):
+            return None
+        position = column * self.stride + self.heights[column]
+        self.heights[column] += 1
+        self.bits[player - 1] |= 1 << position
+        self.cells[player - 1].add(position)
+        self.moves.append((column, player))
+        return self.rows - self.heights[column]
+
+    def undo(self) -> Optional[Tuple[int, int]]:
+        """
+        Take back the last piece.
+
+            Returns:
+                move (tuple): The column and the player of the piece, or None if the board is empty.
+        """
+        if not self.moves:
+            return None
+        column, player = self.moves.pop()
+        self.heights[column] -= 1
+        position = column * self.stride + self.heights[column]
+        self.bits[player - 1] &= ~(1 << position)
+        self.cells[player - 1].discard(position)
+        return column, player
+
+    def is_won_at(self, column: int) -> bool:
+        """
+        Check if the highest piece of a column completed a line, at most 4 * (n - 1) cells are looked up, whatever
+        the size of the board.
+
+            Parameters:
+                column (int): The column index.
+
+            Returns:
+                won (bool): True if the piece is part of n-in-a-row, False otherwise.
+        """
+        if not self.heights[column]:
+            return False
+        position = column * self.stride + self.heights[column] - 1
+        cells = self.cells[0] if position in self.cells[0] else self.cells[1]
+        for step in self.directions:
+            count = 1
+            for sign in (step, -step):
+                cell = position + sign
+                while count < self.n and cell in cells:
+                    count += 1
+                    cell += sign
+            if count >= self.n:
+                return True
+        return False
+
+    def has_won(self, player: int) -> bool:
+        """
+        Check if a player has n-in-a-row anywhere on the board, with log2(n) shifts of its bitboard per direction.
+
+            Parameters:
+                player (int): The player id to check.
+
+            Returns:
+                won (bool): True if there is n-in-a-row, False otherwise.
+        """
+        bits = self.bits[player - 1]
+        for step in self.directions:
+            #   run keeps the bits that start at least length pieces in a row
+            run, length = bits, 1
+            while length * 2 <= self.n:
+                run &= run >> (length * step)
+                length *= 2
+            if length < self.n:
+                run &= run >> ((self.n - length) * step)
+            if run:
+                return True
+        return False
+
+    def to_array(self) -> np.ndarray:
+        """
+        Get the board as a numpy board, only the occupied cells are visited.
+
+            Returns:
+                board (np.ndarray): The board, row 0 is the top.
+        """
+        board = np.zeros((self.rows, self.cols), dtype=np.int8)
+        for player, cells in enumerate(self.cells, start=1):
+            for position in cells:
+                column, height = divmod(position, self.stride)
+                board[self.rows - 1 - height, column] = player
+        return board
+
+
+class BitGame(Game):
+    engine = 'bitboard'
+
+    def __init__(self, size: utils.Couple, n: int = 4, token: Optional[int] = None,
+                 max_undo: Optional[int] = None) -> None:
+        """
+        Create a game on a bitboard, for boards and n beyond the dense engine, up to 50x50 and 10 in a row.
+        A move, an undo and a win check cost the same on any board size, the numpy board is only built when it is
+        read, i.e. by an AI player.
+
+            Parameters:
+                size (tuple):   The size of the board.
+                n (int):        Value for n-in-a-row, default 4.
+                token (int):    The session token of the game, default None to create a new one.
+                max_undo (int): Maximum allowed undo per player, default None for no limit.
+        """
+        self.bitboard = BitBoard(size[0], size[1], n)
+        self._array = None
+        super().__init__(size, n, token, max_undo)
+
+    @property
+    def board(self) -> np.ndarray:
+        if self._array is None:
+            self._array = self.bitboard.to_array()
+        return self._array
+
+    @board.setter
+    def board(self, value: Optional[np.ndarray]) -> None:
+        self._array = value
+
+    def clear_board(self) -> None:
+        self.bitboard = BitBoard(self.size[0], self.size[1], self.n)
+        self._array = None
+
+    def add_piece(self, column: int) -> None:
+        row = self.bitboard.drop(column, self.turn)
+        self._array = None
+        self.moves.append(column)
+        self.move_counts[self.turn - 1] += 1
+        self.hash.push(row, column, self.turn)
+
+    def take_back(self) -> None:
+        self.bitboard.undo()
+        self._array = None
+
+    def is_valid(self, column: int) -> bool:
+        return self.bitboard.is_valid(column)
+
+    def is_won(self, player: int) -> bool:
+        #   a game ends with its first line, so only the last move can have completed one
+        if self.bitboard.moves and self.bitboard.moves[-1][1] == player:
+            return self.bitboard.is_won_at(self.bitboard.moves[-1][0])
+        return self.bitboard.has_won(player)
+
+    def is_full(self) -> bool:
+        return self.bitboard.is_full()
+
+
+def benchmark(size: utils.Couple, n: int, engine: str, games: int, seed: int = 0) -> Tuple[float, int]:
+    """
+    Play random games with an engine, every move is followed by an undo and a replay of it, as a search would.
+
+        Parameters:
+            size (tuple):   The size of the board.
+            n (int):        Value for n-in-a-row.
+            engine (str):   The engine, see game.create_game.
+            games (int):    Number of games.
+            seed (int):     Seed of the random moves, default 0.
+
+        Returns:
+            result (tuple): The seconds it took and the number of moves.
+    """
+    rng = random.Random(seed)
+    moves = 0
+    start = time.perf_counter()
+    for _ in range(games):
+        game = create_game(size, n, engine=engine)
+        free = list(range(size[1]))
+        result = Actions.CONTINUE
+        while result == Actions.CONTINUE:
+            column = rng.choice(free)
+            result = game.play(column)
+            if result == Actions.CONTINUE:
+                game.undo()
+                result = game.play(column)
+            if result == Actions.ILLEGAL_LOCATION:
+                free.remove(column)
+                result = Actions.CONTINUE
+                continue
+            moves += 1
+    return time.perf_counter() - start, moves
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the dense and the bitboard engines on random games.')
+    parser.add_argument('--configs', nargs='+', default=['6x7x4', '10x10x6', '20x20x8', '50x50x10'],
+                        help='board configurations ROWSxCOLSxN')
+    parser.add_argument('--games', default=20, type=int, help='games per configuration and engine')
+    args = parser.parse_args()
+
+    print('{:<10} {:>14} {:>14} {:>8}'.format('config', 'dense moves/s', 'bit moves/s', 'speedup'))
+    for config in args.configs:
+        rows, cols, n = (int(v) for v in config.lower().split('x'))
+        dense_seconds, dense_moves = benchmark((rows, cols), n, 'dense', args.games)
+        bit_seconds, bit_moves = benchmark((rows, cols), n, 'bitboard', args.games)
+        dense_rate, bit_rate = dense_moves / dense_seconds, bit_moves / bit_seconds
+        print('{:<10} {:>14.0f} {:>14.0f} {:>7.1f}x'.format(config, dense_rate, bit_rate, bit_rate / dense_rate))
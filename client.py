@@ -1,20 +1,20 @@
-from operator import truediv
+import functools
 import os
-from pickle import FALSE
-import time
 import multiprocessing
 import logging
 import sys
 import math
-from turtle import left, xcor
+import time
 import utils
-import socket
 
-import tkinter as tk
 import numpy as np
 from typing import *
 from actions import Actions
 from memento import Originator, CareTaker
+import profiling
+import record
+import threats
+import transport
 
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = 'hide'
 import pygame
@@ -23,6 +23,17 @@ from button import Button
 player_colors_list = ['red', 'yellow', 'green', 'orange', 'pink', 'cyan']
 
 
+@functools.lru_cache(maxsize=None)
+def get_font_style() -> Optional[str]:
+    """
+    Get the path of the font file, looked up once per process since the lookup scans the installed fonts.
+
+        Returns:
+            font_style (str): The path of the font, or None for the default font.
+    """
+    return pygame.font.match_font('segoeuisymbol')
+
+
 def get_next_color(my_color: str, other_color: str) -> str:
     """
     Get the next available color from the color list based on the current player and opponent colors.
@@ -49,9 +60,12 @@ def get_next_color(my_color: str, other_color: str) -> str:
 class ClientGUI:
 
     def __init__(self, client_id: int, queue: multiprocessing.Queue, log_level: int,
-                 size: utils.Couple = (6, 10), n: int = 4, max_undo: int = 3) -> None:
+                 size: utils.Couple = (6, 10), n: int = 4, max_undo: int = 3, profile: float = 0,
+                 vs_ai: bool = False, address: Optional[transport.Address] = None, replay: Optional[str] = None,
+                 replay_game: int = 0) -> None:
         """
         Create a new client, define it's gui, board, and create a socket.
+        With a records file to replay, the client only views the recorded games and does not connect to a server.
 
             Parameters:
                 client_id (int):                The id of the client.
@@ -60,6 +74,12 @@ class ClientGUI:
                 size (tuple):                   Size of board to use.
                 n (int):                        Value for n-in-a-row.
                 max_undo (int):                 Maximum allowed undo per player.
+                profile (float):                Seconds to profile from startup, default 0 to disable.
+                vs_ai (bool):                   Whether the opponent is an AI played by the server, default False.
+                address (Address):              The server address, a path for a Unix domain socket,
+                                                default None for 127.0.0.1:1234.
+                replay (str):                   The path of a records file to replay, default None to play.
+                replay_game (int):              The index of the first game to replay, negative counts from the end.
         """
         self.square_size = 80
         self.options_rows = 3
@@ -101,6 +121,10 @@ class ClientGUI:
         utils.root_logger_configurer(self.queue, log_level)
         self.logger = logging.getLogger('Client({})'.format(self.id))
 
+        self.profile_seconds = profile
+        if self.profile_seconds > 0:
+            profiling.start(self.profile_seconds, name='client{}'.format(self.id))
+
         self.max_undo = max_undo
         self.undo_counts = [0, 0]
         self.wins = [0, 0]
@@ -108,6 +132,21 @@ class ClientGUI:
         self.player2_color = 'red'
         self.turn = 1
         self.state = Actions.UNKNOWN
+        self.vs_ai = vs_ai
+        self.address = address if address else ('127.0.0.1', 1234)
+        self.waiting_ai = False
+        self.show_hints = False
+
+        self.records = None
+        self.replay = None
+        self.replay_index = 0
+        self.replay_playing = False
+        self.replay_speed = 2.0  # moves per second
+
+        if replay:
+            self.open_replay(replay, replay_game)
+            self.run_replay()
+            return
 
         #   calculate the clients gui size based on the amount of rows and cols
         self.calc_window_size()
@@ -183,9 +222,11 @@ class ClientGUI:
         """
         Calculate the size of the window, and adjust the circles size based on the users screen size.
         """
-        #   get the screen size
+        #   get the screen size, tkinter is only needed here so it is imported on use
+        import tkinter as tk
         win = tk.Tk()
         width, height = win.winfo_screenwidth(), win.winfo_screenheight()
+        win.destroy()
 
         while True:
             #    calculate the total width and height based on the squares size
@@ -199,6 +240,10 @@ class ClientGUI:
             if not (self.width > width or self.height > height - 80):
                 break
 
+            #   the largest boards keep a minimal square size, even if they do not fit
+            if self.square_size <= 10:
+                break
+
             #   client's size is bigger than the user's screen, reduce the size
             self.square_size -= 10
             self.font_size -= 2
@@ -215,16 +260,20 @@ class ClientGUI:
         """
         Creates the client's socket.
         """
-        self.client_socket = socket.socket()
-        self.port = 1234
-        self.host = '127.0.0.1'
+        if isinstance(self.address, str):
+            self.host, self.port = self.address, 0
+        else:
+            self.host, self.port = self.address
 
         try:
-            self.client_socket.connect((self.host, self.port))
+            self.client_socket = transport.connect(self.address)
         except Exception as e:
             self.logger.error(str(e))
-            self.client_socket.close()
-        self.logger.info('created conn {}:{}'.format(self.host, self.port))
+            return
+        self.logger.info('created conn {}'.format(transport.describe(self.client_socket)))
+
+        #   identify to the server, so it can match the connection to this client's game
+        utils.send_data(self.client_socket, self.id)
 
     def exit(self, should_send: bool = False) -> None:
         """
@@ -233,12 +282,18 @@ class ClientGUI:
             Parameters:
                 should_send (bool): Whether to send an exit event to the server or not, default False.
         """
+        if self.records is not None:
+            self.records.close()
+            self.logger.info('replay closed')
+            pygame.quit()
+            sys.exit()
+
         if should_send:
-            self.client_socket.send(bytes(str(Actions.EXIT.value), 'utf8'))
+            utils.send_data(self.client_socket, Actions.EXIT.value)
             self.logger.debug('send exit event to server')
-        host, port = self.client_socket.getsockname()
+        name = transport.describe(self.client_socket, peer=False)
         self.client_socket.close()
-        self.logger.info('conn closed {}:{}'.format(host, port))
+        self.logger.info('conn closed {}'.format(name))
         pygame.quit()
         sys.exit()
 
@@ -256,7 +311,7 @@ class ClientGUI:
         self.main_display = pygame.display.set_mode((self.width, self.height), pygame.RESIZABLE)
         self.main_display.fill(utils.get_color('black'))
 
-        self.font_style = pygame.font.match_font('segoeuisymbol')
+        self.font_style = get_font_style()
         self.font = pygame.font.Font(self.font_style, self.font_size)
 
         self.create_undo_button()
@@ -283,9 +338,13 @@ class ClientGUI:
         #   draw the board itself and the top bar
         self.draw_board()
 
-    def draw_board(self) -> None:
+    @profiling.timed
+    def draw_board(self, cells: Optional[List[utils.Couple]] = None) -> None:
         """
         Draws the board with its current state.
+
+            Parameters:
+                cells (list): The row and column of the cells to redraw, default None to redraw the entire board.
         """
         board_top_offset = self.options_rows * self.square_size
         cols_offset = self.square_size * (self.cols // 2)
@@ -293,30 +352,68 @@ class ClientGUI:
             cols_offset += 0.5 * self.square_size
         left_offset = int((self.main_display.get_rect().width // 2) - cols_offset)
 
-        #   iterates over the rows and cols
-        for r in range(self.rows):
-            for c in range(self.cols):
-                #   first, draw a blue rectangle
-                pygame.draw.rect(
-                    self.main_display,
-                    utils.get_color('blue'),
-                    (
-                        c * self.square_size + left_offset,
-                        r * self.square_size + board_top_offset,
-                        self.square_size,
-                        self.square_size
-                    )
+        #   iterates over the rows and cols, or only over the given cells
+        if cells is None:
+            to_draw = ((r, c) for r in range(self.rows) for c in range(self.cols))
+        else:
+            to_draw = cells
+        rects = []
+        for r, c in to_draw:
+            #   first, draw a blue rectangle
+            rect = pygame.draw.rect(
+                self.main_display,
+                utils.get_color('blue'),
+                (
+                    c * self.square_size + left_offset,
+                    r * self.square_size + board_top_offset,
+                    self.square_size,
+                    self.square_size
                 )
+            )
+            rects.append(rect)
+
+            center_x = int(c * self.square_size + self.square_size // 2 + left_offset)
+            center_y = int(r * self.square_size + board_top_offset + self.square_size / 2)
+
+            #   second, add a circle with the player's color, or black if empty cell
+            color_name = self.get_player_color(r, c)
+            self.draw_circle(color_name, (center_x, center_y))
+
+        if cells is None:
+            pygame.display.update()
+            self.logger.debug('board=\n{}'.format(self.board))
+        else:
+            #   only the changed cells are pushed to the screen
+            pygame.display.update(rects)
+
+    def draw_hints(self) -> None:
+        """
+        Draw the threats over the board, toggled by pressing 'h' while playing.
+        A ring marks a cell that wins right away, in the color of its player, so a ring of the opponent's color is
+        a column to block. A dot marks a cell that completes a line once the cells below it are filled.
+        """
+        report = threats.analyze(self.board, self.n)
+        playable = threats.playable_cells(self.board)
+        colors = {1: self.player1_color, 2: self.player2_color}
 
+        board_top_offset = self.options_rows * self.square_size
+        cols_offset = self.square_size * (self.cols // 2)
+        if self.cols % 2 != 0:
+            cols_offset += 0.5 * self.square_size
+        left_offset = int((self.main_display.get_rect().width // 2) - cols_offset)
+
+        for player, cells in report.cells.items():
+            color = utils.get_color(colors[player])
+            for r, c in cells:
                 center_x = int(c * self.square_size + self.square_size // 2 + left_offset)
                 center_y = int(r * self.square_size + board_top_offset + self.square_size / 2)
-
-                #   second, add a circle with the player's color, or black if empty cell
-                color_name = self.get_player_color(r, c)
-                self.draw_circle(color_name, (center_x, center_y))
+                if playable[c] == r * self.cols + c:
+                    pygame.draw.circle(self.main_display, color, (center_x, center_y), self.radius, 4)
+                else:
+                    pygame.draw.circle(self.main_display, color, (center_x, center_y), self.radius // 4)
 
         pygame.display.update()
-        self.logger.debug('board=\n{}'.format(self.board))
+        self.logger.debug('hints wins={}, odd={}, even={}'.format(report.wins, report.odd, report.even))
 
     def draw_text_top(self, txt: str) -> None:
         """
@@ -625,7 +722,8 @@ class ClientGUI:
             self.origin.set_state(self.board)
             self.caretaker.do()
 
-            self.client_socket.send(bytes(str(Actions.RESET.value), 'utf8'))
+            #   the player on turn starts the next game, the server resets its game with it
+            utils.send_data(self.client_socket, '{},{}'.format(Actions.RESET.value, self.turn))
 
         if self.state == Actions.WIN or self.state == Actions.TIE:
             self.logger.debug('reset button pressed')
@@ -638,10 +736,10 @@ class ClientGUI:
         """
         Handle the start button.
         """
-        #   send an ready event to the server to notify the client done its setup
+        #   send an ready event to the server to notify the client done its setup, with the player chosen to start
         self.state = Actions.READY
-        self.client_socket.send(bytes(str(Actions.READY.value), 'utf8'))
-        self.logger.debug('sent ready event')
+        utils.send_data(self.client_socket, '{},{}'.format(Actions.READY.value, self.turn))
+        self.logger.debug('sent ready event, first={}'.format(self.turn))
         self.start_button = None
 
     def handle_main_menu(self, event: pygame.event) -> bool:
@@ -675,12 +773,56 @@ class ClientGUI:
         """
         self.logger.debug('undo button pressed')
         my_turn = 0 if self.turn == 2 else 1
+        if self.vs_ai:
+            my_turn = self.turn - 1
         if self.undo_counts[my_turn] < self.max_undo:
-            self.client_socket.send(bytes(str(Actions.UNDO.value), 'utf8'))
+            utils.send_data(self.client_socket, Actions.UNDO.value)
             if self.caretaker.undo():
                 self.board = self.origin.get_state()
                 self.undo_counts[my_turn] += 1
-                self.change_turn()
+                #   against the AI, the server takes back both the AI's reply and the player's move
+                if self.vs_ai:
+                    self.caretaker.undo()
+                    self.board = self.origin.get_state()
+                else:
+                    self.change_turn()
+
+    def handle_ai_move(self, data: bytes) -> None:
+        """
+        Apply the AI's reply that the server sent as a 'column,action' message.
+
+            Parameters:
+                data (bytes): The message from the server.
+        """
+        self.waiting_ai = False
+        try:
+            column, action = (int(v) for v in data.decode('utf8').split(','))
+        except ValueError:
+            self.logger.error('illegal AI move message={}'.format(data))
+            return
+
+        self.logger.debug('AI played column={}, action={}'.format(column, Actions(action)))
+        self.board = utils.add_piece(self.board, column, self.turn)
+        self.origin.set_state(self.board)
+        self.caretaker.do()
+
+        if Actions.WIN.is_equals(action) or Actions.TIE.is_equals(action):
+            self.draw_game_over(is_win=Actions.WIN.is_equals(action))
+            return
+
+        self.change_turn()
+        self.undo_button.button_color = self.get_turn_color()
+        if self.undo_counts[self.turn - 1] < self.max_undo:
+            self.undo_button.set_active(True)
+
+    def handle_profile(self) -> None:
+        """
+        Start profiling both the client and the server, triggered by pressing 'p' while playing.
+        """
+        seconds = self.profile_seconds if self.profile_seconds > 0 else profiling.DEFAULT_SECONDS
+        if profiling.start(seconds, name='client{}'.format(self.id)):
+            utils.send_data(self.client_socket, Actions.PROFILE.value)
+            self.logger.info('profiling for {} seconds'.format(seconds))
 
     def change_turn(self) -> None:
         """
@@ -694,18 +836,26 @@ class ClientGUI:
         """
         action = Actions.UNKNOWN
         self.state = Actions.PRE_GAME
-        time.sleep(1)
 
         should_draw_board = False
         self.reset_button.set_active(False)
         self.undo_button.set_active(False)
+        last_heartbeat = time.monotonic()
 
         while True:
+            #   keep the connection alive while idle, every message is delimited so it never merges with another one
+            if time.monotonic() - last_heartbeat > utils.HEARTBEAT_INTERVAL:
+                utils.send_data(self.client_socket, Actions.HEARTBEAT.value)
+                last_heartbeat = time.monotonic()
+
             #   if received an exit event
             is_exit = utils.wait_for_data(self.client_socket, 0.01)
             if is_exit and Actions.EXIT.is_equals(is_exit):
                 self.logger.debug('received exit event from server')
                 self.exit()
+            elif is_exit and self.waiting_ai:
+                self.handle_ai_move(is_exit)
+                should_draw_board = True
 
             #   iterate over the pygame events
             for event in pygame.event.get():
@@ -750,28 +900,48 @@ class ClientGUI:
                         self.reset_button.set_active(False)
                         continue
 
+                #   start an on-demand profile of the client and the server
+                if event.type == pygame.KEYUP and event.key == pygame.K_p and self.state == Actions.READY:
+                    self.handle_profile()
+                    continue
+
+                #   show or hide the threats over the board
+                if event.type == pygame.KEYUP and event.key == pygame.K_h and self.state == Actions.READY:
+                    self.show_hints = not self.show_hints
+                    should_draw_board = True
+                    continue
+
                 #   if a mouse click event
                 if event.type == pygame.MOUSEBUTTONUP:
                     self.undo_button.set_active(False)
                     self.undo_button.button_color = self.get_turn_color()
-                    if self.state == Actions.READY:
+                    if self.state == Actions.READY and not self.waiting_ai:
                         self.logger.debug('mouse button up event')
 
                         #   get x coordinate of the mouse to calculate the board col
                         col = self.calc_col_by_mouse(event.pos[0])
 
                         #   send player id and col to add
-                        self.client_socket.send(bytes(str(self.turn), 'utf8'))
-                        self.client_socket.send(bytes(str(col), 'utf8'))
+                        utils.send_data(self.client_socket, self.turn)
+                        utils.send_data(self.client_socket, col)
                         self.logger.debug('sent turn={}, col={}'.format(self.turn, col))
 
                         action = utils.wait_for_data(self.client_socket)
+                        if action is None:
+                            self.logger.error('connection to the server lost')
+                            self.exit()
                         self.logger.debug('received action={}'.format(self.id, Actions(int(action))))
 
                         if Actions.EXIT.is_equals(action):
                             self.logger.debug('got exit event from server')
                             self.exit()
 
+                        #   the server owns the turns, a move of the other player is rejected and the board is kept
+                        if Actions.ILLEGAL_DATA.is_equals(action):
+                            self.logger.warning('server rejected the move of player {}'.format(self.turn))
+                            self.clear_top()
+                            self.draw_text_top('Not the turn of player {}'.format(self.turn))
+
                         #   if action is to add a piece
                         if Actions.ADD_PIECE.is_equals(action):
                             self.board = utils.add_piece(self.board, col, self.turn)
@@ -789,6 +959,10 @@ class ClientGUI:
                                 self.exit()
                             elif Actions.WIN.is_equals(action) or Actions.TIE.is_equals(action):
                                 self.draw_game_over(is_win=Actions.WIN.is_equals(action))
+                            elif Actions.CONTINUE.is_equals(action) and self.vs_ai:
+                                #   the server answers with the AI's reply, the board is locked until then
+                                self.change_turn()
+                                self.waiting_ai = True
                             elif Actions.CONTINUE.is_equals(action):
                                 self.logger.debug('current turn({})'.format(self.turn))
                                 if self.undo_counts[self.turn - 1] < self.max_undo:
@@ -806,6 +980,8 @@ class ClientGUI:
 
             if should_draw_board:
                 self.draw_board()
+                if self.show_hints and self.state == Actions.READY:
+                    self.draw_hints()
                 should_draw_board = False
 
             if self.state == Actions.READY:
@@ -819,3 +995,200 @@ class ClientGUI:
 
             # update the main display
             pygame.display.update()
+
+    def open_replay(self, path: str, game: int = 0) -> None:
+        """
+        Open a records file to replay, the games are read from it one at a time when they are shown.
+
+            Parameters:
+                path (str): The path of the records file.
+                game (int): The index of the first game to show, negative counts from the end.
+        """
+        self.records = record.RecordReader(path)
+        self.logger.info('replaying {} games from {}'.format(len(self.records), path))
+        if not len(self.records):
+            self.logger.error('no games to replay in {}'.format(path))
+            self.exit()
+
+        self.load_replay_game(game % len(self.records) if game < 0 else min(game, len(self.records) - 1))
+
+    def load_replay_game(self, index: int) -> None:
+        """
+        Show a game of the records file from its empty board, only the cells that differ from the shown board are
+        redrawn unless the size of the board changed.
+
+            Parameters:
+                index (int): The index of the game in the records file.
+        """
+        game = self.records[index]
+        self.replay_index = index
+        self.replay = record.Replay(game)
+        previous, self.board = self.board, self.replay.board
+
+        if previous is None or previous.shape != self.board.shape or self.n != game.n:
+            #   a new size needs a new window, it is recalculated from the default sizes
+            self.rows, self.cols = game.size
+            self.n = game.n
+            self.square_size, self.font_size = 80, 32
+            self.calc_window_size()
+            self.create_gui()
+            pygame.display.set_caption('Replay {}'.format(self.records.path))
+        else:
+            self.draw_board([(r, c) for r, c, _, _ in record.diff(previous, self.board)])
+
+        self.logger.debug('replay game {} with {} moves'.format(index, len(game)))
+        self.draw_replay_status()
+
+    def seek_replay(self, ply: int) -> None:
+        """
+        Jump to a position of the shown game.
+
+            Parameters:
+                ply (int): Number of moves played.
+        """
+        changed = self.replay.seek(ply)
+        self.board = self.replay.board
+        self.draw_board([(r, c) for r, c, _, _ in changed])
+        self.draw_replay_status()
+
+    def draw_replay_status(self) -> None:
+        """
+        Draw the game index, the move, the speed and the result of the shown game at the top of the screen.
+        """
+        game = self.replay.record
+        pygame.draw.rect(self.main_display, utils.get_color('black'),
+                         (0, 0, self.width, self.square_size * self.options_rows))
+
+        small_font = pygame.font.Font(self.font_style, self.font_size // 2)
+        txt = 'Game {}/{}  x{:g}  {}'.format(self.replay_index + 1, len(self.records), self.replay_speed,
+                                             'playing' if self.replay_playing else 'paused')
+        text = small_font.render(txt, True, utils.get_color('gray'), utils.get_color('black'))
+        text_rect = text.get_rect()
+        text_rect.centerx = self.width // 2
+        text_rect.top = self.square_size // 4
+        self.main_display.blit(text, text_rect)
+
+        #   the result is shown once the last move is reached, in the color of the winner
+        self.state = Actions.READY
+        txt = 'Move {}/{}'.format(self.replay.ply, len(game))
+        if self.replay.ply == len(game) and game.result == record.TIE:
+            self.state = Actions.TIE
+            txt = "It's a tie!"
+        elif self.replay.ply == len(game) and game.result != record.UNFINISHED:
+            self.state = Actions.WIN
+            self.turn = game.result
+            txt = '{} won!'.format(self.get_turn_color())
+        self.draw_text_top(txt)
+
+        pygame.display.update((0, 0, self.width, self.square_size * self.options_rows))
+
+    def handle_replay_key(self, event: pygame.event) -> None:
+        """
+        Handle the keys of the replay viewer:
+        space plays or pauses, left and right step a move, home and end seek to the start and the end of the game,
+        up and down change the speed, page up and page down move between games, 100 games with shift,
+        the digits jump to the tenths of the records file and r reloads it to see the newly recorded games.
+
+            Parameters:
+                event (pygame.Event): The key down event.
+        """
+        count = len(self.records)
+        games = 100 if event.mod & pygame.KMOD_SHIFT else 1
+
+        if event.key == pygame.K_SPACE:
+            self.replay_playing = not self.replay_playing
+            self.draw_replay_status()
+        elif event.key in (pygame.K_RIGHT, pygame.K_LEFT):
+            self.replay_playing = False
+            self.seek_replay(self.replay.ply + (1 if event.key == pygame.K_RIGHT else -1))
+        elif event.key in (pygame.K_HOME, pygame.K_END):
+            self.seek_replay(0 if event.key == pygame.K_HOME else len(self.replay.record))
+        elif event.key in (pygame.K_UP, pygame.K_DOWN):
+            factor = 2 if event.key == pygame.K_UP else 0.5
+            self.replay_speed = min(max(self.replay_speed * factor, 0.25), 256)
+            self.draw_replay_status()
+        elif event.key == pygame.K_PAGEDOWN:
+            self.load_replay_game(min(self.replay_index + games, count - 1))
+        elif event.key == pygame.K_PAGEUP:
+            self.load_replay_game(max(self.replay_index - games, 0))
+        elif pygame.K_0 <= event.key <= pygame.K_9:
+            #   a record is found by its index entry, so a jump costs the same anywhere in the file
+            self.load_replay_game(count * (event.key - pygame.K_0) // 10)
+        elif event.key == pygame.K_r:
+            self.records.refresh()
+            self.logger.info('{} games to replay'.format(len(self.records)))
+            self.draw_replay_status()
+
+    def advance_replay(self, moves: int) -> None:
+        """
+        Play the next moves of the shown game, and continue with the next game once it ended.
+
+            Parameters:
+                moves (int): Number of moves to play.
+        """
+        if self.replay.ply < len(self.replay.record):
+            changed = self.replay.step(moves)
+            self.draw_board([(r, c) for r, c, _, _ in changed])
+            self.draw_replay_status()
+            return
+
+        if self.replay_index + 1 >= len(self.records):
+            #   the server may still be recording, look for new games before pausing
+            self.records.refresh()
+        if self.replay_index + 1 < len(self.records):
+            self.load_replay_game(self.replay_index + 1)
+        else:
+            self.replay_playing = False
+            self.draw_replay_status()
+
+    def run_replay(self) -> None:
+        """
+        The main loop of the replay viewer, the moves are played at the chosen speed while playing.
+        """
+        clock = pygame.time.Clock()
+        last_move = time.monotonic()
+
+        while True:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    self.logger.debug('pygame exit event')
+                    self.exit()
+
+                if event.type == pygame.VIDEORESIZE:
+                    self.width = max(event.w, self.min_width)
+                    self.height = max(event.h, self.min_height)
+                    self.create_gui()
+                    self.draw_replay_status()
+
+                if event.type == pygame.KEYDOWN:
+                    self.handle_replay_key(event)
+                    last_move = time.monotonic()
+
+            #   at high speed a few moves are played per frame, the board is redrawn once for all of them
+            due = int((time.monotonic() - last_move) * self.replay_speed)
+            if not self.replay_playing:
+                last_move = time.monotonic()
+            elif due:
+                last_move += due / self.replay_speed
+                self.advance_replay(due)
+
+            clock.tick(60)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='replay the games of a records file written by the server')
+    parser.add_argument('records', type=str, help='path of the records file')
+    parser.add_argument('--game', default=0, type=int,
+                        help='index of the first game to show, negative counts from the end')
+    parser.add_argument('--log_level', default='info', type=str,
+                        choices=['info', 'debug', 'warning', 'error', 'critical'])
+    args = parser.parse_args()
+
+    level = getattr(logging, args.log_level.upper())
+    log_queue = multiprocessing.Queue(-1)
+    listener = multiprocessing.Process(target=utils.logger_listener, args=(log_queue, level,), daemon=True)
+    listener.start()
+
+    ClientGUI(0, log_queue, level, replay=args.records, replay_game=args.game)
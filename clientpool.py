@@ -0,0 +1,120 @@
+import collections
+import logging
+import multiprocessing
+import multiprocessing.connection
+from typing import *
+
+
+def client_worker(control: multiprocessing.connection.Connection, queue: multiprocessing.Queue,
+                  log_level: int) -> None:
+    """
+    Process target of a warmed client, pays the imports and the pygame setup up front and then waits for its game.
+
+        Parameters:
+            control (Connection):           The end of the pipe to receive the game on.
+            queue (multiprocessing.Queue):  The queue to push the logs in.
+            log_level (int):                The log level to use.
+    """
+    #   the client and pygame are imported in the worker only, the server itself never loads them
+    import pygame
+    import client
+    pygame.init()
+    client.get_font_style()
+
+    try:
+        args = control.recv()
+    except EOFError:
+        return
+    control.close()
+    #   None is sent when the pool is closed
+    if args is None:
+        return
+    client.ClientGUI(args[0], queue, log_level, *args[1:])
+
+
+def cold_client(client_id: int, queue: multiprocessing.Queue, log_level: int, *args) -> None:
+    """
+    Process target of a client that is started without a warmed worker.
+
+        Parameters:
+            client_id (int):                The id of the client.
+            queue (multiprocessing.Queue):  The queue to push the logs in.
+            log_level (int):                The log level to use.
+            args:                           The rest of the ClientGUI arguments.
+    """
+    from client import ClientGUI
+    ClientGUI(client_id, queue, log_level, *args)
+
+
+class ClientPool:
+
+    def __init__(self, size: int, queue: multiprocessing.Queue, log_level: int) -> None:
+        """
+        Create a pool of warmed client processes, each waits on its own pipe for a single game.
+        A worker that got a game is replaced right away, so the next game finds a warmed worker as well.
+
+            Parameters:
+                size (int):                     Number of idle workers to keep, 0 to start every client cold.
+                queue (multiprocessing.Queue):  The queue to push the logs in.
+                log_level (int):                The log level to use.
+        """
+        self.size = size
+        self.queue = queue
+        self.log_level = log_level
+        self.idle = collections.deque()  # (process, control)
+        self.logger = logging.getLogger('ClientPool')
+
+        for _ in range(self.size):
+            self.spawn()
+
+    def spawn(self) -> None:
+        """
+        Start a new idle worker.
+        """
+        reader, writer = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=client_worker, args=(reader, self.queue, self.log_level))
+        process.start()
+        reader.close()
+        self.idle.append((process, writer))
+
+    def launch(self, client_id: int, *args) -> multiprocessing.Process:
+        """
+        Hand a game to an idle worker, or start a cold client if there is none.
+
+            Parameters:
+                client_id (int):    The id of the client.
+                args:               The rest of the ClientGUI arguments, after the queue and the log level.
+
+            Returns:
+                process (Process): The process that runs the client.
+        """
+        while self.idle:
+            process, control = self.idle.popleft()
+            try:
+                control.send((client_id,) + args)
+            except OSError:
+                self.logger.warning('dropping dead worker pid={}'.format(process.pid))
+                continue
+            finally:
+                control.close()
+            self.spawn()
+            self.logger.debug('Client({}) launched on warmed worker pid={}'.format(client_id, process.pid))
+            return process
+
+        process = multiprocessing.Process(target=cold_client,
+                                          args=(client_id, self.queue, self.log_level) + args)
+        process.start()
+        return process
+
+    def close(self) -> None:
+        """
+        Release the idle workers.
+        """
+        while self.idle:
+            process, control = self.idle.popleft()
+            try:
+                control.send(None)
+            except OSError:
+                pass
+            control.close()
+            process.join(1)
@@ -0,0 +1,458 @@
+import argparse
+import json
+import logging
+import os
+from typing import *
+
+import numpy as np
+from numpy.lib import format as npy_format
+
+import ai
+import record
+import zobrist
+from actions import Actions
+from game import Game
+
+MANIFEST = 'manifest.json'
+SOURCES = 'sources.json'
+DEFAULT_SHARD_SIZE = 1 << 16
+#   positions kept in memory before they are appended to the shard
+FLUSH_SIZE = 4096
+
+#   outcome for the player to move
+WIN, TIE, LOSS = 1, 0, -1
+
+
+class NpyAppender:
+
+    def __init__(self, path: str, dtype: np.dtype, row_shape: Tuple[int, ...]) -> None:
+        """
+        Open a .npy file whose rows can be appended, np.load(path, mmap_mode='r') maps it at any time.
+        The header is rewritten in place after every append, numpy leaves room in it for the first axis to grow.
+        Rows past the length in the header, i.e. of an append that was cut, are dropped when the file is opened.
+
+            Parameters:
+                path (str):         The path of the file.
+                dtype (np.dtype):   The type of the array.
+                row_shape (tuple):  The shape of a single row.
+        """
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.row_size = self.dtype.itemsize * int(np.prod(row_shape, dtype=np.int64))
+        self.count = 0
+
+        if os.path.exists(path):
+            self.file = open(path, 'rb+')
+            npy_format.read_magic(self.file)
+            shape, _, dtype = npy_format.read_array_header_1_0(self.file)
+            if dtype != self.dtype or shape[1:] != self.row_shape:
+                raise ValueError('{} holds {} {}, expected {} {}'.format(path, dtype, shape[1:], self.dtype,
+                                                                          self.row_shape))
+            self.offset = self.file.tell()
+            self.count = shape[0]
+        else:
+            self.file = open(path, 'wb+')
+            self.write_header()
+            self.offset = self.file.tell()
+        self.truncate(self.count)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def write_header(self) -> None:
+        """
+        Write the header of the current length at the start of the file.
+        """
+        self.file.seek(0)
+        npy_format.write_array_header_1_0(self.file, {
+            'descr': npy_format.dtype_to_descr(self.dtype),
+            'fortran_order': False,
+            'shape': (self.count,) + self.row_shape,
+        })
+
+    def truncate(self, count: int) -> None:
+        """
+        Drop the rows from a given length onwards.
+
+            Parameters:
+                count (int): The number of rows to keep.
+        """
+        self.count = min(count, self.count)
+        self.file.truncate(self.offset + self.count * self.row_size)
+        self.write_header()
+        self.file.flush()
+
+    def append(self, rows: np.ndarray) -> None:
+        """
+        Append rows, the data is written before the header that makes it visible.
+
+            Parameters:
+                rows (np.ndarray): The rows, of shape (count,) + row_shape.
+        """
+        rows = np.ascontiguousarray(rows, dtype=self.dtype)
+        self.file.seek(self.offset + self.count * self.row_size)
+        self.file.write(rows.tobytes())
+        self.count += len(rows)
+        self.write_header()
+        if self.file.tell() != self.offset:
+            raise ValueError('{} header outgrew its space'.format(self.path))
+        self.file.flush()
+
+    def close(self) -> None:
+        """
+        Close the file.
+        """
+        self.file.close()
+
+
+class ShardWriter:
+
+    def __init__(self, folder: str, rows: int, cols: int, n: int, planes: bool = False,
+                 shard_size: int = DEFAULT_SHARD_SIZE) -> None:
+        """
+        Create the dataset of a board configuration, a folder of shards with a manifest.
+        Every shard is a set of .npy files of the same length: the boards, the side to move, the legal columns, the
+        chosen column, the outcome for the side to move and the zobrist key of the position.
+        A position is only added once, by its key.
+
+            Parameters:
+                folder (str):       The folder of the configuration.
+                rows (int):         Number of rows.
+                cols (int):         Number of columns.
+                n (int):            Value for n-in-a-row.
+                planes (bool):      Whether to store the boards as a bit plane per player instead of int8 player ids,
+                                    default False. Must match the existing shards of the folder.
+                shard_size (int):   Maximum positions in a shard, default 65536.
+        """
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self.folder = folder
+        self.rows, self.cols, self.n = rows, cols, n
+        self.planes = planes
+        self.shard_size = shard_size
+        self.table = zobrist.get_table(rows, cols)
+        self.shards = []
+        self.logger = logging.getLogger('Dataset')
+
+        manifest_path = os.path.join(folder, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            self.planes = manifest['planes']
+            self.shard_size = manifest['shard_size']
+        #   the shards are listed from the folder, the last one may be newer than the manifest
+        self.shards = sorted(name[:-len('.keys.npy')] for name in os.listdir(folder) if name.endswith('.keys.npy'))
+
+        board_shape = (2, rows, cols) if self.planes else (rows, cols)
+        self.arrays = {
+            'boards': (np.uint8 if self.planes else np.int8, board_shape),
+            'side': (np.int8, ()),
+            'legal': (np.bool_, (cols,)),
+            'move': (np.int8, ()),
+            'outcome': (np.int8, ()),
+            'keys': (np.uint64, ()),
+        }
+
+        #   the keys of all the shards, every one is mapped and not loaded
+        self.seen = set()
+        for name in self.shards:
+            keys = np.load(self.shard_path(name, 'keys'), mmap_mode='r')
+            self.seen.update(keys.tolist())
+
+        self.files = None
+        self.buffer = {name: [] for name in self.arrays}
+        self.open_shard()
+
+    def shard_path(self, shard: str, array: str) -> str:
+        """
+        Get the path of an array of a shard.
+
+            Parameters:
+                shard (str):    The name of the shard.
+                array (str):    The name of the array.
+
+            Returns:
+                path (str): The path of the .npy file.
+        """
+        return os.path.join(self.folder, '{}.{}.npy'.format(shard, array))
+
+    def open_shard(self) -> None:
+        """
+        Open the last shard for appending, or a new one if it is full.
+        """
+        if self.files:
+            for f in self.files.values():
+                f.close()
+
+        if not self.shards:
+            self.shards.append('shard-00000')
+        files = {name: NpyAppender(self.shard_path(self.shards[-1], name), dtype, shape)
+                 for name, (dtype, shape) in self.arrays.items()}
+        #   an append that was cut may have reached only some of the arrays
+        count = min(len(f) for f in files.values())
+        for f in files.values():
+            f.truncate(count)
+
+        if count >= self.shard_size:
+            for f in files.values():
+                f.close()
+            self.shards.append('shard-{:05d}'.format(len(self.shards)))
+            files = {name: NpyAppender(self.shard_path(self.shards[-1], name), dtype, shape)
+                     for name, (dtype, shape) in self.arrays.items()}
+        self.files = files
+
+    def add_game(self, game: record.GameRecord) -> int:
+        """
+        Add the positions of a finished game, the positions that were already added are skipped.
+
+            Parameters:
+                game (GameRecord): The game to add.
+
+            Returns:
+                added (int): Number of new positions.
+        """
+        if game.result == record.UNFINISHED:
+            return 0
+
+        board = np.zeros(game.size, dtype=np.int8)
+        key = 0
+        added = 0
+        for ply, column in enumerate(game.moves):
+            player = game.player(ply)
+            position_key = key ^ (self.table.side if player == 2 else 0)
+            if position_key not in self.seen:
+                self.seen.add(position_key)
+                self.add_position(board, player, column, game.result, position_key)
+                added += 1
+            row = record.drop(board, column, player)
+            key ^= self.table.cell_keys(row, column, player)[0]
+        return added
+
+    def add_position(self, board: np.ndarray, player: int, column: int, result: int, key: int) -> None:
+        """
+        Buffer a single position, it is written with the next flush.
+
+            Parameters:
+                board (np.ndarray): The position.
+                player (int):       The player to move.
+                column (int):       The column that was played.
+                result (int):       The result of the game, the winner id or TIE.
+                key (int):          The zobrist key of the position and the side to move.
+        """
+        buffer = self.buffer
+        buffer['boards'].append(np.stack((board == 1, board == 2)) if self.planes else board.copy())
+        buffer['side'].append(player)
+        buffer['legal'].append(board[0] == 0)
+        buffer['move'].append(column)
+        buffer['outcome'].append(TIE if result == record.TIE else WIN if result == player else LOSS)
+        buffer['keys'].append(key)
+        if len(buffer['keys']) >= FLUSH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Append the buffered positions to the shards, a full shard is followed by a new one.
+        """
+        while self.buffer['keys']:
+            room = self.shard_size - len(self.files['keys'])
+            for name, (dtype, shape) in self.arrays.items():
+                rows = self.buffer[name][:room]
+                self.files[name].append(np.array(rows, dtype=dtype).reshape((len(rows),) + shape))
+                del self.buffer[name][:room]
+            if len(self.files['keys']) >= self.shard_size:
+                self.open_shard()
+
+    def write_manifest(self) -> None:
+        """
+        Write the manifest of the configuration, replacing the previous one at once.
+        """
+        shards = []
+        for name in self.shards:
+            if name == self.shards[-1]:
+                count = len(self.files['keys'])
+            else:
+                count = len(np.load(self.shard_path(name, 'keys'), mmap_mode='r'))
+            shards.append({'name': name, 'count': count})
+
+        manifest = {
+            'rows': self.rows,
+            'cols': self.cols,
+            'n': self.n,
+            'planes': self.planes,
+            'shard_size': self.shard_size,
+            'arrays': {name: {'dtype': np.dtype(dtype).str, 'shape': list(shape)}
+                       for name, (dtype, shape) in self.arrays.items()},
+            'shards': shards,
+            'positions': sum(s['count'] for s in shards),
+        }
+        path = os.path.join(self.folder, MANIFEST)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def close(self) -> None:
+        """
+        Flush the positions, write the manifest and close the shard.
+        """
+        self.flush()
+        self.write_manifest()
+        for f in self.files.values():
+            f.close()
+
+
+class DatasetExporter:
+
+    def __init__(self, folder: str, planes: bool = False, shard_size: int = DEFAULT_SHARD_SIZE) -> None:
+        """
+        Export games to a dataset folder, with a sub folder of shards per board configuration named ROWSxCOLSxN.
+
+            Parameters:
+                folder (str):       The folder of the dataset.
+                planes (bool):      Whether to store the boards as bit planes, default False.
+                shard_size (int):   Maximum positions in a shard, default 65536.
+        """
+        self.folder = folder
+        self.planes = planes
+        self.shard_size = shard_size
+        self.writers = {}  # (rows, cols, n) -> ShardWriter
+        self.sources = {}  # records file -> number of its games that were exported
+        self.logger = logging.getLogger('Dataset')
+
+        if os.path.exists(os.path.join(folder, SOURCES)):
+            with open(os.path.join(folder, SOURCES)) as f:
+                self.sources = json.load(f)
+
+    def writer(self, rows: int, cols: int, n: int) -> ShardWriter:
+        """
+        Get the writer of a board configuration, opened on first use.
+
+            Parameters:
+                rows (int): Number of rows.
+                cols (int): Number of columns.
+                n (int):    Value for n-in-a-row.
+
+            Returns:
+                writer (ShardWriter): The writer of the configuration.
+        """
+        config = (rows, cols, n)
+        if config not in self.writers:
+            folder = os.path.join(self.folder, '{}x{}x{}'.format(*config))
+            self.writers[config] = ShardWriter(folder, rows, cols, n, self.planes, self.shard_size)
+        return self.writers[config]
+
+    def add_game(self, game: record.GameRecord) -> int:
+        """
+        Add the positions of a game to the dataset of its configuration.
+
+            Parameters:
+                game (GameRecord): The game to add.
+
+            Returns:
+                added (int): Number of new positions.
+        """
+        return self.writer(game.size[0], game.size[1], game.n).add_game(game)
+
+    def export_records(self, path: str) -> int:
+        """
+        Export the games of a records file that were not exported in a previous run, the games are streamed from
+        the file.
+
+            Parameters:
+                path (str): The path of the records file.
+
+            Returns:
+                added (int): Number of new positions.
+        """
+        source = os.path.abspath(path)
+        reader = record.RecordReader(path)
+        added = 0
+        for game in reader.iterate(self.sources.get(source, 0)):
+            added += self.add_game(game)
+        self.sources[source] = len(reader)
+        reader.close()
+        self.logger.info('exported {} new positions from {}'.format(added, path))
+        return added
+
+    def export_selfplay(self, first: str, second: str, games: int, size: Tuple[int, int], n: int) -> int:
+        """
+        Play games between two AI players and export them, the players alternate who plays first.
+
+            Parameters:
+                first (str):    Spec of one player, see ai.create_player.
+                second (str):   Spec of the other player.
+                games (int):    Number of games.
+                size (tuple):   The size of the board.
+                n (int):        Value for n-in-a-row.
+
+            Returns:
+                added (int): Number of new positions.
+        """
+        added = 0
+        for g in range(games):
+            specs = (first, second) if g % 2 == 0 else (second, first)
+            players = {1: ai.create_player(specs[0]), 2: ai.create_player(specs[1])}
+            game = Game(size, n)
+            result = Actions.CONTINUE
+            while result == Actions.CONTINUE:
+                result = game.play(players[game.turn].choose(game.board, game.turn, game.n))
+            added += self.add_game(game.to_record())
+        self.logger.info('exported {} new positions from {} games of {} vs {}'.format(added, games, first, second))
+        return added
+
+    def close(self) -> None:
+        """
+        Flush all the configurations and write their manifests, then the progress of the records files.
+        """
+        for writer in self.writers.values():
+            writer.close()
+
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        #   written last, the positions of a cut export are skipped by their keys when it is run again
+        path = os.path.join(self.folder, SOURCES)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.sources, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+
+def load_shards(folder: str) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Map the shards of a configuration folder one at a time, nothing is read until it is used.
+
+        Parameters:
+            folder (str): The folder of the configuration, i.e. dataset/6x7x4.
+
+        Returns:
+            shards (iterator): The arrays of every shard by name, memory mapped.
+    """
+    with open(os.path.join(folder, MANIFEST)) as f:
+        manifest = json.load(f)
+    for shard in manifest['shards']:
+        arrays = {name: np.load(os.path.join(folder, '{}.{}.npy'.format(shard['name'], name)), mmap_mode='r')
+                  for name in manifest['arrays']}
+        #   a shard may have grown since the manifest was written
+        yield {name: array[:shard['count']] for name, array in arrays.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export games as memory mappable .npy shards.')
+    parser.add_argument('folder', type=str, help='folder of the dataset')
+    parser.add_argument('--records', nargs='*', default=[], help='records files written by the server')
+    parser.add_argument('--selfplay', nargs=2, default=None, metavar=('FIRST', 'SECOND'),
+                        help='specs of two AI players to play games between, i.e. random negamax:2')
+    parser.add_argument('--games', default=100, type=int, help='number of self played games')
+    parser.add_argument('--config', default='6x7x4', type=str, help='board configuration ROWSxCOLSxN of self play')
+    parser.add_argument('--planes', action='store_true', help='store the boards as a bit plane per player')
+    parser.add_argument('--shard_size', default=DEFAULT_SHARD_SIZE, type=int, help='maximum positions in a shard')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)-10s %(levelname)-8s; %(message)s;')
+
+    exporter = DatasetExporter(args.folder, args.planes, args.shard_size)
+    for path in args.records:
+        exporter.export_records(path)
+    if args.selfplay:
+        rows, cols, n = (int(v) for v in args.config.lower().split('x'))
+        exporter.export_selfplay(args.selfplay[0], args.selfplay[1], args.games, (rows, cols), n)
+    exporter.close()
@@ -0,0 +1,242 @@
+import functools
+from typing import *
+
+import numpy as np
+
+import geometry
+
+ThreatSummary = NamedTuple('ThreatSummary', [('wins', Tuple[int, int]), ('threats', Tuple[int, int])])
+
+
+@functools.lru_cache(maxsize=None)
+def get_cell_lines(rows: int, cols: int, n: int) -> List[List[int]]:
+    """
+    Get the lines through every cell of a board configuration as python lists, faster than numpy for single cells.
+
+        Parameters:
+            rows (int): Number of rows.
+            cols (int): Number of columns.
+            n (int):    Value for n-in-a-row.
+
+        Returns:
+            cell_lines (list): The line indices per flat cell index.
+    """
+    return [lines.tolist() for lines in geometry.get_geometry(rows, cols, n).cell_lines]
+
+
+class EvalState:
+
+    def __init__(self, rows: int, cols: int, n: int) -> None:
+        """
+        Create the evaluation state of an empty board: the pieces of both players on every line, the static score and
+        the threats. A drop or an undo only updates the lines through its cell, so the score and the threats are
+        read in O(1) at every node of a search.
+        The moves follow utils.add_piece, an out of board or full column is refused and leaves the state untouched,
+        and undo follows CareTaker.undo, it is refused once there is nothing to take back.
+
+            Parameters:
+                rows (int): Number of rows.
+                cols (int): Number of columns.
+                n (int):    Value for n-in-a-row.
+        """
+        self.rows, self.cols, self.n = rows, cols, n
+        self.cell_lines = get_cell_lines(rows, cols, n)
+        num_lines = geometry.get_geometry(rows, cols, n).num_lines
+
+        #   same weights as ai.evaluate, a line open for a single player is worth 4^(pieces - 1)
+        self.weights = [0] + [4 ** i for i in range(n)]
+        self.counts = ([0] * num_lines, [0] * num_lines)  # player 1 is index 0
+        self.value = 0  # the score for player 1
+        self.wins = [0, 0]  # lines completed by each player
+        self.threats = [0, 0]  # lines missing a single piece of a player, with none of the opponent
+        self.heights = [0] * cols
+        self.board = np.zeros((rows, cols), dtype=np.int8)
+        self.history = []
+        self.last_won = False
+
+    @classmethod
+    def from_board(cls, board: np.ndarray, n: int) -> 'EvalState':
+        """
+        Create the evaluation state of a board, its pieces can not be undone.
+
+            Parameters:
+                board (np.ndarray): The board.
+                n (int):            Value for n-in-a-row.
+
+            Returns:
+                state (EvalState): The state of the board.
+        """
+        board = np.asarray(board, dtype=np.int8)
+        rows, cols = board.shape
+        state = cls(rows, cols, n)
+        geo = geometry.get_geometry(rows, cols, n)
+        state.board[:] = board
+        state.heights = (board != 0).sum(axis=0).tolist()
+        state.counts = (geo.line_counts(board, 1).tolist(), geo.line_counts(board, 2).tolist())
+
+        weights = state.weights
+        for mine, theirs in zip(*state.counts):
+            if theirs == 0:
+                state.value += weights[mine]
+            elif mine == 0:
+                state.value -= weights[theirs]
+            for player, count, other in ((0, mine, theirs), (1, theirs, mine)):
+                if other == 0 and count == n:
+                    state.wins[player] += 1
+                elif other == 0 and count == n - 1:
+                    state.threats[player] += 1
+        return state
+
+    def __len__(self) -> int:
+        return len(self.history)
+
+    def drop(self, column: int, player: int) -> Optional[int]:
+        """
+        Drop a piece, last_won tells if it completed a line.
+
+            Parameters:
+                column (int):   The column index to add.
+                player (int):   The player id to add.
+
+            Returns:
+                row (int): The row of the new piece, or None if the column is out of the board or full.
+        """
+        if not self.cols > column >= 0 or self.heights[column] >= self.rows:
+            return None
+        row = self.rows - 1 - self.heights[column]
+        self.heights[column] += 1
+        self.board[row, column] = player
+        self.history.append((row, column, player))
+        self.last_won = self.update(row * self.cols + column, player, 1)
+        return row
+
+    def undo(self) -> bool:
+        """
+        Take back the last piece.
+
+            Returns:
+                performed (bool): True if there was a piece to take back, False otherwise.
+        """
+        if not self.history:
+            return False
+        row, column, player = self.history.pop()
+        self.heights[column] -= 1
+        self.board[row, column] = 0
+        self.update(row * self.cols + column, player, -1)
+        self.last_won = False
+        return True
+
+    def update(self, cell: int, player: int, delta: int) -> bool:
+        """
+        Add or remove a piece of a player on every line through a cell.
+
+            Parameters:
+                cell (int):     The flat index of the cell.
+                player (int):   The player id of the piece.
+                delta (int):    1 to add the piece, -1 to remove it.
+
+            Returns:
+                won (bool): True if the piece completed a line, False otherwise.
+        """
+        mine, theirs = self.counts[player - 1], self.counts[2 - player]
+        weights, n = self.weights, self.n
+        me, other = player - 1, 2 - player
+        change = 0
+        won = False
+        for line in self.cell_lines[cell]:
+            before, opponent = mine[line], theirs[line]
+            after = before + delta
+            mine[line] = after
+            if opponent == 0:
+                #   the line stays open for the player only
+                change += weights[after] - weights[before]
+                if after == n:
+                    self.wins[me] += 1
+                    won = True
+                elif before == n:
+                    self.wins[me] -= 1
+                if after == n - 1:
+                    self.threats[me] += 1
+                elif before == n - 1:
+                    self.threats[me] -= 1
+            elif before == 0 or after == 0:
+                #   the line is blocked, or unblocked, for the opponent
+                sign = 1 if after == 0 else -1
+                change -= sign * weights[opponent]
+                if opponent == n - 1:
+                    self.threats[other] += sign
+        self.value += change if player == 1 else -change
+        return won
+
+    def score(self, player: int) -> int:
+        """
+        The static evaluation of the board, equal to ai.evaluate.
+
+            Parameters:
+                player (int): The player to evaluate for.
+
+            Returns:
+                score (int): Positive if the board is better for the player.
+        """
+        return self.value if player == 1 else -self.value
+
+    def is_won(self, player: int) -> bool:
+        """
+        Check if a player completed a line anywhere on the board.
+
+            Parameters:
+                player (int): The player id to check.
+
+            Returns:
+                won (bool): True if there is n-in-a-row, False otherwise.
+        """
+        return self.wins[player - 1] > 0
+
+    def summary(self) -> ThreatSummary:
+        """
+        The number of completed lines and of lines missing a single piece, of both players.
+
+            Returns:
+                summary (ThreatSummary): The wins and threats, player 1 first.
+        """
+        return ThreatSummary(tuple(self.wins), tuple(self.threats))
+
+    def winning_columns(self, player: int) -> List[int]:
+        """
+        Get the columns that win right away for a player, only the lines through the top of every column are read.
+
+            Parameters:
+                player (int): The player id.
+
+            Returns:
+                columns (list): The column indices.
+        """
+        if not self.threats[player - 1]:
+            return []
+        mine, theirs = self.counts[player - 1], self.counts[2 - player]
+        target = self.n - 1
+        columns = []
+        for column, height in enumerate(self.heights):
+            if height < self.rows:
+                cell = (self.rows - 1 - height) * self.cols + column
+                if any(mine[line] == target and theirs[line] == 0 for line in self.cell_lines[cell]):
+                    columns.append(column)
+        return columns
+
+    def order_columns(self, player: int, columns: List[int]) -> List[int]:
+        """
+        Order the moves of a search like threats.order_columns: the winning columns first, then the blocking ones.
+
+            Parameters:
+                player (int):   The player to move.
+                columns (list): The columns in their default order.
+
+            Returns:
+                columns (list): The same columns, reordered.
+        """
+        wins = self.winning_columns(player)
+        blocks = self.winning_columns(1 if player == 2 else 2)
+        if not wins and not blocks:
+            return columns
+        first = wins + [c for c in blocks if c not in wins]
+        return first + [c for c in columns if c not in first]
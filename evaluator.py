@@ -0,0 +1,253 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import *
+
+import numpy as np
+
+
+def encode(boards: np.ndarray, players: np.ndarray) -> np.ndarray:
+    """
+    Encode boards from the point of view of the player to move, as two planes of the player's and the opponent's
+    pieces.
+
+        Parameters:
+            boards (np.ndarray):    Boards of shape (batch, rows, cols).
+            players (np.ndarray):   The player to move on every board.
+
+        Returns:
+            features (np.ndarray): Features of shape (batch, 2 * rows * cols).
+    """
+    boards = np.asarray(boards)
+    flat = boards.reshape(len(boards), -1)
+    players = np.asarray(players, dtype=flat.dtype)[:, None]
+    mine = flat == players
+    theirs = (flat != 0) & ~mine
+    return np.concatenate([mine, theirs], axis=1).astype(np.float32)
+
+
+class Model:
+
+    def __init__(self, weights: List[np.ndarray], biases: List[np.ndarray]) -> None:
+        """
+        Create a policy/value network, a single layer is a linear model and more layers are an MLP with ReLU.
+        The last layer outputs one policy logit per column followed by the value.
+
+            Parameters:
+                weights (list): The weights matrix of every layer, of shape (inputs, outputs).
+                biases (list):  The bias vector of every layer.
+        """
+        self.weights = [np.asarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+
+    @property
+    def num_inputs(self) -> int:
+        return self.weights[0].shape[0]
+
+    def forward(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run a batch through the network.
+
+            Parameters:
+                features (np.ndarray): Features of shape (batch, inputs), see encode.
+
+            Returns:
+                policy (np.ndarray):    Softmax over the columns, of shape (batch, cols).
+                value (np.ndarray):     Expected outcome for the player to move in [-1, 1], of shape (batch,).
+        """
+        x = features
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            x = x @ w + b
+            if i < len(self.weights) - 1:
+                np.maximum(x, 0, out=x)
+
+        logits, value = x[:, :-1], x[:, -1]
+        logits = logits - logits.max(axis=1, keepdims=True)
+        policy = np.exp(logits)
+        policy /= policy.sum(axis=1, keepdims=True)
+        return policy, np.tanh(value)
+
+    def save(self, path: str) -> None:
+        """
+        Save the network as a .npz weights file.
+
+            Parameters:
+                path (str): The path of the file.
+        """
+        arrays = {}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays['w{}'.format(i)] = w
+            arrays['b{}'.format(i)] = b
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> 'Model':
+        """
+        Load a network from a .npz weights file with arrays w0, b0, w1, b1, ...
+
+            Parameters:
+                path (str): The path of the file.
+
+            Returns:
+                model (Model): The loaded network.
+        """
+        with np.load(path) as data:
+            layers = len([k for k in data.files if k.startswith('w')])
+            weights = [data['w{}'.format(i)] for i in range(layers)]
+            biases = [data['b{}'.format(i)] for i in range(layers)]
+        return cls(weights, biases)
+
+    @classmethod
+    def random(cls, rows: int, cols: int, hidden: Sequence[int] = (64,), seed: Optional[int] = None) -> 'Model':
+        """
+        Create a network with random weights, i.e. as the starting point of training.
+
+            Parameters:
+                rows (int):         Number of rows.
+                cols (int):         Number of columns.
+                hidden (list):      Sizes of the hidden layers, empty for a linear model, default (64,).
+                seed (int):         Seed of the random generator, default None.
+
+            Returns:
+                model (Model): The new network.
+        """
+        rng = np.random.default_rng(seed)
+        sizes = [2 * rows * cols] + list(hidden) + [cols + 1]
+        weights = [rng.normal(0, np.sqrt(2 / i), (i, o)) for i, o in zip(sizes[:-1], sizes[1:])]
+        biases = [np.zeros(o) for o in sizes[1:]]
+        return cls(weights, biases)
+
+
+class _Request:
+
+    def __init__(self, features: np.ndarray) -> None:
+        """
+        Create a pending evaluation of one or more positions.
+
+            Parameters:
+                features (np.ndarray): The encoded positions.
+        """
+        self.features = features
+        self.policy = None
+        self.value = None
+        self.done = threading.Event()
+
+
+class BatchEvaluator(threading.Thread):
+
+    def __init__(self, model: Model, max_batch_size: int = 64, max_wait: float = 0.002) -> None:
+        """
+        Create a service that collects evaluation requests from all the games and runs them through the model in
+        micro-batches. A batch is run as soon as it is full, or when the oldest request waited max_wait seconds.
+
+            Parameters:
+                model (Model):          The network to evaluate with.
+                max_batch_size (int):   Maximum positions in a single batch, default 64.
+                max_wait (float):       Maximum seconds a request waits for the batch to fill, default 2ms.
+        """
+        super().__init__(daemon=True)
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.positions = 0
+        self.logger = logging.getLogger('Evaluator')
+
+    def evaluate(self, boards: np.ndarray, players: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Evaluate positions, blocking until their batch was run.
+
+            Parameters:
+                boards (np.ndarray):    Boards of shape (batch, rows, cols).
+                players (np.ndarray):   The player to move on every board.
+
+            Returns:
+                policy (np.ndarray):    Softmax over the columns, of shape (batch, cols).
+                value (np.ndarray):     Expected outcome for the player to move, of shape (batch,).
+        """
+        request = _Request(encode(boards, players))
+        self.requests.put(request)
+        request.done.wait()
+        return request.policy, request.value
+
+    def run(self) -> None:
+        """
+        Collect the pending requests into batches and run them.
+        """
+        while True:
+            batch = [self.requests.get()]
+            size = len(batch[0].features)
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request.features)
+
+            try:
+                policy, value = self.model.forward(np.concatenate([r.features for r in batch]))
+            except Exception as e:
+                self.logger.error('evaluation failed: {}'.format(str(e)))
+                policy, value = None, None
+
+            start = 0
+            for request in batch:
+                end = start + len(request.features)
+                if policy is not None:
+                    request.policy, request.value = policy[start:end], value[start:end]
+                request.done.set()
+                start = end
+
+            self.batches += 1
+            self.positions += size
+
+
+class EvaluatorPool:
+
+    def __init__(self, weights_folder: str = 'weights', max_batch_size: int = 64, max_wait: float = 0.002) -> None:
+        """
+        Create one batch evaluator per board size, each with the weights file '<rows>x<cols>.npz' of the folder.
+
+            Parameters:
+                weights_folder (str):   The folder of the weights files, default 'weights'.
+                max_batch_size (int):   Maximum positions in a single batch, default 64.
+                max_wait (float):       Maximum seconds a request waits for the batch to fill, default 2ms.
+        """
+        self.weights_folder = weights_folder
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.evaluators = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger('Evaluator')
+
+    def get(self, rows: int, cols: int) -> Optional[BatchEvaluator]:
+        """
+        Get the evaluator of a board size, loading its weights on first use.
+
+            Parameters:
+                rows (int): Number of rows.
+                cols (int): Number of columns.
+
+            Returns:
+                evaluator (BatchEvaluator): The evaluator, or None if there is no weights file for the size.
+        """
+        with self.lock:
+            if (rows, cols) not in self.evaluators:
+                path = os.path.join(self.weights_folder, '{}x{}.npz'.format(rows, cols))
+                evaluator = None
+                if os.path.exists(path):
+                    evaluator = BatchEvaluator(Model.load(path), self.max_batch_size, self.max_wait)
+                    evaluator.start()
+                    self.logger.info('loaded {}'.format(path))
+                else:
+                    self.logger.warning('no weights file {}'.format(path))
+                self.evaluators[(rows, cols)] = evaluator
+            return self.evaluators[(rows, cols)]
@@ -0,0 +1,411 @@
+import itertools
+import threading
+from typing import *
+
+import numpy as np
+
+import record
+import session
+import utils
+import zobrist
+from actions import Actions
+from memento import Originator, CareTaker
+
+#   public ids of the games, i.e. to watch them, unlike the session tokens they grant no control of the game
+_game_ids = itertools.count(1)
+
+ENGINES = ('auto', 'dense', 'bitboard')
+#   the largest configuration of any engine
+MAX_SIZE = 50
+MAX_N = 10
+#   the largest configuration of the dense engine when the engine is picked automatically
+DENSE_MAX_CELLS = 100
+DENSE_MAX_N = 6
+
+
+class Game:
+    engine = 'dense'
+
+    def __init__(self, size: utils.Couple, n: int = 4, token: Optional[int] = None,
+                 max_undo: Optional[int] = None) -> None:
+        """
+        Create the server side state of a single game.
+        The game owns whose turn it is and the undo budget of each player, the clients are never trusted with them.
+
+            Parameters:
+                size (tuple):   The size of the board.
+                n (int):        Value for n-in-a-row, default 4.
+                token (int):    The session token of the game, default None to create a new one.
+                max_undo (int): Maximum allowed undo per player, default None for no limit.
+        """
+        self.size = tuple(size)
+        self.n = n
+        self.max_undo = max_undo
+        self.token = token if token else session.new_token()
+        self.id = next(_game_ids)
+        self.lock = threading.Lock()
+        #   called as on_change(action, value) for every change of the game, see SpectatorServer.publish
+        self.on_change = None
+
+        self.board = None
+        self.origin = None
+        self.caretaker = None
+        self.turn = 1
+        self.first = 1
+        self.over = False
+        self.moves = []
+        self.move_counts = [0, 0]
+        self.undo_counts = [0, 0]
+        self.hash = zobrist.ZobristHash(*self.size)
+
+        self.reset()
+
+    def reset(self, first: int = 1) -> None:
+        """
+        Reset the board, the undo history, the counters and the turn.
+
+            Parameters:
+                first (int): The player that plays first, default 1.
+        """
+        self.clear_board()
+
+        self.turn = first
+        self.first = first
+        self.over = False
+        self.moves = []
+        self.move_counts = [0, 0]
+        self.undo_counts = [0, 0]
+        self.hash.reset()
+
+        if self.on_change:
+            self.on_change(Actions.RESET, first)
+
+    def clear_board(self) -> None:
+        """
+        Empty the board and its undo history.
+        """
+        self.board = np.zeros(self.size, dtype=np.int8)
+
+        self.origin = Originator()
+        self.caretaker = CareTaker(self.origin)
+
+        self.origin.set_state(self.board)
+        self.caretaker.do()
+
+    def take_back(self) -> None:
+        """
+        Restore the board from before the last piece.
+        """
+        self.caretaker.undo()
+        self.board = self.origin.get_state()
+
+    def is_valid(self, column: int) -> bool:
+        """
+        Check if a column is on the board and not full.
+
+            Parameters:
+                column (int): The column index.
+
+            Returns:
+                valid (bool): True if a piece can be added to the column, False otherwise.
+        """
+        return utils.is_valid_location(column, self.board)
+
+    def is_won(self, player: int) -> bool:
+        """
+        Check if a player has n-in-a-row.
+
+            Parameters:
+                player (int): The player id to check.
+
+            Returns:
+                won (bool): True if there is n-in-a-row, False otherwise.
+        """
+        return utils.is_won(self.board, player, self.n)
+
+    def is_full(self) -> bool:
+        """
+        Check if the board is full.
+
+            Returns:
+                full (bool): True if there are no valid locations, False otherwise.
+        """
+        return utils.is_board_full(self.board)
+
+    @property
+    def last_player(self) -> int:
+        """
+        The player of the last move, the turn does not pass after the last move of a finished game.
+        """
+        return self.turn if self.over else 3 - self.turn
+
+    def change_turn(self) -> None:
+        """
+        Change the turn between the players.
+        """
+        self.turn = 1 if self.turn == 2 else 2
+
+    def add_piece(self, column: int) -> None:
+        """
+        Add a piece of the current player and save it in the undo history, the column must be a valid location.
+
+            Parameters:
+                column (int): The column index to add.
+        """
+        self.board = utils.add_piece(self.board, column, self.turn)
+        self.origin.set_state(self.board)
+        self.caretaker.do()
+        self.moves.append(column)
+        self.move_counts[self.turn - 1] += 1
+
+        #   the new piece is the highest one of its column
+        row = int(np.argmax(self.board[:, column] != 0))
+        self.hash.push(row, column, self.turn)
+
+    def play(self, column: int, player: Optional[int] = None) -> Actions:
+        """
+        Validate and play a single move, then pass the turn if the game continues.
+        The turn and the location are validated in the same pass, before anything changes.
+
+            Parameters:
+                column (int):   The column index to add.
+                player (int):   The player id that plays, default None for the player whose turn it is.
+
+            Returns:
+                action (Actions): ILLEGAL_DATA if it is not the player's turn, ILLEGAL_LOCATION, WIN, TIE or CONTINUE.
+        """
+        if player is not None and player != self.turn:
+            return Actions.ILLEGAL_DATA
+        if self.over or not self.is_valid(column):
+            return Actions.ILLEGAL_LOCATION
+
+        self.add_piece(column)
+        if self.on_change:
+            self.on_change(Actions.ADD_PIECE, (self.turn << 8) | column)
+
+        if self.is_won(self.turn):
+            self.over = True
+            if self.on_change:
+                self.on_change(Actions.WIN, self.turn)
+            return Actions.WIN
+        elif self.is_full():
+            self.over = True
+            if self.on_change:
+                self.on_change(Actions.TIE, 0)
+            return Actions.TIE
+
+        self.change_turn()
+        return Actions.CONTINUE
+
+    def undo(self, player: Optional[int] = None) -> bool:
+        """
+        Undo the last move, or take back the last move of a player together with the opponent's reply to it.
+        A player's undo is charged to its budget, and it is validated before anything changes.
+
+            Parameters:
+                player (int): The player that asks for the undo, default None to undo the last move without a budget.
+
+            Returns:
+                performed (bool): True if performed undo, False if did not.
+        """
+        count = 1
+        if player is not None:
+            #   the moves alternate, so the player's last move is at most one reply back
+            count = 1 if self.last_player == player else 2
+            if len(self.moves) < count:
+                return False
+            if self.max_undo is not None and self.undo_counts[player - 1] >= self.max_undo:
+                return False
+        elif not self.moves:
+            return False
+
+        for _ in range(count):
+            self.take_back()
+            self.move_counts[self.last_player - 1] -= 1
+            column = self.moves.pop()
+            self.hash.pop()
+            #   the turn does not pass after the last move of a finished game
+            if not self.over:
+                self.change_turn()
+            self.over = False
+
+            if self.on_change:
+                self.on_change(Actions.UNDO, column)
+
+        if player is not None:
+            self.undo_counts[player - 1] += 1
+        return True
+
+    def to_record(self, interval: int = record.DEFAULT_INTERVAL) -> record.GameRecord:
+        """
+        Get the record of the moves of the game, for replays and offline analysis.
+
+            Parameters:
+                interval (int): Number of moves between the board checkpoints, default 8.
+
+            Returns:
+                game_record (GameRecord): The record of the game.
+        """
+        result = record.UNFINISHED
+        if self.over:
+            result = self.last_player if self.is_won(self.last_player) else record.TIE
+        return record.GameRecord(self.size, self.n, self.moves, self.first, result, interval)
+
+    def serialize(self) -> bytes:
+        """
+        Encode the game as a compact session.
+
+            Returns:
+                data (bytes): The encoded session.
+        """
+        return session.encode_session(self.size, self.n, self.turn, self.over, self.moves)
+
+    @classmethod
+    def from_session(cls, data: bytes, token: int) -> 'Game':
+        """
+        Rebuild a game, including its undo history, out of an encoded session.
+
+            Parameters:
+                data (bytes):   The encoded session.
+                token (int):    The session token of the game.
+
+            Returns:
+                game (Game): The restored game.
+        """
+        size, n, turn, over, moves = session.decode_session(data)
+        #   the session does not keep the engine, it is picked by the configuration again
+        game = create_game(size, n, token) if cls is Game else cls(size, n, token)
+        for column in moves:
+            game.add_piece(column)
+            game.change_turn()
+        game.turn = turn
+        game.over = over
+        return game
+
+
+def is_valid_config(size: utils.Couple, n: int) -> bool:
+    """
+    Check if a board configuration can be played, i.e. one that was requested by a remote client.
+
+        Parameters:
+            size (tuple):   The size of the board.
+            n (int):        Value for n-in-a-row.
+
+        Returns:
+            valid (bool): True if the board and n are within the limits of the engines and n fits the board.
+    """
+    rows, cols = size
+    return 1 <= rows <= MAX_SIZE and 1 <= cols <= MAX_SIZE and 1 <= n <= MAX_N and (n <= rows or n <= cols)
+
+
+def create_game(size: utils.Couple, n: int = 4, token: Optional[int] = None, max_undo: Optional[int] = None,
+                engine: str = 'auto') -> Game:
+    """
+    Create a game on a given engine, the engines play by the same rules and send the same actions.
+
+        Parameters:
+            size (tuple):   The size of the board.
+            n (int):        Value for n-in-a-row, default 4.
+            token (int):    The session token of the game, default None to create a new one.
+            max_undo (int): Maximum allowed undo per player, default None for no limit.
+            engine (str):   'dense' for numpy boards, 'bitboard' for large boards, or 'auto' to use the bitboard
+                            above 10x10 or 6 in a row, default 'auto'.
+
+        Returns:
+            game (Game): The new game.
+    """
+    if engine == 'auto':
+        engine = 'bitboard' if size[0] * size[1] > DENSE_MAX_CELLS or n > DENSE_MAX_N else 'dense'
+    if engine == 'bitboard':
+        #   the bitboard engine is only loaded by the games that use it
+        from bigboard import BitGame
+        return BitGame(size, n, token, max_undo)
+    if engine != 'dense':
+        raise ValueError('unknown engine {}'.format(engine))
+    return Game(size, n, token, max_undo)
+
+
+class GameRegistry:
+
+    def __init__(self) -> None:
+        """
+        Create a registry of the active games.
+        Lookups are lock-free, only adding and removing games takes the registry lock, and each game is guarded by
+        its own lock.
+        """
+        self.games = {}
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.games
+
+    def create(self, key: Hashable, size: utils.Couple, n: int, max_undo: Optional[int] = None,
+               engine: str = 'auto') -> Optional[Game]:
+        """
+        Create a new game under a given key.
+
+            Parameters:
+                key (Hashable): The key of the game, i.e. the client id.
+                size (tuple):   The size of the board.
+                n (int):        Value for n-in-a-row.
+                max_undo (int): Maximum allowed undo per player, default None for no limit.
+                engine (str):   The engine of the game, see create_game, default 'auto'.
+
+            Returns:
+                game (Game): The new game, or None if the key is already taken.
+        """
+        return self.add(key, create_game(size, n, max_undo=max_undo, engine=engine))
+
+    def add(self, key: Hashable, game: Game) -> Optional[Game]:
+        """
+        Register an existing game under a given key.
+
+            Parameters:
+                key (Hashable): The key of the game.
+                game (Game):    The game to register.
+
+            Returns:
+                game (Game): The registered game, or None if the key is already taken.
+        """
+        with self.lock:
+            if key in self.games:
+                return None
+            self.games[key] = game
+            return game
+
+    def get(self, key: Hashable) -> Optional[Game]:
+        """
+        Get the game of a given key.
+
+            Parameters:
+                key (Hashable): The key of the game.
+
+            Returns:
+                game (Game): The game, or None if there is no such game.
+        """
+        return self.games.get(key)
+
+    def remove(self, key: Hashable) -> Optional[Game]:
+        """
+        Remove the game of a given key.
+
+            Parameters:
+                key (Hashable): The key of the game.
+
+            Returns:
+                game (Game): The removed game, or None if there is no such game.
+        """
+        with self.lock:
+            return self.games.pop(key, None)
+
+    def values(self) -> List[Game]:
+        """
+        Get a snapshot of all the active games.
+
+            Returns:
+                games (list): The games.
+        """
+        return list(self.games.values())
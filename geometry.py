@@ -0,0 +1,106 @@
+import functools
+from typing import *
+
+import numpy as np
+
+
+class Geometry:
+
+    def __init__(self, rows: int, cols: int, n: int) -> None:
+        """
+        Precompute every winning line of a board configuration as flat cell indices, and the reverse index from
+        each cell to the lines going through it. Use get_geometry to share a single instance per configuration.
+
+            Parameters:
+                rows (int): Number of rows.
+                cols (int): Number of columns.
+                n (int):    Value for n-in-a-row.
+        """
+        self.rows = rows
+        self.cols = cols
+        self.n = n
+
+        lines = []
+        #   horizontal, vertical, diagonal and anti-diagonal directions
+        for dr, dc in [(0, 1), (1, 0), (1, 1), (1, -1)]:
+            for r in range(rows):
+                for c in range(cols):
+                    end_r, end_c = r + dr * (n - 1), c + dc * (n - 1)
+                    if 0 <= end_r < rows and 0 <= end_c < cols:
+                        lines.append([(r + dr * i) * cols + c + dc * i for i in range(n)])
+
+        self.lines = np.array(lines, dtype=np.intp).reshape(-1, n)
+        self.lines.setflags(write=False)
+
+        cell_lines = [[] for _ in range(rows * cols)]
+        for line_index, line in enumerate(lines):
+            for cell in line:
+                cell_lines[cell].append(line_index)
+        self.cell_lines = [np.array(c, dtype=np.intp) for c in cell_lines]
+        for c in self.cell_lines:
+            c.setflags(write=False)
+
+    @property
+    def num_lines(self) -> int:
+        """
+        Number of winning lines of the configuration.
+        """
+        return len(self.lines)
+
+    def line_counts(self, board: np.ndarray, player: int) -> np.ndarray:
+        """
+        Count the pieces of a player on every line.
+
+            Parameters:
+                board (np.ndarray): The board to count on.
+                player (int):       The player id to count.
+
+            Returns:
+                counts (np.ndarray): Number of pieces of the player per line.
+        """
+        return (np.asarray(board).ravel()[self.lines] == player).sum(axis=1)
+
+    def is_won(self, board: np.ndarray, player: int) -> bool:
+        """
+        Check if a player has n-in-a-row anywhere on the board.
+
+            Parameters:
+                board (np.ndarray): The board to check.
+                player (int):       The player id to check.
+
+            Returns:
+                won (bool): True if there is n-in-a-row, False otherwise.
+        """
+        return bool(np.any(np.all(np.asarray(board).ravel()[self.lines] == player, axis=1)))
+
+    def is_won_at(self, board: np.ndarray, player: int, row: int, col: int) -> bool:
+        """
+        Check if a player has n-in-a-row through a given cell, enough after the player dropped a piece there.
+
+            Parameters:
+                board (np.ndarray): The board to check.
+                player (int):       The player id to check.
+                row (int):          The row of the cell.
+                col (int):          The column of the cell.
+
+            Returns:
+                won (bool): True if there is n-in-a-row through the cell, False otherwise.
+        """
+        lines = self.lines[self.cell_lines[row * self.cols + col]]
+        return bool(np.any(np.all(np.asarray(board).ravel()[lines] == player, axis=1)))
+
+
+@functools.lru_cache(maxsize=None)
+def get_geometry(rows: int, cols: int, n: int) -> Geometry:
+    """
+    Get the geometry of a board configuration, computed once and shared between all the games that use it.
+
+        Parameters:
+            rows (int): Number of rows.
+            cols (int): Number of columns.
+            n (int):    Value for n-in-a-row.
+
+        Returns:
+            geometry (Geometry): The geometry of the configuration.
+    """
+    return Geometry(rows, cols, n)
@@ -0,0 +1,487 @@
+import collections
+import logging
+import queue
+import selectors
+import socket
+import threading
+import time
+from typing import *
+
+import protocol
+import utils
+from actions import Actions
+from game import Game, create_game, is_valid_config
+
+QueueKey = Tuple[int, int, int, int]
+
+
+class _Player:
+
+    def __init__(self, conn: socket.socket) -> None:
+        """
+        Create the server side state of a single remote player.
+
+            Parameters:
+                conn (socket): The socket of the player.
+        """
+        self.conn = conn
+        self.reader = protocol.FrameReader()
+        self.out = bytearray()
+        self.key = None  # the queue the player waits in
+        self.match = None
+        self.player = 0
+        self.last_seen = time.monotonic()
+
+
+class _Match:
+
+    def __init__(self, game: Game, players: List[_Player]) -> None:
+        """
+        Create a game between two remote players.
+
+            Parameters:
+                game (Game):        The game, it owns the turn and the undo budgets.
+                players (list):     The players, the first one is player 1.
+        """
+        self.game = game
+        self.players = players
+
+
+class Lobby(threading.Thread):
+
+    def __init__(self, host: str, port: int, spectators: Optional[Any] = None, idle_timeout: float = 30) -> None:
+        """
+        Create a matchmaking service, remote players join a queue of a game configuration and are paired in the order
+        they joined. Every player plays on its own connection, and the server decides whose turn it is.
+        All the players are served by this single thread.
+
+            Parameters:
+                host (str):                     The host to listen on.
+                port (int):                     The port to listen on.
+                spectators (SpectatorServer):   Server to broadcast the games on, default None.
+                idle_timeout (float):           Seconds without any frame, heartbeats included, before a player is
+                                                disconnected, default 30.
+        """
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.spectators = spectators
+        self.selector = selectors.DefaultSelector()
+        self.server_socket = None
+        self.players = {}  # conn -> _Player
+        self.queues = collections.defaultdict(collections.deque)  # QueueKey -> waiting players
+        self.idle_timeout = idle_timeout
+        self.matches = 0
+        self.reaped = 0
+        self.stop_event = threading.Event()
+        self.logger = logging.getLogger('Lobby')
+
+    def run(self) -> None:
+        """
+        Listen for players and serve their frames until stopped.
+        """
+        self.server_socket = socket.socket()
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.server_socket.bind((self.host, self.port))
+            self.server_socket.listen(1024)
+        except Exception as e:
+            self.server_socket.close()
+            self.logger.error(str(e))
+            return
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
+        self.logger.info('socket created {}:{}'.format(*self.server_socket.getsockname()[:2]))
+
+        while not self.stop_event.is_set():
+            for key, events in self.selector.select(timeout=0.5):
+                if key.fileobj is self.server_socket:
+                    self.accept()
+                    continue
+                player = key.data
+                if events & selectors.EVENT_READ:
+                    self.read(player)
+                if events & selectors.EVENT_WRITE and player.conn in self.players:
+                    self.flush(player)
+            self.reap()
+
+        for player in list(self.players.values()):
+            self.leave(player)
+        self.selector.close()
+        self.server_socket.close()
+
+    def stop(self) -> None:
+        """
+        Stop the lobby and close all of its connections.
+        """
+        self.stop_event.set()
+
+    def accept(self) -> None:
+        """
+        Accept a new player and register it for reading.
+        """
+        try:
+            conn, _ = self.server_socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        conn.setblocking(False)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        player = _Player(conn)
+        self.players[conn] = player
+        self.selector.register(conn, selectors.EVENT_READ, player)
+
+    def read(self, player: _Player) -> None:
+        """
+        Read the available bytes of a player and handle all of its complete frames.
+
+            Parameters:
+                player (_Player): The player to read from.
+        """
+        try:
+            data = player.conn.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = None
+
+        if not data:
+            self.leave(player)
+            return
+
+        player.last_seen = time.monotonic()
+        for game_id, action, value in player.reader.feed(data):
+            if Actions.EXIT.is_equals(action):
+                self.leave(player)
+                return
+            #   a heartbeat only keeps the player alive
+            if Actions.HEARTBEAT.is_equals(action):
+                continue
+            try:
+                self.handle_frame(player, game_id, action, value)
+            except Exception as e:
+                #   a frame that fails is rejected, it never stops the games of the other players
+                self.logger.error('game {} failed on action {}: {}'.format(game_id, action, str(e)))
+                self.send(player, game_id, Actions.ILLEGAL_DATA)
+
+        for other in self.touched(player):
+            self.flush(other)
+
+    def reap(self) -> int:
+        """
+        Disconnect the players that were idle for longer than the timeout, a live player sends heartbeats while it
+        waits or plays. The opponent of a reaped player gets an EXIT.
+
+            Returns:
+                reaped (int): Number of players disconnected by this call.
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        idle = [player for player in self.players.values() if player.last_seen < deadline]
+        for player in idle:
+            self.logger.warning('reaping player {}, idle for over {} seconds'.format(player.player,
+                                                                                    self.idle_timeout))
+            self.leave(player)
+
+        if idle:
+            self.reaped += len(idle)
+            self.logger.info('reaped {} players, {} in total, {} active'.format(
+                len(idle), self.reaped, len(self.players)))
+        return len(idle)
+
+    def touched(self, player: _Player) -> List[_Player]:
+        """
+        Get the players that may have pending output after a frame of a player.
+
+            Parameters:
+                player (_Player): The player that sent the frame.
+
+            Returns:
+                players (list): The player and its opponent.
+        """
+        return player.match.players if player.match else [player]
+
+    def send(self, player: _Player, game_id: int, action: Actions, value: int = 0) -> None:
+        """
+        Queue a frame to a player, it is sent by the next flush.
+
+            Parameters:
+                player (_Player):   The player to send to.
+                game_id (int):      The id of the game.
+                action (Actions):   The action of the frame.
+                value (int):        The payload of the frame, default 0.
+        """
+        player.out += protocol.encode(game_id, action, value)
+
+    def flush(self, player: _Player) -> None:
+        """
+        Send as much of the pending output as possible, and wait for the socket to be writable for the rest.
+
+            Parameters:
+                player (_Player): The player to send to.
+        """
+        if player.conn not in self.players:
+            return
+        if player.out:
+            try:
+                sent = player.conn.send(player.out)
+                del player.out[:sent]
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self.leave(player)
+                return
+
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if player.out else 0)
+        self.selector.modify(player.conn, events, player)
+
+    def join(self, player: _Player, key: QueueKey) -> None:
+        """
+        Pair a player with the first one waiting in the queue of its key, or make it wait.
+        Players that left while waiting are skipped lazily, so a join is O(1) amortized.
+
+            Parameters:
+                player (_Player):   The joining player.
+                key (tuple):        The rows, columns, n and maximum undo.
+        """
+        waiting = self.queues[key]
+        while waiting:
+            opponent = waiting.popleft()
+            if opponent.key == key and opponent.conn in self.players:
+                opponent.key = None
+                self.start_match([opponent, player], key)
+                return
+
+        player.key = key
+        waiting.append(player)
+        self.send(player, protocol.CONNECTION_ID, Actions.PRE_GAME)
+
+    def start_match(self, players: List[_Player], key: QueueKey) -> None:
+        """
+        Start a game between two players, each is told the game id and its player id.
+
+            Parameters:
+                players (list): The players, the first one is player 1.
+                key (tuple):    The rows, columns, n and maximum undo.
+        """
+        rows, cols, n, max_undo = key
+        match = _Match(create_game((rows, cols), n, max_undo=max_undo), players)
+        if self.spectators:
+            self.spectators.attach(match.game)
+
+        for player_id, player in enumerate(players, start=1):
+            player.match = match
+            player.player = player_id
+            self.send(player, match.game.id, Actions.READY, player_id)
+
+        self.matches += 1
+        self.logger.debug('game {} started with board size (rows={}, cols={}), n={}'.format(match.game.id, rows,
+                                                                                           cols, n))
+
+    def end_match(self, match: _Match) -> None:
+        """
+        End a game, the players may join a queue again.
+
+            Parameters:
+                match (_Match): The game to end.
+        """
+        for player in match.players:
+            player.match = None
+            player.player = 0
+        if self.spectators:
+            self.spectators.detach(match.game)
+
+    def leave(self, player: _Player) -> None:
+        """
+        Disconnect a player, its opponent gets an EXIT.
+
+            Parameters:
+                player (_Player): The player to disconnect.
+        """
+        match = player.match
+        if match:
+            self.end_match(match)
+            for opponent in match.players:
+                if opponent is not player:
+                    self.send(opponent, match.game.id, Actions.EXIT)
+                    self.flush(opponent)
+
+        #   a waiting player is skipped by the next join of its queue
+        player.key = None
+        self.players.pop(player.conn, None)
+        try:
+            self.selector.unregister(player.conn)
+        except (KeyError, ValueError):
+            pass
+        player.conn.close()
+
+    def handle_frame(self, player: _Player, game_id: int, action: int, value: int) -> None:
+        """
+        Apply a single frame of a player, the responses are queued to the players.
+
+            Parameters:
+                player (_Player):   The player that sent the frame.
+                game_id (int):      The game id of the frame.
+                action (int):       The action value of the frame.
+                value (int):        The payload of the frame.
+        """
+        if Actions.JOIN.is_equals(action):
+            rows, cols, n, max_undo = protocol.unpack_queue_key(value)
+            if player.match or player.key or not is_valid_config((rows, cols), n):
+                self.send(player, game_id, Actions.ILLEGAL_DATA)
+                return
+            self.join(player, (rows, cols, n, max_undo))
+            return
+
+        match = player.match
+        if match is None or game_id != match.game.id:
+            self.send(player, game_id, Actions.ILLEGAL_DATA)
+            return
+        game = match.game
+
+        if Actions.ADD_PIECE.is_equals(action):
+            #   the game rejects a move out of turn as ILLEGAL_DATA
+            result = game.play(value, player.player)
+            if result == Actions.ILLEGAL_DATA or result == Actions.ILLEGAL_LOCATION:
+                self.send(player, game_id, result, value)
+                return
+            for other in match.players:
+                self.send(other, game_id, result, (player.player << 8) | value)
+
+        elif Actions.UNDO.is_equals(action):
+            #   a player may only take back its own last move, within its budget
+            if game.last_player != player.player:
+                self.send(player, game_id, Actions.ILLEGAL_DATA)
+                return
+            column = game.moves[-1] if game.moves else 0
+            if not game.undo(player.player):
+                self.send(player, game_id, Actions.ILLEGAL_DATA)
+                return
+            for other in match.players:
+                self.send(other, game_id, Actions.UNDO, column)
+
+        elif Actions.RESET.is_equals(action) and game.over:
+            game.reset()
+            for other in match.players:
+                self.send(other, game_id, Actions.RESET)
+
+        else:
+            self.send(player, game_id, Actions.ILLEGAL_DATA)
+
+
+class LobbyClient:
+
+    def __init__(self, host: str, port: int) -> None:
+        """
+        Connect to a lobby as a single remote player.
+
+            Parameters:
+                host (str): The host of the lobby.
+                port (int): The port of the lobby.
+        """
+        self.conn = socket.create_connection((host, port))
+        self.conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.frames = queue.Queue()
+        self.game_id = None
+        self.player = 0
+        self.send_lock = threading.Lock()
+        self.closed = threading.Event()
+        self.reader = threading.Thread(target=self.read_loop, daemon=True)
+        self.reader.start()
+        self.heartbeat = threading.Thread(target=self.heartbeat_loop, daemon=True)
+        self.heartbeat.start()
+
+    def read_loop(self) -> None:
+        """
+        Queue the received frames, an EXIT is queued when the connection is closed.
+        """
+        reader = protocol.FrameReader()
+        while True:
+            try:
+                data = self.conn.recv(4096)
+            except OSError:
+                data = None
+            if not data:
+                break
+            for frame in reader.feed(data):
+                self.frames.put(frame)
+        self.frames.put((protocol.CONNECTION_ID, Actions.EXIT.value, 0))
+
+    def heartbeat_loop(self) -> None:
+        """
+        Keep the connection alive while the player waits for an opponent or for its turn, the lobby disconnects the
+        players that go silent.
+        """
+        while not self.closed.wait(utils.HEARTBEAT_INTERVAL):
+            try:
+                self.write(protocol.CONNECTION_ID, Actions.HEARTBEAT)
+            except OSError:
+                break
+
+    def write(self, game_id: int, action: Actions, value: int = 0) -> None:
+        """
+        Send a single frame, the frames of the player and of its heartbeats never interleave.
+
+            Parameters:
+                game_id (int):      The game id of the frame.
+                action (Actions):   The action to send.
+                value (int):        The payload of the action, default 0.
+        """
+        with self.send_lock:
+            self.conn.sendall(protocol.encode(game_id, action, value))
+
+    def receive(self, timeout: Optional[float] = None) -> Tuple[Actions, int]:
+        """
+        Wait for the next frame from the lobby.
+
+            Parameters:
+                timeout (float): Seconds to wait, default None to wait forever.
+
+            Returns:
+                frame (tuple): The action and the value of the frame.
+        """
+        _, action, value = self.frames.get(timeout=timeout)
+        return Actions(action), value
+
+    def join(self, rows: int, cols: int, n: int, max_undo: int, timeout: Optional[float] = None) -> int:
+        """
+        Join the queue of a game configuration and wait to be paired.
+
+            Parameters:
+                rows (int):         Number of rows.
+                cols (int):         Number of columns.
+                n (int):            Value for n-in-a-row.
+                max_undo (int):     Maximum allowed undo per player.
+                timeout (float):    Seconds to wait for an opponent, default None to wait forever.
+
+            Returns:
+                player (int): The player id in the game, 1 plays first, or 0 if the join was refused.
+        """
+        self.write(protocol.CONNECTION_ID, Actions.JOIN, protocol.pack_queue_key(rows, cols, n, max_undo))
+        while True:
+            game_id, action, value = self.frames.get(timeout=timeout)
+            if Actions.READY.is_equals(action):
+                self.game_id, self.player = game_id, value
+                return self.player
+            if not Actions.PRE_GAME.is_equals(action):
+                return 0
+
+    def send(self, action: Actions, value: int = 0) -> None:
+        """
+        Send an action of the current game, i.e. ADD_PIECE with the column, UNDO or RESET.
+        Both players receive the result, the value of a move is player * 256 + column.
+
+            Parameters:
+                action (Actions):   The action to send.
+                value (int):        The payload of the action, default 0.
+        """
+        self.write(self.game_id, action, value)
+
+    def close(self) -> None:
+        """
+        Leave the lobby.
+        """
+        self.closed.set()
+        try:
+            self.write(protocol.CONNECTION_ID, Actions.EXIT)
+        except OSError:
+            pass
+        self.conn.close()
@@ -1,3 +1,6 @@
+import profiling
+
+
 class Memento:
     def __init__(self, value: object) -> None:
         """
@@ -61,6 +64,7 @@ class CareTaker:
         self.mementos = []
         self.origin = obj_originator
 
+    @profiling.timed
     def do(self) -> None:
         """
         Adds a memento state to the list.
@@ -0,0 +1,495 @@
+import itertools
+import logging
+import queue
+import selectors
+import socket
+import threading
+from typing import *
+
+import protocol
+import session
+from actions import Actions
+from game import Game, GameRegistry, is_valid_config
+
+
+class _Connection:
+
+    def __init__(self, conn: socket.socket) -> None:
+        """
+        Create the server side state of a single connection.
+
+            Parameters:
+                conn (socket): The socket of the connection.
+        """
+        self.conn = conn
+        self.reader = protocol.FrameReader()
+        self.out = bytearray()
+        self.game_ids = set()
+
+
+class MuxServer(threading.Thread):
+
+    def __init__(self, host: str, port: int, sessions: Optional[session.SessionStore] = None,
+                 spectators: Optional[Any] = None) -> None:
+        """
+        Create a new server that carries many concurrent games on each connection.
+        All the connections are served by this single thread.
+
+            Parameters:
+                host (str):                     The host to listen on.
+                port (int):                     The port to listen on.
+                sessions (SessionStore):        Store to keep the games of dropped connections, default None.
+                spectators (SpectatorServer):   Server to broadcast the games on, default None.
+        """
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.selector = selectors.DefaultSelector()
+        self.server_socket = None
+        self.connections = {}
+        self.games = GameRegistry()  # (conn, game id) -> Game
+        self.sessions = sessions if sessions is not None else session.SessionStore(backing_file=None)
+        self.spectators = spectators
+        self.stop_event = threading.Event()
+        self.logger = logging.getLogger('MuxServer')
+
+    def run(self) -> None:
+        """
+        Listen for connections and serve their frames until stopped.
+        """
+        self.server_socket = socket.socket()
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.server_socket.bind((self.host, self.port))
+            self.server_socket.listen()
+        except Exception as e:
+            self.server_socket.close()
+            self.logger.error(str(e))
+            return
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
+        self.logger.info('socket created {}:{}'.format(self.host, self.port))
+
+        while not self.stop_event.is_set():
+            for key, events in self.selector.select(timeout=0.5):
+                if key.fileobj is self.server_socket:
+                    self.accept()
+                    continue
+                connection = key.data
+                if events & selectors.EVENT_READ:
+                    self.read(connection)
+                if events & selectors.EVENT_WRITE and connection.conn in self.connections:
+                    self.flush(connection)
+
+        for connection in list(self.connections.values()):
+            self.close_connection(connection)
+        self.selector.close()
+        self.server_socket.close()
+        self.sessions.close()
+
+    def stop(self) -> None:
+        """
+        Stop the server and close all of its connections.
+        """
+        self.stop_event.set()
+
+    def accept(self) -> None:
+        """
+        Accept a new connection and register it for reading.
+        """
+        conn, address = self.server_socket.accept()
+        conn.setblocking(False)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = _Connection(conn)
+        self.connections[conn] = connection
+        self.selector.register(conn, selectors.EVENT_READ, connection)
+        self.logger.info('connected to={}:{}'.format(address[0], str(address[1])))
+
+    def read(self, connection: _Connection) -> None:
+        """
+        Read the available bytes of a connection and handle all of its complete frames.
+
+            Parameters:
+                connection (_Connection): The connection to read from.
+        """
+        try:
+            data = connection.conn.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = None
+
+        if not data:
+            self.close_connection(connection)
+            return
+
+        for game_id, action, value in connection.reader.feed(data):
+            if game_id == protocol.CONNECTION_ID and Actions.EXIT.is_equals(action):
+                self.close_connection(connection)
+                return
+            try:
+                connection.out += self.handle_frame(connection, game_id, action, value)
+            except Exception as e:
+                #   a frame that fails is rejected, it never stops the games of the other connections
+                self.logger.error('game {} failed on action {}: {}'.format(game_id, action, str(e)))
+                connection.out += protocol.encode(game_id, Actions.ILLEGAL_DATA)
+
+        self.flush(connection)
+
+    def flush(self, connection: _Connection) -> None:
+        """
+        Send as much of the pending output as possible, and wait for the socket to be writable for the rest.
+
+            Parameters:
+                connection (_Connection): The connection to send on.
+        """
+        if connection.out:
+            try:
+                sent = connection.conn.send(connection.out)
+                del connection.out[:sent]
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self.close_connection(connection)
+                return
+
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if connection.out else 0)
+        self.selector.modify(connection.conn, events, connection)
+
+    def close_connection(self, connection: _Connection) -> None:
+        """
+        Close a connection and move all of its games to the session store, so they can be resumed.
+
+            Parameters:
+                connection (_Connection): The connection to close.
+        """
+        for game_id in connection.game_ids:
+            game = self.games.remove((connection.conn, game_id))
+            if game is not None:
+                self.sessions.put(game.token, game.serialize())
+                if self.spectators:
+                    self.spectators.detach(game)
+        self.connections.pop(connection.conn, None)
+        try:
+            self.selector.unregister(connection.conn)
+        except (KeyError, ValueError):
+            pass
+        connection.conn.close()
+        self.logger.debug('conn closed, {} games moved to sessions'.format(len(connection.game_ids)))
+
+    def handle_frame(self, connection: _Connection, game_id: int, action: int, value: int) -> bytes:
+        """
+        Apply a single frame on its game and return the encoded response.
+
+            Parameters:
+                connection (_Connection):   The connection the frame was received on.
+                game_id (int):              The game id of the frame.
+                action (int):               The action value of the frame.
+                value (int):                The payload of the frame.
+
+            Returns:
+                response (bytes): The encoded response frame.
+        """
+        key = (connection.conn, game_id)
+
+        if Actions.NEW_GAME.is_equals(action):
+            rows, cols, n = protocol.unpack_config(value)
+            if game_id == protocol.CONNECTION_ID or not is_valid_config((rows, cols), n):
+                return protocol.encode(game_id, Actions.ILLEGAL_DATA)
+            game = self.games.create(key, (rows, cols), n)
+            if game is None:
+                return protocol.encode(game_id, Actions.ILLEGAL_DATA)
+            connection.game_ids.add(game_id)
+            if self.spectators:
+                self.spectators.attach(game)
+            self.logger.debug('game {} created with board size (rows={}, cols={}), n={}'.format(game_id, rows, cols,
+                                                                                               n))
+            return protocol.encode(game_id, Actions.READY, game.token)
+
+        elif Actions.RESUME.is_equals(action):
+            data = self.sessions.pop(value) if key not in self.games else None
+            if data is None:
+                return protocol.encode(game_id, Actions.ILLEGAL_DATA)
+            game = self.games.add(key, Game.from_session(data, value))
+            connection.game_ids.add(game_id)
+            if self.spectators:
+                self.spectators.attach(game)
+            self.logger.debug('game {} resumed'.format(game_id))
+            return protocol.encode(game_id, Actions.READY, value)
+
+        game = self.games.get(key)
+        if game is None:
+            return protocol.encode(game_id, Actions.ILLEGAL_DATA)
+
+        if Actions.EXIT.is_equals(action):
+            self.games.remove(key)
+            connection.game_ids.discard(game_id)
+            if self.spectators:
+                self.spectators.detach(game)
+            return protocol.encode(game_id, Actions.EXIT)
+
+        with game.lock:
+            if Actions.RESET.is_equals(action):
+                game.reset()
+                return protocol.encode(game_id, Actions.RESET)
+
+            elif Actions.UNDO.is_equals(action):
+                return protocol.encode(game_id, Actions.UNDO, int(game.undo()))
+
+            elif Actions.ADD_PIECE.is_equals(action):
+                return protocol.encode(game_id, game.play(value), value)
+
+        return protocol.encode(game_id, Actions.ILLEGAL_DATA)
+
+
+class MuxConnection:
+
+    def __init__(self, host: str, port: int) -> None:
+        """
+        Open a connection that can carry many concurrent games.
+
+            Parameters:
+                host (str): The host of the server.
+                port (int): The port of the server.
+        """
+        self.conn = socket.create_connection((host, port))
+        self.conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.send_lock = threading.Lock()
+        self.game_ids = itertools.count(1)
+        self.responses = {}  # game id -> queue of (action, value)
+        self.closed = False
+        self.reader = threading.Thread(target=self.read_loop, daemon=True)
+        self.reader.start()
+
+    @property
+    def num_games(self) -> int:
+        """
+        Number of games currently open on the connection.
+        """
+        return len(self.responses)
+
+    def read_loop(self) -> None:
+        """
+        Dispatch the received frames to the games they belong to.
+        """
+        reader = protocol.FrameReader()
+        while True:
+            try:
+                data = self.conn.recv(65536)
+            except OSError:
+                data = None
+            if not data:
+                break
+            for game_id, action, value in reader.feed(data):
+                responses = self.responses.get(game_id)
+                if responses is not None:
+                    responses.put((action, value))
+
+        self.closed = True
+        for responses in list(self.responses.values()):
+            responses.put((Actions.EXIT.value, 0))
+
+    def request(self, game_id: int, action: Actions, value: int = 0) -> Tuple[Actions, int]:
+        """
+        Send a frame of a game and wait for its response.
+
+            Parameters:
+                game_id (int):      The id of the game.
+                action (Actions):   The action to send.
+                value (int):        The payload of the action, default 0.
+
+            Returns:
+                response (tuple): The action and the value of the response.
+        """
+        if self.closed:
+            return Actions.EXIT, 0
+        with self.send_lock:
+            self.conn.sendall(protocol.encode(game_id, action, value))
+        action, value = self.responses[game_id].get()
+        return Actions(action), value
+
+    def open_game(self, rows: int, cols: int, n: int) -> Optional['RemoteGame']:
+        """
+        Create a new game on the connection.
+
+            Parameters:
+                rows (int): Number of rows.
+                cols (int): Number of columns.
+                n (int):    Value for n-in-a-row.
+
+            Returns:
+                game (RemoteGame): The new game, or None if the server refused it.
+        """
+        return self.start_game(Actions.NEW_GAME, protocol.pack_config(rows, cols, n))
+
+    def resume_game(self, token: int) -> Optional['RemoteGame']:
+        """
+        Resume a game of a dropped connection on this connection.
+
+            Parameters:
+                token (int): The session token of the game.
+
+            Returns:
+                game (RemoteGame): The resumed game, or None if there is no such session.
+        """
+        return self.start_game(Actions.RESUME, token)
+
+    def start_game(self, action: Actions, value: int) -> Optional['RemoteGame']:
+        """
+        Allocate a game id and send the frame that creates or resumes the game.
+
+            Parameters:
+                action (Actions):   NEW_GAME or RESUME.
+                value (int):        The packed configuration or the session token.
+
+            Returns:
+                game (RemoteGame): The game, or None if the server refused it.
+        """
+        game_id = next(self.game_ids)
+        self.responses[game_id] = queue.Queue()
+        action, token = self.request(game_id, action, value)
+        if action != Actions.READY:
+            del self.responses[game_id]
+            return None
+        return RemoteGame(self, game_id, token)
+
+    def close_game(self, game_id: int) -> None:
+        """
+        Close a game of the connection.
+
+            Parameters:
+                game_id (int): The id of the game.
+        """
+        self.request(game_id, Actions.EXIT)
+        self.responses.pop(game_id, None)
+
+    def close(self) -> None:
+        """
+        Close the connection with all of its games.
+        """
+        try:
+            with self.send_lock:
+                self.conn.sendall(protocol.encode(protocol.CONNECTION_ID, Actions.EXIT))
+        except OSError:
+            pass
+        self.conn.close()
+
+
+class RemoteGame:
+
+    def __init__(self, connection: MuxConnection, game_id: int, token: int) -> None:
+        """
+        Create a handle of a game that is played over a shared connection.
+
+            Parameters:
+                connection (MuxConnection): The connection the game is played on.
+                game_id (int):              The id of the game.
+                token (int):                The session token to resume the game with after a disconnection.
+        """
+        self.connection = connection
+        self.game_id = game_id
+        self.token = token
+
+    def play(self, column: int) -> Actions:
+        """
+        Drop a piece of the player whose turn it is.
+
+            Parameters:
+                column (int): The column index to add.
+
+            Returns:
+                action (Actions): WIN, TIE, CONTINUE or ILLEGAL_LOCATION.
+        """
+        action, _ = self.connection.request(self.game_id, Actions.ADD_PIECE, column)
+        return action
+
+    def undo(self) -> bool:
+        """
+        Undo the last move.
+
+            Returns:
+                performed (bool): True if performed undo, False if did not.
+        """
+        action, value = self.connection.request(self.game_id, Actions.UNDO)
+        return action == Actions.UNDO and bool(value)
+
+    def reset(self) -> None:
+        """
+        Reset the game.
+        """
+        self.connection.request(self.game_id, Actions.RESET)
+
+    def close(self) -> None:
+        """
+        Close the game, the connection stays open for other games.
+        """
+        self.connection.close_game(self.game_id)
+
+
+class ConnectionPool:
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 1235, max_games_per_connection: int = 64) -> None:
+        """
+        Create a pool of connections which are reused between games.
+
+            Parameters:
+                host (str):                         The host of the server, default 127.0.0.1.
+                port (int):                         The port of the server, default 1235.
+                max_games_per_connection (int):     Maximum concurrent games on a single connection, default 64.
+        """
+        self.host = host
+        self.port = port
+        self.max_games_per_connection = max_games_per_connection
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def acquire(self) -> MuxConnection:
+        """
+        Get the least loaded connection that has room for another game, opening a new one if all are full.
+
+            Returns:
+                connection (MuxConnection): A connection to open a game on.
+        """
+        with self.lock:
+            self.connections = [c for c in self.connections if not c.closed]
+            available = [c for c in self.connections if c.num_games < self.max_games_per_connection]
+            if available:
+                return min(available, key=lambda c: c.num_games)
+            connection = MuxConnection(self.host, self.port)
+            self.connections.append(connection)
+            return connection
+
+    def open_game(self, rows: int, cols: int, n: int) -> Optional[RemoteGame]:
+        """
+        Create a new game on one of the pooled connections.
+
+            Parameters:
+                rows (int): Number of rows.
+                cols (int): Number of columns.
+                n (int):    Value for n-in-a-row.
+
+            Returns:
+                game (RemoteGame): The new game, or None if the server refused it.
+        """
+        return self.acquire().open_game(rows, cols, n)
+
+    def resume_game(self, token: int) -> Optional[RemoteGame]:
+        """
+        Resume a game of a dropped connection on one of the pooled connections.
+
+            Parameters:
+                token (int): The session token of the game.
+
+            Returns:
+                game (RemoteGame): The resumed game, or None if there is no such session.
+        """
+        return self.acquire().resume_game(token)
+
+    def close(self) -> None:
+        """
+        Close all the pooled connections.
+        """
+        with self.lock:
+            for connection in self.connections:
+                connection.close()
+            self.connections = []
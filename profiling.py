@@ -0,0 +1,222 @@
+import collections
+import datetime
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from typing import *
+
+LOG_FOLDER = 'logs'
+DEFAULT_SECONDS = 10
+
+_enabled = False
+_timers = collections.defaultdict(lambda: [0, 0.0, 0.0])  # name -> [calls, total seconds, max seconds]
+_timers_lock = threading.Lock()
+_sampler = None
+
+
+def is_enabled() -> bool:
+    """
+    Check whether the timers are currently collecting.
+
+        Returns:
+            enabled (bool): True if the timers are enabled, False otherwise.
+    """
+    return _enabled
+
+
+def enable() -> None:
+    """
+    Start collecting the timers of the wrapped functions.
+    """
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    """
+    Stop collecting the timers of the wrapped functions.
+    """
+    global _enabled
+    _enabled = False
+
+
+def timed(func: Callable) -> Callable:
+    """
+    Decorator that measures the duration of a function while profiling is enabled.
+    When profiling is disabled the only overhead is a single global flag check.
+
+        Parameters:
+            func (Callable): The function to wrap.
+
+        Returns:
+            wrapper (Callable): The wrapped function.
+    """
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with _timers_lock:
+                timer = _timers[name]
+                timer[0] += 1
+                timer[1] += elapsed
+                if elapsed > timer[2]:
+                    timer[2] = elapsed
+
+    return wrapper
+
+
+def get_timers() -> Dict[str, Tuple[int, float, float]]:
+    """
+    Get a snapshot of the collected timers.
+
+        Returns:
+            timers (dict): Function name to (calls, total seconds, max seconds).
+    """
+    with _timers_lock:
+        return {name: tuple(timer) for name, timer in _timers.items()}
+
+
+def reset_timers() -> None:
+    """
+    Clear all the collected timers.
+    """
+    with _timers_lock:
+        _timers.clear()
+
+
+class StackSampler(threading.Thread):
+
+    def __init__(self, seconds: float, interval: float = 0.005, name: str = 'profile') -> None:
+        """
+        Create a new sampler thread that collects the stacks of all the other threads of the process.
+
+            Parameters:
+                seconds (float):    For how long to sample.
+                interval (float):   Time between two samples, default 5ms.
+                name (str):         Prefix of the output files, default 'profile'.
+        """
+        super().__init__(daemon=True)
+        self.seconds = seconds
+        self.interval = interval
+        self.prefix = name
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.logger = logging.getLogger('Profiler')
+
+    @staticmethod
+    def frame_to_stack(frame) -> str:
+        """
+        Convert a frame into a collapsed stack string, from the outermost call to the innermost.
+
+            Parameters:
+                frame (frame): The innermost frame of the thread.
+
+            Returns:
+                stack (str): Semicolon separated functions, i.e. 'client.py:run_game;utils.py:wait_for_data'.
+        """
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append('{}:{}'.format(os.path.basename(code.co_filename), code.co_name))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def run(self) -> None:
+        """
+        Sample the stacks until the time is up or the sampler was stopped, then disable the timers and dump the
+        results.
+        """
+        own_id = threading.get_ident()
+        end_time = time.monotonic() + self.seconds
+        self.logger.info('sampling for {} seconds'.format(self.seconds))
+
+        while time.monotonic() < end_time and not self.stop_event.is_set():
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self.stacks[self.frame_to_stack(frame)] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+        disable()
+        self.dump()
+
+    def stop(self) -> None:
+        """
+        Stop sampling before the time is up, the results will still be dumped.
+        """
+        self.stop_event.set()
+
+    def dump(self) -> str:
+        """
+        Write the collected stacks in the collapsed format used by flamegraph.pl and speedscope,
+        and the timers summary next to it.
+
+            Returns:
+                file_name (str): The path of the stacks file.
+        """
+        if not os.path.exists(LOG_FOLDER):
+            os.makedirs(LOG_FOLDER, exist_ok=True)
+        date_time_str = datetime.datetime.now().strftime('%m-%d-%Y_%H-%M-%S')
+        base_name = os.path.join(LOG_FOLDER, '{}_{}_{}'.format(self.prefix, date_time_str, os.getpid()))
+
+        stacks_file_name = base_name + '.folded'
+        with open(stacks_file_name, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write('{} {}\n'.format(stack, count))
+
+        with open(base_name + '.timers', 'w') as f:
+            f.write('{:<40} {:>10} {:>12} {:>12} {:>12}\n'.format('function', 'calls', 'total ms', 'mean us',
+                                                                 'max us'))
+            for name, (calls, total, max_time) in sorted(get_timers().items(), key=lambda t: -t[1][1]):
+                f.write('{:<40} {:>10} {:>12.3f} {:>12.1f} {:>12.1f}\n'.format(name, calls, total * 1e3,
+                                                                               total / calls * 1e6, max_time * 1e6))
+
+        self.logger.info('{} samples dumped to {}'.format(self.samples, stacks_file_name))
+        return stacks_file_name
+
+
+def start(seconds: float, name: str = 'profile', interval: float = 0.005) -> bool:
+    """
+    Enable the timers and start sampling the stacks of the process for a given amount of time.
+    The timers are disabled again once the sampling is done.
+
+        Parameters:
+            seconds (float):    For how long to profile.
+            name (str):         Prefix of the output files, default 'profile'.
+            interval (float):   Time between two samples, default 5ms.
+
+        Returns:
+            started (bool): True if started, False if a profile is already running.
+    """
+    global _sampler
+    if _sampler is not None and _sampler.is_alive():
+        return False
+
+    reset_timers()
+    enable()
+
+    _sampler = StackSampler(seconds, interval=interval, name=name)
+    _sampler.start()
+    return True
+
+
+def stop() -> None:
+    """
+    Stop the running profile, if any, and dump its results.
+    """
+    if _sampler is not None and _sampler.is_alive():
+        _sampler.stop()
+        _sampler.join()
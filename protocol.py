@@ -0,0 +1,115 @@
+import struct
+from typing import *
+
+from actions import Actions
+
+#   game id (uint32), action (int8), value (int32)
+FRAME = struct.Struct('!Ibi')
+FRAME_SIZE = FRAME.size
+
+#   game id 0 addresses the connection itself rather than a game
+CONNECTION_ID = 0
+
+Frame = Tuple[int, int, int]
+
+
+def encode(game_id: int, action: Union[Actions, int], value: int = 0) -> bytes:
+    """
+    Encode a single frame.
+
+        Parameters:
+            game_id (int):      The id of the game the frame belongs to.
+            action (Actions):   The action of the frame.
+            value (int):        The payload of the action, i.e. a column, default 0.
+
+        Returns:
+            frame (bytes): The encoded frame.
+    """
+    if isinstance(action, Actions):
+        action = action.value
+    return FRAME.pack(game_id, action, value)
+
+
+def pack_config(rows: int, cols: int, n: int) -> int:
+    """
+    Pack a game configuration into a single frame value.
+
+        Parameters:
+            rows (int): Number of rows.
+            cols (int): Number of columns.
+            n (int):    Value for n-in-a-row.
+
+        Returns:
+            value (int): The packed configuration.
+    """
+    return (rows << 16) | (cols << 8) | n
+
+
+def unpack_config(value: int) -> Tuple[int, int, int]:
+    """
+    Unpack a game configuration that was packed with pack_config.
+
+        Parameters:
+            value (int): The packed configuration.
+
+        Returns:
+            config (tuple): The rows, columns and n.
+    """
+    return (value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF
+
+
+def pack_queue_key(rows: int, cols: int, n: int, max_undo: int) -> int:
+    """
+    Pack a matchmaking queue key, a game configuration and its undo budget, into a single frame value.
+
+        Parameters:
+            rows (int):     Number of rows.
+            cols (int):     Number of columns.
+            n (int):        Value for n-in-a-row.
+            max_undo (int): Maximum allowed undo per player.
+
+        Returns:
+            value (int): The packed key.
+    """
+    return (max_undo << 24) | pack_config(rows, cols, n)
+
+
+def unpack_queue_key(value: int) -> Tuple[int, int, int, int]:
+    """
+    Unpack a matchmaking queue key that was packed with pack_queue_key.
+
+        Parameters:
+            value (int): The packed key.
+
+        Returns:
+            key (tuple): The rows, columns, n and maximum undo.
+    """
+    return unpack_config(value) + ((value >> 24) & 0x7F,)
+
+
+class FrameReader:
+
+    def __init__(self) -> None:
+        """
+        Create a new reader that reassembles frames out of a byte stream.
+        """
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[Frame]:
+        """
+        Add received bytes and return all the frames that are complete.
+
+            Parameters:
+                data (bytes): Bytes received from the socket.
+
+            Returns:
+                frames (list): List of (game id, action value, value) tuples.
+        """
+        self.buffer += data
+        complete = len(self.buffer) - len(self.buffer) % FRAME_SIZE
+        if not complete:
+            return []
+
+        frames = list(FRAME.iter_unpack(bytes(self.buffer[:complete])))
+        del self.buffer[:complete]
+        return frames
@@ -0,0 +1,99 @@
+import logging
+import socket
+import threading
+import time
+from typing import *
+
+
+class Reaper(threading.Thread):
+
+    def __init__(self, idle_timeout: float = 30, interval: float = 1) -> None:
+        """
+        Create a thread that closes the connections that were idle for too long.
+        A live client sends heartbeats while idle, so only the connections of clients that vanished are reaped.
+        Closing a connection wakes the thread that serves it, and that thread frees the game state.
+
+            Parameters:
+                idle_timeout (float):   Seconds without any message before a connection is reaped, default 30.
+                interval (float):       Seconds between the checks, default 1.
+        """
+        super().__init__(daemon=True)
+        self.idle_timeout = idle_timeout
+        self.interval = interval
+        self.connections = {}  # key -> [conn, last seen]
+        self.reaped = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.logger = logging.getLogger('Reaper')
+
+    def register(self, key: Hashable, conn: socket.socket) -> None:
+        """
+        Start watching a connection.
+
+            Parameters:
+                key (Hashable): The key of the connection, i.e. the client id.
+                conn (socket):  The connection.
+        """
+        with self.lock:
+            self.connections[key] = [conn, time.monotonic()]
+
+    def touch(self, key: Hashable) -> None:
+        """
+        Mark a connection as active, called on every message received on it.
+
+            Parameters:
+                key (Hashable): The key of the connection.
+        """
+        entry = self.connections.get(key)
+        if entry:
+            entry[1] = time.monotonic()
+
+    def unregister(self, key: Hashable) -> None:
+        """
+        Stop watching a connection.
+
+            Parameters:
+                key (Hashable): The key of the connection.
+        """
+        with self.lock:
+            self.connections.pop(key, None)
+
+    def run(self) -> None:
+        """
+        Reap the idle connections until stopped.
+        """
+        while not self.stop_event.wait(self.interval):
+            self.reap()
+
+    def stop(self) -> None:
+        """
+        Stop reaping.
+        """
+        self.stop_event.set()
+
+    def reap(self) -> int:
+        """
+        Close the connections that were idle for longer than the timeout.
+
+            Returns:
+                reaped (int): Number of connections closed by this call.
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        with self.lock:
+            idle = [(key, entry[0]) for key, entry in self.connections.items() if entry[1] < deadline]
+            for key, _ in idle:
+                del self.connections[key]
+
+        for key, conn in idle:
+            self.logger.warning('reaping {}, idle for over {} seconds'.format(key, self.idle_timeout))
+            #   shutdown wakes the thread blocked on the connection, it then closes it and frees its game
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+        if idle:
+            self.reaped += len(idle)
+            self.logger.info('reaped {} connections, {} in total, {} active'.format(
+                len(idle), self.reaped, len(self.connections)))
+        return len(idle)
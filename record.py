@@ -0,0 +1,404 @@
+import mmap
+import os
+import struct
+import threading
+from typing import *
+
+import numpy as np
+
+import session
+import utils
+
+#   rows, cols, n, first player, result, checkpoint interval, number of moves
+RECORD_HEADER = struct.Struct('!BBBBBHH')
+#   offset and length of every record in the data file
+INDEX_ENTRY = struct.Struct('!QI')
+INDEX_SUFFIX = '.idx'
+
+#   result of a record, a win is the id of the winner
+UNFINISHED = 0
+TIE = 3
+
+DEFAULT_INTERVAL = 8
+
+Cell = Tuple[int, int, int, int]
+
+
+def drop(board: np.ndarray, column: int, player: int) -> int:
+    """
+    Drop a piece in place.
+
+        Parameters:
+            board (np.ndarray): The board to change.
+            column (int):       The column index to add.
+            player (int):       The player id of the piece.
+
+        Returns:
+            row (int): The row the piece landed on.
+    """
+    row = int(np.flatnonzero(board[:, column] == 0)[-1])
+    board[row, column] = player
+    return row
+
+
+def lift(board: np.ndarray, column: int) -> int:
+    """
+    Remove the highest piece of a column in place.
+
+        Parameters:
+            board (np.ndarray): The board to change.
+            column (int):       The column index to remove from.
+
+        Returns:
+            row (int): The row the piece was removed from.
+    """
+    row = int(np.argmax(board[:, column] != 0))
+    board[row, column] = 0
+    return row
+
+
+def diff(before: np.ndarray, after: np.ndarray) -> List[Cell]:
+    """
+    Get the cells that differ between two boards.
+
+        Parameters:
+            before (np.ndarray):    The first board.
+            after (np.ndarray):     The second board.
+
+        Returns:
+            cells (list): The row, column, value before and value after of every changed cell.
+    """
+    rows, cols = np.nonzero(before != after)
+    return [(int(r), int(c), int(before[r, c]), int(after[r, c])) for r, c in zip(rows, cols)]
+
+
+class GameRecord:
+
+    def __init__(self, size: utils.Couple, n: int, moves: List[int], first: int = 1, result: int = UNFINISHED,
+                 interval: int = DEFAULT_INTERVAL) -> None:
+        """
+        Create the record of a game, its move list with a board checkpoint every interval moves.
+        Any position is rebuilt from the checkpoint before it in at most interval - 1 moves.
+
+            Parameters:
+                size (tuple):       The size of the board.
+                n (int):            Value for n-in-a-row.
+                moves (list):       The columns that were played, in order.
+                first (int):        The player of the first move, default 1.
+                result (int):       The winner id, TIE or UNFINISHED, default UNFINISHED.
+                interval (int):     Number of moves between checkpoints, default 8.
+        """
+        self.size = tuple(size)
+        self.n = n
+        self.moves = list(moves)
+        self.first = first
+        self.result = result
+        self.interval = max(interval, 1)
+        self.checkpoints = None  # ply // interval - 1 -> board
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    def player(self, ply: int) -> int:
+        """
+        Get the player of a move.
+
+            Parameters:
+                ply (int): The index of the move.
+
+            Returns:
+                player (int): The player id.
+        """
+        return self.first if ply % 2 == 0 else 3 - self.first
+
+    def build_checkpoints(self) -> List[np.ndarray]:
+        """
+        Replay the game once and keep a board every interval moves.
+
+            Returns:
+                checkpoints (list): The boards after interval, 2 * interval, ... moves.
+        """
+        if self.checkpoints is None:
+            board = np.zeros(self.size, dtype=np.int8)
+            self.checkpoints = []
+            for ply, column in enumerate(self.moves):
+                drop(board, column, self.player(ply))
+                if (ply + 1) % self.interval == 0:
+                    self.checkpoints.append(board.copy())
+        return self.checkpoints
+
+    def board_at(self, ply: int) -> np.ndarray:
+        """
+        Get the position after a number of moves.
+
+            Parameters:
+                ply (int): Number of moves played, 0 for the empty board.
+
+            Returns:
+                board (np.ndarray): A new board of the position.
+        """
+        ply = min(max(ply, 0), len(self.moves))
+        checkpoint = ply // self.interval
+        if checkpoint:
+            board = self.build_checkpoints()[checkpoint - 1].copy()
+        else:
+            board = np.zeros(self.size, dtype=np.int8)
+        for i in range(checkpoint * self.interval, ply):
+            drop(board, self.moves[i], self.player(i))
+        return board
+
+    def diff(self, ply_a: int, ply_b: int) -> List[Cell]:
+        """
+        Get the cells that differ between two positions of the game.
+
+            Parameters:
+                ply_a (int): The first position.
+                ply_b (int): The second position.
+
+            Returns:
+                cells (list): The row, column, value in the first and value in the second of every changed cell.
+        """
+        return diff(self.board_at(ply_a), self.board_at(ply_b))
+
+    def encode(self) -> bytes:
+        """
+        Encode the record as its header, the moves and the packed checkpoints.
+
+            Returns:
+                data (bytes): The encoded record.
+        """
+        header = RECORD_HEADER.pack(self.size[0], self.size[1], self.n, self.first, self.result, self.interval,
+                                    len(self.moves))
+        return header + bytes(self.moves) + b''.join(session.pack_board(b) for b in self.build_checkpoints())
+
+    @classmethod
+    def decode(cls, data: bytes) -> 'GameRecord':
+        """
+        Decode a record that was encoded with encode, the checkpoints are unpacked on use.
+
+            Parameters:
+                data (bytes): The encoded record.
+
+            Returns:
+                record (GameRecord): The record.
+        """
+        rows, cols, n, first, result, interval, length = RECORD_HEADER.unpack_from(data)
+        start = RECORD_HEADER.size
+        record = cls((rows, cols), n, list(data[start:start + length]), first, result, interval)
+        record.checkpoints = _PackedCheckpoints(data[start + length:], (rows, cols))
+        return record
+
+
+class _PackedCheckpoints:
+
+    def __init__(self, data: bytes, size: utils.Couple) -> None:
+        """
+        Hold the packed checkpoints of a decoded record, each one is unpacked only when it is used.
+
+            Parameters:
+                data (bytes):   The packed checkpoints.
+                size (tuple):   The size of the board.
+        """
+        self.data = data
+        self.size = size
+        self.stride = -(-size[0] * size[1] // 4)
+
+    def __len__(self) -> int:
+        return len(self.data) // self.stride
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return session.unpack_board(self.data[i * self.stride:(i + 1) * self.stride], self.size)
+
+
+class Replay:
+
+    def __init__(self, record: GameRecord) -> None:
+        """
+        Create a cursor over the positions of a recorded game, starting at the empty board.
+
+            Parameters:
+                record (GameRecord): The game to replay.
+        """
+        self.record = record
+        self.ply = 0
+        self.board = np.zeros(record.size, dtype=np.int8)
+
+    def seek(self, ply: int) -> List[Cell]:
+        """
+        Jump to a position, through the nearest checkpoint.
+
+            Parameters:
+                ply (int): Number of moves played.
+
+            Returns:
+                cells (list): The cells that changed, see diff.
+        """
+        ply = min(max(ply, 0), len(self.record))
+        #   a short jump is cheaper move by move
+        if abs(ply - self.ply) < self.record.interval:
+            return self.step(ply - self.ply)
+        board = self.record.board_at(ply)
+        changed = diff(self.board, board)
+        self.board, self.ply = board, ply
+        return changed
+
+    def step(self, count: int = 1) -> List[Cell]:
+        """
+        Step forward or backward by a number of moves.
+
+            Parameters:
+                count (int): Number of moves, negative to step backward, default 1.
+
+            Returns:
+                cells (list): The cells that changed, see diff.
+        """
+        changed = []
+        target = min(max(self.ply + count, 0), len(self.record))
+        while self.ply < target:
+            player = self.record.player(self.ply)
+            row = drop(self.board, self.record.moves[self.ply], player)
+            changed.append((row, self.record.moves[self.ply], 0, player))
+            self.ply += 1
+        while self.ply > target:
+            self.ply -= 1
+            player = self.record.player(self.ply)
+            row = lift(self.board, self.record.moves[self.ply])
+            changed.append((row, self.record.moves[self.ply], player, 0))
+        return changed
+
+
+class RecordWriter:
+
+    def __init__(self, path: str) -> None:
+        """
+        Open a records file for appending, with its index file next to it.
+
+            Parameters:
+                path (str): The path of the records file.
+        """
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        self.path = path
+        self.data = open(path, 'ab')
+        self.index = open(path + INDEX_SUFFIX, 'ab')
+        self.lock = threading.Lock()
+
+    def write(self, record: GameRecord) -> int:
+        """
+        Append a record.
+
+            Parameters:
+                record (GameRecord): The record to append.
+
+            Returns:
+                index (int): The index of the record in the file.
+        """
+        data = record.encode()
+        with self.lock:
+            offset = self.data.seek(0, os.SEEK_END)
+            self.data.write(data)
+            self.data.flush()
+            #   the index entry is written last, so a reader never sees a partial record
+            position = self.index.seek(0, os.SEEK_END)
+            self.index.write(INDEX_ENTRY.pack(offset, len(data)))
+            self.index.flush()
+        return position // INDEX_ENTRY.size
+
+    def close(self) -> None:
+        """
+        Close the files.
+        """
+        with self.lock:
+            self.data.close()
+            self.index.close()
+
+
+class RecordReader:
+
+    def __init__(self, path: str) -> None:
+        """
+        Open a records file for random access, both files are memory mapped so nothing is read until used.
+
+            Parameters:
+                path (str): The path of the records file.
+        """
+        self.path = path
+        self.data = None
+        self.index = None
+        self.count = 0
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        Map the files again to see the records appended since they were opened.
+        """
+        self.close()
+        #   the index is mapped first, the data of every record it holds was written before it
+        self.index = _map(self.path + INDEX_SUFFIX)
+        self.data = _map(self.path)
+        self.count = len(self.index) // INDEX_ENTRY.size if self.index is not None else 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> GameRecord:
+        """
+        Decode a single record in O(1).
+
+            Parameters:
+                i (int): The index of the record, negative counts from the end.
+
+            Returns:
+                record (GameRecord): The record.
+        """
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError('record {} out of range'.format(i))
+        offset, length = INDEX_ENTRY.unpack_from(self.index, i * INDEX_ENTRY.size)
+        return GameRecord.decode(self.data[offset:offset + length])
+
+    def __iter__(self) -> Iterator[GameRecord]:
+        return self.iterate()
+
+    def iterate(self, start: int = 0, stop: Optional[int] = None) -> Iterator[GameRecord]:
+        """
+        Stream the records of a range, one at a time.
+
+            Parameters:
+                start (int):    The first record, default 0.
+                stop (int):     The record to stop before, default None for the end.
+
+            Returns:
+                records (iterator): The records.
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        for i in range(start, stop):
+            yield self[i]
+
+    def close(self) -> None:
+        """
+        Unmap the files.
+        """
+        for mapped in (self.data, self.index):
+            if mapped is not None:
+                mapped.close()
+        self.data = None
+        self.index = None
+
+
+def _map(path: str) -> Optional[mmap.mmap]:
+    """
+    Memory map a file for reading.
+
+        Parameters:
+            path (str): The path of the file.
+
+        Returns:
+            mapped (mmap): The mapped file, or None if it is missing or empty.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
@@ -5,14 +5,20 @@ import socket
 import threading
 import time
 import tkinter as tk
+from typing import *
 from tkinter.font import Font
 
-import numpy as np
-
+import ai
+import profiling
+import transport
 import utils
+from acceptor import Acceptor
 from actions import Actions
-from client import ClientGUI
-from memento import Originator, CareTaker
+from clientpool import ClientPool
+from evaluator import EvaluatorPool
+from game import ENGINES, MAX_N, MAX_SIZE, Game, GameRegistry
+from reaper import Reaper
+from record import RecordWriter
 
 
 # end of imports
@@ -30,9 +36,45 @@ class ServerGUI(tk.Tk):
         parser = argparse.ArgumentParser()
         parser.add_argument('--log_level', default='info', type=str,
                             choices=['info', 'debug', 'warning', 'error', 'critical'])
+        parser.add_argument('--profile', default=0, type=float,
+                            help='seconds to profile the server and clients from startup, 0 to disable')
+        parser.add_argument('--bind_host', default='127.0.0.1', type=str,
+                            help='host of the lobby, spectate and mux ports, 0.0.0.0 to accept remote clients')
+        parser.add_argument('--mux_port', default=0, type=int,
+                            help='port for multiplexed connections carrying many games each, 0 to disable')
+        parser.add_argument('--spectate_port', default=0, type=int,
+                            help='port for spectators to watch the live games, 0 to disable')
+        parser.add_argument('--lobby_port', default=0, type=int,
+                            help='port for remote players to be paired into games, 0 to disable')
+        parser.add_argument('--records', default='', type=str,
+                            help='path of the file to record the finished games in, empty to disable')
+        parser.add_argument('--weights', default='weights', type=str,
+                            help='folder of the network weights files, named <rows>x<cols>.npz')
+        parser.add_argument('--eval_batch', default=64, type=int, help='maximum positions in an evaluation batch')
+        parser.add_argument('--eval_wait_ms', default=2.0, type=float,
+                            help='maximum milliseconds an evaluation waits for its batch to fill')
+        parser.add_argument('--max_ponder', default=2, type=int,
+                            help='maximum games whose AI searches during the human turn, 0 to disable')
+        parser.add_argument('--idle_timeout', default=30, type=float,
+                            help='seconds without any message, heartbeats included, before a client is reaped')
+        parser.add_argument('--read_timeout', default=5, type=float,
+                            help='seconds to wait for the rest of a message that was partly received')
+        parser.add_argument('--client_pool', default=2, type=int,
+                            help='number of warmed client processes waiting for a game, 0 to disable')
         args = vars(parser.parse_args())
 
         self.log_level = getattr(logging, args['log_level'].upper())
+        self.profile_seconds = args['profile']
+        self.bind_host = args['bind_host']
+        self.mux_port = args['mux_port']
+        self.spectate_port = args['spectate_port']
+        self.lobby_port = args['lobby_port']
+        self.records = RecordWriter(args['records']) if args['records'] else None
+        self.evaluators = EvaluatorPool(args['weights'], args['eval_batch'], args['eval_wait_ms'] / 1000)
+        self.ponder_slots = threading.BoundedSemaphore(args['max_ponder']) if args['max_ponder'] > 0 else None
+        self.client_pool_size = max(args['client_pool'], 0)
+        self.read_timeout = args['read_timeout']
+        self.reaper = Reaper(max(args['idle_timeout'], 2 * utils.HEARTBEAT_INTERVAL))
         self.n = 4
 
         self.n_frame = None
@@ -42,13 +84,22 @@ class ServerGUI(tk.Tk):
         self.rowsBox = None
         self.colsBox = None
         self.undo_value = None
+        self.ai_frame = None
+        self.ai_value = None
+        self.engine_frame = None
+        self.engine_value = None
         self.start_game_button = None
         self.server_socket = None
+        self.local_socket = None
+        self.acceptor = None
+        self.client_pool = None
         self.host = ''
         self.port = 0
+        self.mux_server = None
+        self.spectators = None
+        self.lobby = None
 
-        self.origin = None
-        self.caretaker = None
+        self.games = GameRegistry()
 
         self.queue = multiprocessing.Queue(-1)  # -1=unlimited
         self.logger_listener = multiprocessing.Process(target=utils.logger_listener, args=(self.queue, self.log_level,))
@@ -58,13 +109,46 @@ class ServerGUI(tk.Tk):
         self.logger = logging.getLogger('Server')
         self.logger.info('n={}, log_level={}'.format(self.n, logging.getLevelName(self.log_level)))
 
+        if self.profile_seconds > 0:
+            profiling.start(self.profile_seconds, name='server')
+
         self.clients = []
         self.client_id = 0
 
         self.create_server_gui()
 
+        #   warm the client processes before the first game is started
+        self.client_pool = ClientPool(self.client_pool_size, self.queue, self.log_level)
+
         self.create_server_socket()
 
+        self.reaper.start()
+
+        #   accept the clients off the gui thread, so starting a game never waits for its client
+        listeners = [s for s in (self.server_socket, self.local_socket) if s]
+        self.acceptor = Acceptor(listeners, self.start_client)
+        self.acceptor.start()
+
+        if self.spectate_port:
+            #   the spectators server is optional, only load it when enabled
+            from spectate import SpectatorServer
+            self.spectators = SpectatorServer(self.bind_host, self.spectate_port)
+            self.spectators.start()
+
+        if self.lobby_port:
+            #   the lobby is optional, only load it when enabled
+            from lobby import Lobby
+            self.lobby = Lobby(self.bind_host, self.lobby_port, self.spectators, self.reaper.idle_timeout)
+            self.lobby.start()
+
+        if self.mux_port:
+            #   the multiplexed server is optional, only load it when enabled
+            from mux import MuxServer
+            from session import SessionStore
+            self.mux_server = MuxServer(self.bind_host, self.mux_port, SessionStore(backing_file='sessions'),
+                                        self.spectators)
+            self.mux_server.start()
+
     def create_server_gui(self) -> None:
         """
         Generate the server gui.
@@ -81,7 +165,7 @@ class ServerGUI(tk.Tk):
         #   define n-in-a-row frame
         self.n_frame = tk.Frame(self)
         n = tk.StringVar(value='4')
-        self.n_value = tk.Spinbox(self.n_frame, textvariable=n, from_=4, to=6, width=2,
+        self.n_value = tk.Spinbox(self.n_frame, textvariable=n, from_=4, to=MAX_N, width=2,
                                   font=Font(family='Helvetica', size=20, weight='bold'), state='readonly',
                                   command=self.validate_n)
         self.n_value.grid(row=0, column=0)
@@ -93,10 +177,10 @@ class ServerGUI(tk.Tk):
         self.spin_frame = tk.Frame(self)
         rows = tk.StringVar(value='8')
         cols = tk.StringVar(value='8')
-        self.rowsBox = tk.Spinbox(self.spin_frame, textvariable=rows, from_=5, to=10, width=2,
+        self.rowsBox = tk.Spinbox(self.spin_frame, textvariable=rows, from_=5, to=MAX_SIZE, width=2,
                                   font=Font(family='Helvetica', size=20, weight='bold'), state='readonly',
                                   command=self.validate_n)
-        self.colsBox = tk.Spinbox(self.spin_frame, textvariable=cols, from_=5, to=10, width=2,
+        self.colsBox = tk.Spinbox(self.spin_frame, textvariable=cols, from_=5, to=MAX_SIZE, width=2,
                                   font=Font(family='Helvetica', size=20, weight='bold'), state='readonly',
                                   command=self.validate_n)
         self.rowsBox.grid(row=0, column=0, sticky=tk.W, )
@@ -115,6 +199,26 @@ class ServerGUI(tk.Tk):
                                                                                                              column=0)
         self.undo_frame.pack()
 
+        #   define the opponent frame, a human on the same client or an AI played by the server
+        self.ai_frame = tk.Frame(self)
+        ai_val = tk.StringVar(value='human')
+        self.ai_value = tk.Spinbox(self.ai_frame, textvariable=ai_val, values=('human', 'negamax', 'network'),
+                                   width=8, font=Font(family='Helvetica', size=20, weight='bold'), state='readonly')
+        self.ai_value.grid(row=0, column=1)
+        tk.Label(self.ai_frame, text="Opponent: ", font=Font(family='Helvetica', size=20, weight='bold')).grid(row=0,
+                                                                                                           column=0)
+        self.ai_frame.pack()
+
+        #   define the engine frame, the bitboard engine plays the boards above 10x10 or 6 in a row
+        self.engine_frame = tk.Frame(self)
+        engine_val = tk.StringVar(value='auto')
+        self.engine_value = tk.Spinbox(self.engine_frame, textvariable=engine_val, values=ENGINES,
+                                       width=8, font=Font(family='Helvetica', size=20, weight='bold'), state='readonly')
+        self.engine_value.grid(row=0, column=1)
+        tk.Label(self.engine_frame, text="Engine: ", font=Font(family='Helvetica', size=20, weight='bold')).grid(
+            row=0, column=0)
+        self.engine_frame.pack()
+
         #   define start button
         self.start_game_button = tk.Button(self, text='Start Play',
                                            font=Font(family='Helvetica', size=18, weight='bold'),
@@ -139,7 +243,8 @@ class ServerGUI(tk.Tk):
     def create_game(self) -> None:
         """
         Callback function for the start game button.
-        Reads the number of rows and columns, create a new client gui and open a socket.
+        Reads the number of rows and columns and create a new client gui, returns without waiting for the client to
+        connect, the acceptor starts the game when it does.
         """
         rows, cols = int(self.rowsBox.get()), int(self.colsBox.get())
         n = int(self.n_value.get())
@@ -147,22 +252,44 @@ class ServerGUI(tk.Tk):
             return
 
         max_undo = int(self.undo_value.get())
+        opponent = self.ai_value.get()
+        vs_ai = opponent != 'human'
+        engine = self.engine_value.get()
+
+        #   the client runs on this host, so it connects over the local transport when there is one
+        listener = self.local_socket if self.local_socket else self.server_socket
+        address = listener.getsockname()
 
         self.client_id += 1
-        #   creates new process to start the client's gui on
-        client_process = multiprocessing.Process(target=ClientGUI,
-                                                 args=(self.client_id, self.queue, self.log_level, (rows, cols), n, max_undo))
-        client_process.start()
+        #   expect the client before it starts, so its connection always finds the game
+        self.acceptor.expect(self.client_id, ((rows, cols), n, max_undo, opponent if vs_ai else None, engine))
+        #   start the client's gui on a warmed process
+        client_process = self.client_pool.launch(self.client_id, (rows, cols), n, max_undo, self.profile_seconds,
+                                                 vs_ai, address)
+        self.acceptor.attach(self.client_id, client_process)
         self.logger.info('created Client({}) with board size (rows={}, cols={})'.format(self.client_id, rows, cols))
 
-        client, address = self.server_socket.accept()
+    def start_client(self, conn: socket.socket, client_id: int, size: utils.Couple, n: int, max_undo: int,
+                     opponent: Optional[str] = None, engine: str = 'auto') -> None:
+        """
+        Callback function for a client that connected to its pending game, called on the acceptor thread.
 
+            Parameters:
+                conn (socket):      The socket to communicate with the client.
+                client_id (int):    The ID of the client.
+                size (tuple):       The size of the board.
+                n (int):            Value for n-in-a-row.
+                max_undo (int):     Maximum allowed undo per player.
+                opponent (str):     Spec of the AI player, default None for two humans.
+                engine (str):       The engine of the game, see game.create_game, default 'auto'.
+        """
         #   creates new thread to maintain the client's state
-        thread = threading.Thread(target=self.run_client, daemon=True, args=(client, self.client_id, (rows, cols), n,))
+        thread = threading.Thread(target=self.run_client, daemon=True,
+                                  args=(conn, client_id, size, n, max_undo, opponent, engine,))
         thread.start()
 
-        self.clients.append(client)
-        self.logger.info('connected to={}:{}'.format(address[0], str(address[1])))
+        self.clients.append(conn)
+        self.logger.info('Client({}) connected to={}'.format(client_id, transport.describe(conn)))
 
     def close_all(self) -> None:
         """
@@ -172,17 +299,41 @@ class ServerGUI(tk.Tk):
         """
         for conn in self.clients:
             try:
-                host, port = conn.getpeername()
-                self.logger.debug('closing {}:{}'.format(host, port))
+                name = transport.describe(conn)
+                self.logger.debug('closing {}'.format(name))
                 # send an exit to the client, so it will close its conn
-                conn.send(bytes(str(Actions.EXIT.value), 'utf8'))
+                utils.send_data(conn, Actions.EXIT.value)
                 conn.close()
-                self.logger.debug('conn {}:{} closed'.format(host, port))
+                self.logger.debug('conn {} closed'.format(name))
             except Exception as e:
                 self.logger.debug('conn allready closed')
 
         self.logger.info('closing server conn')
+        self.acceptor.stop()
+        self.acceptor.join(1)
         self.server_socket.close()
+        if self.local_socket:
+            transport.close_listener(self.local_socket)
+
+        if self.mux_server:
+            self.mux_server.stop()
+
+        if self.lobby:
+            self.lobby.stop()
+            self.logger.info('lobby paired {} games, reaped {} idle players'.format(self.lobby.matches,
+                                                                                 self.lobby.reaped))
+
+        if self.records:
+            self.records.close()
+
+        if self.spectators:
+            self.spectators.stop()
+            self.logger.info('dropped {} slow spectators'.format(self.spectators.dropped))
+
+        self.client_pool.close()
+
+        self.reaper.stop()
+        self.logger.info('reaped {} idle connections'.format(self.reaper.reaped))
 
         #   sleep before terminate the logger listener so it will finish to log
         time.sleep(1)
@@ -192,126 +343,248 @@ class ServerGUI(tk.Tk):
 
     def create_server_socket(self) -> None:
         """
-        Creates the server socket.
+        Creates the server socket, and a Unix domain socket for the clients that run on the same host.
         """
-        self.server_socket = socket.socket()
         self.host = '127.0.0.1'
         self.port = 1234
 
         try:
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen()
+            self.server_socket = transport.create_listener((self.host, self.port))
         except Exception as e:
-            self.server_socket.close()
             self.logger.error(str(e))
-        host, port = self.server_socket.getsockname()
-        self.logger.info('socket created {}:{}'.format(host, port))
+            return
+        self.logger.info('socket created {}'.format(transport.describe(self.server_socket, peer=False)))
+
+        if transport.has_local_transport():
+            try:
+                self.local_socket = transport.create_listener(transport.local_path(self.port))
+                self.logger.info('socket created {}'.format(transport.describe(self.local_socket, peer=False)))
+            except Exception as e:
+                self.logger.warning('local transport unavailable, using tcp: {}'.format(str(e)))
+                self.local_socket = None
 
-    def reset_game(self, size: utils.Couple):
+    def create_ai_player(self, spec: str, size: utils.Couple) -> ai.Player:
         """
-        Reset the game board and states.
+        Create the AI opponent of a game, network players share the batch evaluator of their board size.
 
             Parameters:
-                size (tuple):       The size of the board.
+                spec (str):     The spec of the player, see ai.create_player.
+                size (tuple):   The size of the board.
+
+            Returns:
+                player (Player): The AI player.
+        """
+        try:
+            return ai.create_player(spec, self.evaluators.get(*size))
+        except ValueError as e:
+            #   i.e. a network player without a weights file for the board size
+            self.logger.warning('cannot create {} player, using negamax: {}'.format(spec, str(e)))
+            return ai.NegamaxPlayer()
+
+    def play_ai(self, conn: socket.socket, client_id: int, game: Game, ai_player: ai.Player) -> bool:
         """
-        self.state = np.zeros(size, dtype=np.int8)
+        Play the AI's reply and send it to the client as a single 'column,action' message.
+
+            Parameters:
+                conn (socket):          The socket to communicate with the client.
+                client_id (int):        The ID of the client.
+                game (Game):            The game of the client.
+                ai_player (Player):     The AI player.
+
+            Returns:
+                continues (bool): True if the game continues after the reply, False if it is over.
+        """
+        with game.lock:
+            column = ai_player.choose(game.board, game.turn, game.n)
+            result = game.play(column)
+        self.logger.info('Client({}) AI played column={}, result={}'.format(client_id, column, result))
+        utils.send_data(conn, '{},{}'.format(column, result.value))
+        return result == Actions.CONTINUE
+
+    @staticmethod
+    def read_first(data: bytes, default: int = 1) -> int:
+        """
+        Read the player that starts a game, sent by the client with the ready and reset events.
+
+            Parameters:
+                data (bytes):   The player id, empty for the default.
+                default (int):  The player to start when the client did not send one, default 1.
+
+            Returns:
+                first (int): The player id.
 
-        self.origin = Originator()
-        self.caretaker = CareTaker(self.origin)
+            Raises:
+                ValueError: If the data is not a player id.
+        """
+        if not data:
+            return default
+        first = int(data)
+        if first not in (1, 2):
+            raise ValueError('illegal first player {}'.format(first))
+        return first
+
+    def record_game(self, game: Game) -> None:
+        """
+        Record a game if it is finished, called with the game lock held before its moves are dropped.
 
-        self.origin.set_state(self.state)
-        self.caretaker.do()
+            Parameters:
+                game (Game): The game to record.
+        """
+        if self.records and game.over:
+            self.records.write(game.to_record())
 
-    def run_client(self, conn: socket.socket, client_id: int, size: utils.Couple, n: int) -> None:
+    def run_client(self, conn: socket.socket, client_id: int, size: utils.Couple, n: int, max_undo: int,
+                   opponent: Optional[str] = None, engine: str = 'auto') -> None:
         """
         Maintains the client's state, receive steps and send responses.
+        The game state is freed when the client exits, and when its connection is lost, timed out or reaped.
 
             Parameters:
                 conn (socket):      The socket to communicate with the client.
                 client_id (int):    The ID of the client.
                 size (tuple):       The size of the board.
                 n (int):            Value for n-in-a-row.
+                max_undo (int):     Maximum allowed undo per player.
+                opponent (str):     Spec of the AI player that answers every move, default None for two humans.
+                engine (str):       The engine of the game, see game.create_game, default 'auto'.
         """
-
-        self.reset_game(size)
-
-        #   wait for the client to finish it's setup
-        while True:
-            wait_to_ready = utils.wait_for_data(conn, 0.1)
-            if wait_to_ready and Actions.READY.is_equals(wait_to_ready):
-                host, port = conn.getpeername()
-                self.logger.debug('Client({}) is ready {}:{}'.format(client_id, host, port))
-                break
-
-        #   run the main clients loop
-        while True:
-            #   receive the player id from the client
-            action1 = utils.wait_for_data(conn)
-
-            #   if client sent an exit event, break the main loop
-            if action1 and Actions.EXIT.is_equals(action1):
-                self.logger.debug('received exit event from Client({})'.format(client_id))
-                break
-
-            elif action1 and Actions.RESET.is_equals(action1):
-                self.logger.info('received reset event from Client({})'.format(client_id))
-                self.reset_game(size)
-                continue
-
-            elif action1 and Actions.UNDO.is_equals(action1):
-                self.logger.info('received undo event from Client({})'.format(client_id))
-                if self.caretaker.undo():
-                    self.state = self.origin.get_state()
-                continue
-
-            #   receive the step from the client
-            action2 = utils.wait_for_data(conn)
-
-            #   if none, error occurred
-            if not action1 or not action2:
-                break
-
-            player, column = int(action1), int(action2)
-
-            self.logger.info('Client({}) got column={} from player={}'.format(client_id, column, player))
-
-            #   validate the step, if illegal, send event to notify the client
-            if not utils.is_valid_location(column, self.state):
-                self.logger.warning('send illegal_location to Client({})'.format(client_id))
-                conn.send(bytes(str(Actions.ILLEGAL_LOCATION.value), 'utf8'))
-                continue
-
-            self.logger.debug('legal location')
-
-            #   add the piece in the requested place and send event to update the client
-            self.state = utils.add_piece(self.state, column, player)
-            conn.send(bytes(str(Actions.ADD_PIECE.value), 'utf8'))
-            self.logger.debug('piece added')
-
-            self.origin.set_state(self.state)
-            self.caretaker.do()
-
-            #   if the user that added the piece won, send win event
-            if utils.is_won(self.state, player, n):
-                self.logger.info('player {} won on Client({})'.format(player, client_id))
-                conn.send(bytes(str(Actions.WIN.value), 'utf8'))
-            #   if the board is full, send tie event
-            elif utils.is_board_full(self.state):
-                self.logger.debug('send tie to Client({})'.format(client_id))
-                conn.send(bytes(str(Actions.TIE.value), 'utf8'))
-            #   if not win and board is not full, send continue event to continue the game
-            else:
-                self.logger.debug('send continue to Client({})'.format(client_id))
-                conn.send(bytes(str(Actions.CONTINUE.value), 'utf8'))
-
+        game, ponderer = None, None
         try:
-            host, port = conn.getpeername()
-            self.logger.debug('closing {}:{}'.format(host, port))
+            ai_player = self.create_ai_player(opponent, size) if opponent else None
+            ponderer = ai.Ponderer(self.ponder_slots) if ai_player and self.ponder_slots else None
+
+            #   every connection plays its own game, so concurrent clients never share a board
+            game = self.games.create(client_id, size, n, max_undo, engine)
+            if self.spectators:
+                with game.lock:
+                    self.spectators.attach(game)
+                self.logger.info('Client({}) plays game {}'.format(client_id, game.id))
+            self.reaper.register(client_id, conn)
+
+            #   wait for the client to finish it's setup, it sends the player it chose to start with the ready event
+            while True:
+                wait_to_ready, _, first = utils.read_data(conn).partition(b',')
+                self.reaper.touch(client_id)
+                if Actions.READY.is_equals(wait_to_ready):
+                    first = self.read_first(first)
+                    with game.lock:
+                        game.reset(first)
+                    self.logger.debug('Client({}) is ready {}, first={}'.format(client_id, transport.describe(conn),
+                                                                               first))
+                    break
+
+            #   run the main clients loop
+            while True:
+                #   receive the player id from the client, an idle client is reaped
+                action1, _, first = utils.read_data(conn).partition(b',')
+                self.reaper.touch(client_id)
+
+                if Actions.HEARTBEAT.is_equals(action1):
+                    continue
+
+                #   the human moved, cancel the AI's search of the predicted replies
+                if ponderer:
+                    ponderer.stop()
+
+                #   if client sent an exit event, break the main loop
+                if Actions.EXIT.is_equals(action1):
+                    self.logger.debug('received exit event from Client({})'.format(client_id))
+                    break
+
+                elif Actions.RESET.is_equals(action1):
+                    self.logger.info('received reset event from Client({})'.format(client_id))
+                    with game.lock:
+                        self.record_game(game)
+                        #   the client sends the player that starts the next one, the player on turn when it ended
+                        game.reset(self.read_first(first, game.turn))
+                    continue
+
+                elif Actions.UNDO.is_equals(action1):
+                    self.logger.info('received undo event from Client({})'.format(client_id))
+                    with game.lock:
+                        #   the undo is charged to the player that made the last move, against the AI it takes
+                        #   back both the AI's reply and the player's move
+                        player = game.turn if ai_player else game.last_player
+                        performed = game.undo(player)
+                    if not performed:
+                        self.logger.warning('Client({}) player {} undo rejected'.format(client_id, player))
+                    continue
+
+                elif Actions.PROFILE.is_equals(action1):
+                    seconds = self.profile_seconds if self.profile_seconds > 0 else profiling.DEFAULT_SECONDS
+                    self.logger.info('received profile event from Client({}), profiling for {} seconds'.format(
+                        client_id, seconds))
+                    profiling.start(seconds, name='server')
+                    continue
+
+                #   receive the step from the client, it is sent right after the player id
+                action2 = utils.read_data(conn, self.read_timeout)
+                self.reaper.touch(client_id)
+
+                player, column = int(action1), int(action2)
+
+                self.logger.info('Client({}) got column={} from player={}'.format(client_id, column, player))
+
+                #   validate the turn and the step and add the piece in the requested place
+                with game.lock:
+                    result = game.play(column, player)
+
+                if result == Actions.ILLEGAL_DATA:
+                    self.logger.warning('Client({}) player {} played out of turn'.format(client_id, player))
+                    utils.send_data(conn, Actions.ILLEGAL_DATA.value)
+                    continue
+
+                #   if illegal, send event to notify the client
+                if result == Actions.ILLEGAL_LOCATION:
+                    self.logger.warning('send illegal_location to Client({})'.format(client_id))
+                    utils.send_data(conn, Actions.ILLEGAL_LOCATION.value)
+                    continue
+
+                #   send event to update the client
+                utils.send_data(conn, Actions.ADD_PIECE.value)
+                self.logger.debug('piece added')
+
+                #   if the user that added the piece won, send win event
+                if result == Actions.WIN:
+                    self.logger.info('player {} won on Client({})'.format(player, client_id))
+                    utils.send_data(conn, Actions.WIN.value)
+                #   if the board is full, send tie event
+                elif result == Actions.TIE:
+                    self.logger.debug('send tie to Client({})'.format(client_id))
+                    utils.send_data(conn, Actions.TIE.value)
+                #   if not win and board is not full, send continue event to continue the game
+                else:
+                    self.logger.debug('send continue to Client({})'.format(client_id))
+                    utils.send_data(conn, Actions.CONTINUE.value)
+
+                    if ai_player and self.play_ai(conn, client_id, game, ai_player) and ponderer:
+                        ponderer.start(ai_player, game.board, game.turn, game.n)
+
+        except TimeoutError as e:
+            self.logger.warning('Client({}) timed out: {}'.format(client_id, str(e)))
+        except ConnectionError as e:
+            self.logger.warning('Client({}) connection lost: {}'.format(client_id, str(e)))
+        except ValueError as e:
+            self.logger.warning('Client({}) sent illegal data: {}'.format(client_id, str(e)))
+
+        finally:
+            if ponderer:
+                ponderer.stop()
+            self.reaper.unregister(client_id)
+            self.games.remove(client_id)
+            if game is not None:
+                with game.lock:
+                    self.record_game(game)
+                if self.spectators:
+                    self.spectators.detach(game)
+
+            try:
+                self.clients.remove(conn)
+            except ValueError:
+                pass
+            self.logger.debug('closing Client({})'.format(client_id))
             conn.close()
-            self.clients.remove(conn)
-            self.logger.debug('conn {}:{} closed'.format(host, port))
-        except Exception as e:
-            self.logger.debug('conn has already been closed')
+            self.logger.debug('Client({}) closed, {} active'.format(client_id, len(self.clients)))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,173 @@
+import collections
+import dbm
+import secrets
+import struct
+import threading
+from typing import *
+
+import numpy as np
+
+#   rows, cols, n, turn, is over, followed by one byte per move (the column)
+HEADER = struct.Struct('!BBBBB')
+
+
+def pack_board(board: np.ndarray) -> bytes:
+    """
+    Pack a board into 2 bits per cell, 4 cells per byte.
+
+        Parameters:
+            board (np.ndarray): The board to pack, cells are 0, 1 or 2.
+
+        Returns:
+            packed (bytes): The packed cells, row by row.
+    """
+    cells = np.asarray(board, dtype=np.uint8).ravel()
+    padded = np.zeros(-(-cells.size // 4) * 4, dtype=np.uint8)
+    padded[:cells.size] = cells
+    quads = padded.reshape(-1, 4)
+    packed = quads[:, 0] | (quads[:, 1] << 2) | (quads[:, 2] << 4) | (quads[:, 3] << 6)
+    return packed.astype(np.uint8).tobytes()
+
+
+def unpack_board(data: bytes, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Unpack a board that was packed with pack_board.
+
+        Parameters:
+            data (bytes):   The packed cells.
+            size (tuple):   The rows and columns of the board.
+
+        Returns:
+            board (np.ndarray): The board as an int8 array.
+    """
+    packed = np.frombuffer(data, dtype=np.uint8)
+    cells = np.stack([(packed >> shift) & 0b11 for shift in (0, 2, 4, 6)], axis=1).ravel()
+    return cells[:size[0] * size[1]].astype(np.int8).reshape(size)
+
+
+def encode_session(size: Tuple[int, int], n: int, turn: int, over: bool, moves: List[int]) -> bytes:
+    """
+    Encode a game as its header and move list.
+
+        Parameters:
+            size (tuple):   The size of the board.
+            n (int):        Value for n-in-a-row.
+            turn (int):     The player whose turn it is.
+            over (bool):    Whether the game is over.
+            moves (list):   The columns that were played, in order.
+
+        Returns:
+            data (bytes): The encoded game.
+    """
+    return HEADER.pack(size[0], size[1], n, turn, int(over)) + bytes(moves)
+
+
+def decode_session(data: bytes) -> Tuple[Tuple[int, int], int, int, bool, List[int]]:
+    """
+    Decode a game that was encoded with encode_session.
+
+        Parameters:
+            data (bytes): The encoded game.
+
+        Returns:
+            game (tuple): The size, n, turn, whether the game is over and the moves list.
+    """
+    rows, cols, n, turn, over = HEADER.unpack_from(data)
+    return (rows, cols), n, turn, bool(over), list(data[HEADER.size:])
+
+
+def new_token() -> int:
+    """
+    Create a new random session token, it fits into the value of a protocol frame.
+
+        Returns:
+            token (int): A positive 31 bits token.
+    """
+    return secrets.randbits(31) or 1
+
+
+class SessionStore:
+
+    def __init__(self, capacity: int = 10000, backing_file: Optional[str] = 'sessions') -> None:
+        """
+        Create a store of idle game sessions, indexed by their token.
+        The least recently used sessions beyond the capacity are evicted to an on-disk backing file.
+
+            Parameters:
+                capacity (int):         Maximum sessions to keep in memory, default 10000.
+                backing_file (str):     Path of the backing file, default 'sessions', None to drop evicted sessions.
+        """
+        self.capacity = capacity
+        self.sessions = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.backing = dbm.open(backing_file, 'c') if backing_file else None
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def put(self, token: int, data: bytes) -> None:
+        """
+        Store an idle session, evicting the least recently used sessions if needed.
+
+            Parameters:
+                token (int):    The token of the session.
+                data (bytes):   The encoded session.
+        """
+        with self.lock:
+            self.sessions[token] = data
+            self.sessions.move_to_end(token)
+            while len(self.sessions) > self.capacity:
+                evicted_token, evicted_data = self.sessions.popitem(last=False)
+                if self.backing is not None:
+                    self.backing[str(evicted_token)] = evicted_data
+
+    def pop(self, token: int) -> Optional[bytes]:
+        """
+        Remove a session from the store and return it, looking in the backing file if it was evicted.
+
+            Parameters:
+                token (int): The token of the session.
+
+            Returns:
+                data (bytes): The encoded session, or None if there is no such session.
+        """
+        with self.lock:
+            data = self.sessions.pop(token, None)
+            if data is None and self.backing is not None:
+                key = str(token)
+                if key in self.backing:
+                    data = self.backing[key]
+                    del self.backing[key]
+            return data
+
+    def discard(self, token: int) -> None:
+        """
+        Remove a session from the store if it exists.
+
+            Parameters:
+                token (int): The token of the session.
+        """
+        self.pop(token)
+
+    def memory_size(self) -> int:
+        """
+        Number of bytes used by the encoded in-memory sessions.
+
+            Returns:
+                size (int): The total size of the sessions data.
+        """
+        with self.lock:
+            return sum(len(data) for data in self.sessions.values())
+
+    def close(self) -> None:
+        """
+        Write all the in-memory sessions to the backing file and close it.
+        """
+        with self.lock:
+            if self.backing is None:
+                return
+            for token, data in self.sessions.items():
+                self.backing[str(token)] = data
+            self.sessions.clear()
+            self.backing.close()
+            self.backing = None
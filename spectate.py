@@ -0,0 +1,442 @@
+import collections
+import functools
+import logging
+import selectors
+import socket
+import threading
+from typing import *
+
+import numpy as np
+
+import protocol
+import session
+from actions import Actions
+from game import Game
+
+
+class GameView:
+
+    def __init__(self, size: Tuple[int, int], n: int) -> None:
+        """
+        Create the view of a game as the spectators see it, rebuilt only out of the broadcast events.
+
+            Parameters:
+                size (tuple):   The size of the board.
+                n (int):        Value for n-in-a-row.
+        """
+        self.size = tuple(size)
+        self.n = n
+        self.board = np.zeros(self.size, dtype=np.int8)
+        self.turn = 1
+        self.over = False
+
+    def apply(self, action: int, value: int) -> None:
+        """
+        Apply a broadcast event on the view.
+
+            Parameters:
+                action (int):   The action value of the event.
+                value (int):    The payload of the event, see SpectatorServer.publish.
+        """
+        if Actions.ADD_PIECE.is_equals(action):
+            player, column = value >> 8, value & 0xFF
+            row = int(np.flatnonzero(self.board[:, column] == 0)[-1])
+            self.board[row, column] = player
+            self.turn = 1 if player == 2 else 2
+        elif Actions.WIN.is_equals(action):
+            self.over = True
+            self.turn = value
+        elif Actions.TIE.is_equals(action):
+            self.over = True
+        elif Actions.UNDO.is_equals(action):
+            #   the undone piece is the highest one of its column, and its player plays again
+            row = int(np.argmax(self.board[:, value] != 0))
+            self.turn = int(self.board[row, value])
+            self.board[row, value] = 0
+            self.over = False
+        elif Actions.RESET.is_equals(action):
+            self.board.fill(0)
+            self.turn = value or 1
+            self.over = False
+
+    def snapshot(self) -> bytes:
+        """
+        Encode the current state for a spectator that joins in the middle of the game.
+
+            Returns:
+                data (bytes): The session header followed by the packed board.
+        """
+        header = session.HEADER.pack(self.size[0], self.size[1], self.n, self.turn, int(self.over))
+        return header + session.pack_board(self.board)
+
+    @classmethod
+    def from_snapshot(cls, data: bytes) -> 'GameView':
+        """
+        Rebuild a view out of a snapshot.
+
+            Parameters:
+                data (bytes): The encoded snapshot.
+
+            Returns:
+                view (GameView): The view.
+        """
+        rows, cols, n, turn, over = session.HEADER.unpack_from(data)
+        view = cls((rows, cols), n)
+        view.board = session.unpack_board(data[session.HEADER.size:], (rows, cols))
+        view.turn = turn
+        view.over = bool(over)
+        return view
+
+
+class _Subscriber:
+
+    def __init__(self, conn: socket.socket) -> None:
+        """
+        Create the state of a single spectator connection.
+
+            Parameters:
+                conn (socket): The socket of the spectator.
+        """
+        self.conn = conn
+        self.reader = protocol.FrameReader()
+        self.out = bytearray()
+        self.game_id = None
+        self.closing = False
+
+
+class _Channel:
+
+    def __init__(self, view: GameView) -> None:
+        """
+        Create the broadcast channel of a single game.
+
+            Parameters:
+                view (GameView): The state of the game when the channel was opened.
+        """
+        self.view = view
+        self.subscribers = set()
+
+
+class SpectatorServer(threading.Thread):
+
+    def __init__(self, host: str, port: int, max_buffer: int = 65536) -> None:
+        """
+        Create a server that streams live games to spectators, all of them served by this single thread.
+        The games publish their events from their own threads without ever waiting on a spectator, every event is
+        encoded once and appended to the buffer of each subscriber. A subscriber whose unsent bytes overflow the
+        bound is dropped.
+
+            Parameters:
+                host (str):         The host to listen on.
+                port (int):         The port to listen on.
+                max_buffer (int):   Maximum unsent bytes per subscriber before it is dropped, default 64KB.
+        """
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.max_buffer = max_buffer
+        self.selector = selectors.DefaultSelector()
+        self.server_socket = None
+        self.channels = {}  # game id -> _Channel
+        self.subscribers = {}  # conn -> _Subscriber
+        self.events = collections.deque()
+        self.waker, self.wake_socket = socket.socketpair()
+        self.waker.setblocking(False)
+        self.wake_socket.setblocking(False)
+        self.dropped = 0
+        self.stop_event = threading.Event()
+        self.logger = logging.getLogger('SpectatorServer')
+
+    def attach(self, game: Game) -> None:
+        """
+        Open the channel of a game and publish all of its changes, call it with the game lock held.
+
+            Parameters:
+                game (Game): The game to broadcast.
+        """
+        view = GameView(game.size, game.n)
+        view.board = game.board.copy()
+        view.turn = game.turn
+        view.over = game.over
+        self.post(('open', game.id, view))
+        game.on_change = functools.partial(self.publish, game.id)
+
+    def detach(self, game: Game) -> None:
+        """
+        Stop publishing the changes of a game and close its channel.
+
+            Parameters:
+                game (Game): The game to stop broadcasting.
+        """
+        game.on_change = None
+        self.close(game.id)
+
+    def publish(self, game_id: int, action: Actions, value: int = 0) -> None:
+        """
+        Publish an event of a game, can be called from any thread and never blocks.
+
+            Parameters:
+                game_id (int):      The public id of the game.
+                action (Actions):   ADD_PIECE with player * 256 + column, WIN with the player, TIE,
+                                    UNDO with the column of the removed piece or RESET with the player that
+                                    plays first.
+                value (int):        The payload of the event, default 0.
+        """
+        self.post(('event', game_id, action.value, value))
+
+    def close(self, game_id: int) -> None:
+        """
+        Close the channel of a finished game, its subscribers get an EXIT and are disconnected.
+
+            Parameters:
+                game_id (int): The public id of the game.
+        """
+        self.post(('close', game_id))
+
+    def post(self, event: tuple) -> None:
+        """
+        Queue an event for the server thread and wake it up.
+
+            Parameters:
+                event (tuple): The event.
+        """
+        self.events.append(event)
+        try:
+            self.wake_socket.send(b'\0')
+        except (BlockingIOError, InterruptedError):
+            #   the wake up buffer is full, the server thread is already going to wake up
+            pass
+
+    def run(self) -> None:
+        """
+        Listen for spectators and stream the published events until stopped.
+        """
+        self.server_socket = socket.socket()
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.server_socket.bind((self.host, self.port))
+            self.server_socket.listen(1024)
+        except Exception as e:
+            self.server_socket.close()
+            self.logger.error(str(e))
+            return
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
+        self.selector.register(self.waker, selectors.EVENT_READ)
+        self.logger.info('socket created {}:{}'.format(*self.server_socket.getsockname()[:2]))
+
+        while not self.stop_event.is_set():
+            for key, events in self.selector.select(timeout=0.5):
+                if key.fileobj is self.server_socket:
+                    self.accept()
+                elif key.fileobj is self.waker:
+                    self.drain()
+                else:
+                    subscriber = key.data
+                    if events & selectors.EVENT_READ:
+                        self.read(subscriber)
+                    if events & selectors.EVENT_WRITE and subscriber.conn in self.subscribers:
+                        self.flush(subscriber)
+
+        for subscriber in list(self.subscribers.values()):
+            self.drop(subscriber)
+        self.selector.close()
+        self.server_socket.close()
+        self.waker.close()
+        self.wake_socket.close()
+
+    def stop(self) -> None:
+        """
+        Stop the server and disconnect all the spectators.
+        """
+        self.stop_event.set()
+
+    def accept(self) -> None:
+        """
+        Accept a new spectator, it is subscribed once it sends the game id to watch.
+        """
+        try:
+            conn, _ = self.server_socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        conn.setblocking(False)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        #   bound the kernel buffer as well, so a stalled spectator is detected instead of absorbing megabytes
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.max_buffer)
+        subscriber = _Subscriber(conn)
+        self.subscribers[conn] = subscriber
+        self.selector.register(conn, selectors.EVENT_READ, subscriber)
+
+    def read(self, subscriber: _Subscriber) -> None:
+        """
+        Read the subscribe request of a spectator, a spectator watches a single game.
+
+            Parameters:
+                subscriber (_Subscriber): The spectator to read from.
+        """
+        try:
+            data = subscriber.conn.recv(1024)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = None
+
+        if not data:
+            self.drop(subscriber)
+            return
+
+        for game_id, action, _ in subscriber.reader.feed(data):
+            if not Actions.SPECTATE.is_equals(action) or subscriber.game_id is not None:
+                continue
+            channel = self.channels.get(game_id)
+            if channel is None:
+                subscriber.out += protocol.encode(game_id, Actions.ILLEGAL_DATA)
+                subscriber.closing = True
+            else:
+                #   the snapshot is taken from the channel's view, so it lines up with the events that follow
+                snapshot = channel.view.snapshot()
+                subscriber.out += protocol.encode(game_id, Actions.SNAPSHOT, len(snapshot)) + snapshot
+                subscriber.game_id = game_id
+                channel.subscribers.add(subscriber)
+            self.flush(subscriber)
+
+    def drain(self) -> None:
+        """
+        Fan out all the queued events, each subscriber is flushed once per drain.
+        """
+        try:
+            while self.waker.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+        pending = set()
+        while self.events:
+            event = self.events.popleft()
+            game_id = event[1]
+
+            if event[0] == 'open':
+                self.channels[game_id] = _Channel(event[2])
+                continue
+
+            channel = self.channels.get(game_id)
+            if channel is None:
+                continue
+
+            if event[0] == 'event':
+                channel.view.apply(event[2], event[3])
+                frame = protocol.encode(game_id, event[2], event[3])
+            else:
+                del self.channels[game_id]
+                frame = protocol.encode(game_id, Actions.EXIT)
+
+            for subscriber in channel.subscribers:
+                subscriber.out += frame
+                if event[0] == 'close':
+                    subscriber.closing = True
+            pending.update(channel.subscribers)
+
+        for subscriber in pending:
+            self.flush(subscriber)
+
+    def flush(self, subscriber: _Subscriber) -> None:
+        """
+        Send as much of the pending output as possible, and wait for the socket to be writable for the rest.
+
+            Parameters:
+                subscriber (_Subscriber): The spectator to send to.
+        """
+        if subscriber.out:
+            try:
+                sent = subscriber.conn.send(subscriber.out)
+                del subscriber.out[:sent]
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self.drop(subscriber)
+                return
+
+        if subscriber.closing and not subscriber.out:
+            self.drop(subscriber)
+            return
+
+        #   the spectator does not keep up with the game, drop it rather than buffering without a bound
+        if len(subscriber.out) > self.max_buffer:
+            self.logger.debug('dropping a slow spectator of game {}'.format(subscriber.game_id))
+            self.dropped += 1
+            self.drop(subscriber)
+            return
+
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if subscriber.out else 0)
+        self.selector.modify(subscriber.conn, events, subscriber)
+
+    def drop(self, subscriber: _Subscriber) -> None:
+        """
+        Disconnect a spectator.
+
+            Parameters:
+                subscriber (_Subscriber): The spectator to disconnect.
+        """
+        channel = self.channels.get(subscriber.game_id)
+        if channel is not None:
+            channel.subscribers.discard(subscriber)
+        self.subscribers.pop(subscriber.conn, None)
+        try:
+            self.selector.unregister(subscriber.conn)
+        except (KeyError, ValueError):
+            pass
+        subscriber.conn.close()
+
+
+class Spectator:
+
+    def __init__(self, host: str, port: int, game_id: int) -> None:
+        """
+        Connect to a spectator server and subscribe to a game.
+
+            Parameters:
+                host (str):     The host of the server.
+                port (int):     The port of the server.
+                game_id (int):  The public id of the game to watch.
+        """
+        self.game_id = game_id
+        self.view = None
+        self.buffer = bytearray()
+        self.conn = socket.create_connection((host, port))
+        self.conn.sendall(protocol.encode(game_id, Actions.SPECTATE))
+
+    def events(self) -> Iterator[Tuple[Actions, int]]:
+        """
+        Receive the events of the game and apply them on the view, until the game or the connection is closed.
+
+            Returns:
+                events (iterator): The action and the value of every event, starting with the SNAPSHOT.
+        """
+        while True:
+            data = self.conn.recv(65536)
+            if not data:
+                return
+            self.buffer += data
+
+            while len(self.buffer) >= protocol.FRAME_SIZE:
+                _, action, value = protocol.FRAME.unpack_from(self.buffer)
+                if Actions.SNAPSHOT.is_equals(action):
+                    if len(self.buffer) < protocol.FRAME_SIZE + value:
+                        break
+                    self.view = GameView.from_snapshot(bytes(self.buffer[protocol.FRAME_SIZE:
+                                                                         protocol.FRAME_SIZE + value]))
+                    del self.buffer[:protocol.FRAME_SIZE + value]
+                else:
+                    del self.buffer[:protocol.FRAME_SIZE]
+                    if self.view is not None:
+                        self.view.apply(action, value)
+
+                yield Actions(action), value
+                if Actions.EXIT.is_equals(action) or Actions.ILLEGAL_DATA.is_equals(action):
+                    return
+
+    def close(self) -> None:
+        """
+        Stop watching.
+        """
+        self.conn.close()
@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import *
+
+#   entry point -> whether it may load a gui toolkit
+ENTRY_POINTS = {
+    'server': True,
+    'client': True,
+    'clientpool': False,
+    'game': False,
+    'ai': False,
+    'tournament': False,
+    'analysis': False,
+    'dataset': False,
+    'bigboard': False,
+    'mux': False,
+    'evaluator': False,
+    'vecenv': False,
+    'utils': False,
+}
+GUI_MODULES = ('tkinter', 'pygame', 'turtle')
+
+#   run in a fresh interpreter, so every measure pays the full import of the module and its dependencies
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'gui': [m for m in {gui} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, repeat: int = 5) -> Optional[Tuple[float, List[str]]]:
+    """
+    Measure the import time of an entry point.
+
+        Parameters:
+            module (str):   The name of the module.
+            repeat (int):   Number of fresh interpreters to measure in, default 5.
+
+        Returns:
+            result (tuple): The median import time in ms and the gui modules it loaded, or None if it failed to import.
+    """
+    folder = os.path.dirname(os.path.abspath(__file__))
+    times, gui = [], []
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, '-c', MEASURE.format(module=module, gui=GUI_MODULES)],
+                                 cwd=folder, capture_output=True, text=True)
+        if process.returncode != 0:
+            return None
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        times.append(result['seconds'] * 1000)
+        gui = result['gui']
+    return statistics.median(times), gui
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='measure the import time of every entry point')
+    parser.add_argument('--repeat', default=5, type=int, help='fresh interpreters per entry point')
+    parser.add_argument('--budget_ms', default=0, type=float,
+                        help='fail if a headless entry point takes longer to import, 0 to disable')
+    args = parser.parse_args()
+
+    failed = False
+    print('{:<12} {:>10}  {}'.format('entry point', 'import ms', 'gui modules'))
+    for module, allows_gui in ENTRY_POINTS.items():
+        result = measure(module, args.repeat)
+        if result is None:
+            print('{:<12} {:>10}  {}'.format(module, '-', 'import failed'))
+            #   a headless module must import anywhere, the gui ones need their toolkit installed
+            if not allows_gui:
+                failed = True
+            continue
+        ms, gui = result
+        print('{:<12} {:>10.1f}  {}'.format(module, ms, ', '.join(gui)))
+
+        #   the headless modules must not pull a gui toolkit, nor creep over the budget
+        if not allows_gui and (gui or 0 < args.budget_ms < ms):
+            failed = True
+
+    sys.exit(1 if failed else 0)
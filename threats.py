@@ -0,0 +1,213 @@
+from typing import *
+
+import numpy as np
+
+import geometry
+
+Cell = Tuple[int, int]
+
+ThreatReport = NamedTuple('ThreatReport', [('wins', Dict[int, List[int]]), ('cells', Dict[int, List[Cell]]),
+                                           ('odd', Dict[int, List[Cell]]), ('even', Dict[int, List[Cell]])])
+
+
+def threat_cells(board: np.ndarray, player: int, geo: geometry.Geometry,
+                 values: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Find the empty cells that complete a line of a player, all the lines are checked at once.
+
+        Parameters:
+            board (np.ndarray):     The board to check.
+            player (int):           The player id to check.
+            geo (Geometry):         The geometry of the board configuration.
+            values (np.ndarray):    The cells of every line of the board, default None to gather them.
+
+        Returns:
+            cells (np.ndarray): The sorted flat indices of the cells.
+    """
+    if values is None:
+        values = np.asarray(board).ravel()[geo.lines]
+    empty = values == 0
+    #   n - 1 pieces of the player and a single empty cell
+    lines = ((values == player).sum(axis=1) == geo.n - 1) & (empty.sum(axis=1) == 1)
+    return np.unique(geo.lines[lines][empty[lines]])
+
+
+def playable_cells(board: np.ndarray) -> np.ndarray:
+    """
+    Get the cell a piece dropped in every column lands on.
+
+        Parameters:
+            board (np.ndarray): The board.
+
+        Returns:
+            cells (np.ndarray): The flat index of the cell per column, -1 for a full column.
+    """
+    rows, cols = board.shape
+    row = rows - 1 - (np.asarray(board) != 0).sum(axis=0)
+    return np.where(row >= 0, row * cols + np.arange(cols), -1)
+
+
+def winning_columns(board: np.ndarray, player: int, geo: geometry.Geometry,
+                    values: Optional[np.ndarray] = None) -> List[int]:
+    """
+    Get the columns that win immediately for a player.
+
+        Parameters:
+            board (np.ndarray):     The board.
+            player (int):           The player id.
+            geo (Geometry):         The geometry of the board configuration.
+            values (np.ndarray):    The cells of every line of the board, default None to gather them.
+
+        Returns:
+            columns (list): The column indices.
+    """
+    if values is None:
+        values = np.asarray(board).ravel()[geo.lines]
+    empty = values == 0
+    lines = ((values == player).sum(axis=1) == geo.n - 1) & (empty.sum(axis=1) == 1)
+    if not lines.any():
+        return []
+    cells = geo.lines[lines][empty[lines]]
+    #   a threat cell is playable when the cell below it is taken, or it is on the bottom row
+    below = cells + geo.cols
+    supported = (below >= board.size) | (np.asarray(board).ravel()[np.minimum(below, board.size - 1)] != 0)
+    return sorted(set((cells[supported] % geo.cols).tolist()))
+
+
+def analyze(board: np.ndarray, n: int) -> ThreatReport:
+    """
+    Find the threats of both players: the columns that win right away, and every empty cell that would complete a
+    line, split by the parity of its row counted from the bottom starting at 1.
+    The first player wants its threats on odd rows and the second one on even rows, a threat of the right parity
+    usually wins the end game.
+
+        Parameters:
+            board (np.ndarray): The board.
+            n (int):            Value for n-in-a-row.
+
+        Returns:
+            report (ThreatReport): The winning columns, threat cells, odd threats and even threats per player.
+    """
+    board = np.asarray(board)
+    rows, cols = board.shape
+    geo = geometry.get_geometry(rows, cols, n)
+
+    wins, cells, odd, even = {}, {}, {}, {}
+    values = board.ravel()[geo.lines]
+    for player in (1, 2):
+        threats = threat_cells(board, player, geo, values)
+        wins[player] = winning_columns(board, player, geo, values)
+        cells[player] = [(int(cell) // cols, int(cell) % cols) for cell in threats]
+        odd[player] = [(r, c) for r, c in cells[player] if (rows - r) % 2 == 1]
+        even[player] = [(r, c) for r, c in cells[player] if (rows - r) % 2 == 0]
+    return ThreatReport(wins, cells, odd, even)
+
+
+def must_block(board: np.ndarray, player: int, n: int) -> List[int]:
+    """
+    Get the columns a player has to play, so the opponent does not win on its next move.
+
+        Parameters:
+            board (np.ndarray): The board.
+            player (int):       The player to move.
+            n (int):            Value for n-in-a-row.
+
+        Returns:
+            columns (list): The winning columns of the opponent.
+    """
+    board = np.asarray(board)
+    geo = geometry.get_geometry(board.shape[0], board.shape[1], n)
+    return winning_columns(board, 1 if player == 2 else 2, geo)
+
+
+def order_columns(board: np.ndarray, player: int, geo: geometry.Geometry, columns: List[int]) -> List[int]:
+    """
+    Order the moves of a search: the winning columns first, then the blocking ones, then the rest in their order.
+
+        Parameters:
+            board (np.ndarray): The board.
+            player (int):       The player to move.
+            geo (Geometry):     The geometry of the board configuration.
+            columns (list):     The columns in their default order.
+
+        Returns:
+            columns (list): The same columns, reordered.
+    """
+    values = np.asarray(board).ravel()[geo.lines]
+    wins = winning_columns(board, player, geo, values)
+    blocks = winning_columns(board, 1 if player == 2 else 2, geo, values)
+    if not wins and not blocks:
+        return columns
+    first = wins + [c for c in blocks if c not in wins]
+    return first + [c for c in columns if c not in first]
+
+
+def forced_win(board: np.ndarray, player: int, n: int, depth: int = 2) -> Optional[List[int]]:
+    """
+    Find a sequence that wins whatever the opponent replies, within a number of moves of the player.
+    Only the threats are searched: once the player has a winning column, the opponent's only replies are to block it.
+
+        Parameters:
+            board (np.ndarray): The board.
+            player (int):       The player to move.
+            n (int):            Value for n-in-a-row.
+            depth (int):        Maximum number of moves of the player, default 2.
+
+        Returns:
+            moves (list): The columns of the player and the longest defense of the opponent, alternately, ending with
+                          the winning move, or None if there is no forced win within the depth.
+    """
+    board = np.array(board, dtype=np.int8)
+    geo = geometry.get_geometry(board.shape[0], board.shape[1], n)
+    return _forced_win(board, player, geo, depth)
+
+
+def _forced_win(board: np.ndarray, player: int, geo: geometry.Geometry, depth: int) -> Optional[List[int]]:
+    wins = winning_columns(board, player, geo)
+    if wins:
+        return [wins[0]]
+    if depth <= 1:
+        return None
+
+    other = 1 if player == 2 else 2
+    playable = playable_cells(board)
+    cols = board.shape[1]
+    for column in order_columns(board, player, geo, sorted(range(cols), key=lambda c: abs(2 * c - (cols - 1)))):
+        cell = playable[column]
+        if cell < 0:
+            continue
+        board.flat[cell] = player
+        line = _defend(board, player, other, geo, depth)
+        board.flat[cell] = 0
+        if line is not None:
+            return [column] + line
+    return None
+
+
+def _defend(board: np.ndarray, player: int, other: int, geo: geometry.Geometry, depth: int) -> Optional[List[int]]:
+    #   a move that lets the opponent win right away, or fills the board, is not a forced win
+    if winning_columns(board, other, geo):
+        return None
+    playable = playable_cells(board)
+    replies = [c for c in range(board.shape[1]) if playable[c] >= 0]
+    if not replies:
+        return None
+
+    wins = winning_columns(board, player, geo)
+    if len(wins) > 1:
+        #   the opponent may block a single threat only
+        return [wins[0], wins[1]]
+    if wins:
+        replies = wins
+
+    longest = None
+    for reply in replies:
+        cell = playable[reply]
+        board.flat[cell] = other
+        line = _forced_win(board, player, geo, depth - 1)
+        board.flat[cell] = 0
+        if line is None:
+            return None
+        if longest is None or len(line) + 1 > len(longest):
+            longest = [reply] + line
+    return longest
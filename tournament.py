@@ -0,0 +1,323 @@
+import argparse
+import collections
+import concurrent.futures
+import functools
+import itertools
+import json
+import logging
+import math
+import os
+import time
+from typing import *
+
+import ai
+from actions import Actions
+from game import Game
+
+Match = NamedTuple('Match', [('match_id', str), ('first', str), ('second', str), ('rows', int), ('cols', int),
+                             ('n', int)])
+
+_pool = None
+
+
+def _remote_pool(server: str):
+    """
+    Get the connection pool of the worker process, creating it on first use.
+
+        Parameters:
+            server (str): The address of the multiplexed server, i.e. '127.0.0.1:1235'.
+
+        Returns:
+            pool (ConnectionPool): The pool of the worker process.
+    """
+    global _pool
+    if _pool is None:
+        from mux import ConnectionPool
+        host, _, port = server.rpartition(':')
+        _pool = ConnectionPool(host, int(port))
+    return _pool
+
+
+def play_match(match: Match, server: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Play a single match between two players, the first player of the match plays first.
+
+        Parameters:
+            match (Match):  The match to play.
+            server (str):   Address of a multiplexed server to play the moves through, default None to play locally.
+
+        Returns:
+            result (dict): The match, its winner (1 or 2, 0 for a tie), number of moves and duration.
+    """
+    start = time.perf_counter()
+    players = {1: ai.create_player(match.first), 2: ai.create_player(match.second)}
+    game = Game((match.rows, match.cols), match.n)
+    remote = _remote_pool(server).open_game(match.rows, match.cols, match.n) if server else None
+
+    result = Actions.CONTINUE
+    while result == Actions.CONTINUE:
+        column = players[game.turn].choose(game.board, game.turn, game.n)
+        result = game.play(column)
+        #   the server is the referee, the local game only keeps the board for the players
+        if remote is not None and remote.play(column) != result:
+            raise RuntimeError('server and local rules disagree on match {}'.format(match.match_id))
+
+    if remote is not None:
+        remote.close()
+
+    result_dict = match._asdict()
+    result_dict['winner'] = game.turn if result == Actions.WIN else 0
+    result_dict['moves'] = len(game.moves)
+    result_dict['seconds'] = time.perf_counter() - start
+    return result_dict
+
+
+def parse_config(config: str) -> Tuple[int, int, int]:
+    """
+    Parse a board configuration of the form ROWSxCOLSxN, i.e. '6x7x4'.
+
+        Parameters:
+            config (str): The configuration string.
+
+        Returns:
+            config (tuple): The rows, columns and n.
+    """
+    rows, cols, n = (int(v) for v in config.lower().split('x'))
+    return rows, cols, n
+
+
+class Tournament:
+
+    def __init__(self, players: List[str], configs: List[Tuple[int, int, int]], workers: Optional[int] = None,
+                 checkpoint: Optional[str] = None, server: Optional[str] = None, k_factor: float = 32) -> None:
+        """
+        Create a new tournament.
+
+            Parameters:
+                players (list):     Specs of the players, see ai.create_player.
+                configs (list):     Board configurations (rows, cols, n) to play on.
+                workers (int):      Number of worker processes, default None for the number of cores.
+                checkpoint (str):   Path of a file to record the results in and resume from, default None.
+                server (str):       Address of a multiplexed server to play through, default None to play locally.
+                k_factor (float):   The Elo K-factor, default 32.
+        """
+        self.players = players
+        self.configs = configs
+        self.workers = workers or os.cpu_count()
+        self.checkpoint = checkpoint
+        self.server = server
+        self.k_factor = k_factor
+        self.logger = logging.getLogger('Tournament')
+
+        self.ratings = {p: 1500.0 for p in players}
+        self.results = collections.OrderedDict()
+
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                for line in f:
+                    if line.strip():
+                        self.record(json.loads(line), save=False)
+            self.logger.info('resumed {} results from {}'.format(len(self.results), checkpoint))
+
+    def record(self, result: Dict[str, Any], save: bool = True) -> None:
+        """
+        Record the result of a match and update the Elo ratings.
+
+            Parameters:
+                result (dict):  The result returned by play_match.
+                save (bool):    Whether to append the result to the checkpoint, default True.
+        """
+        self.results[result['match_id']] = result
+        if save and self.checkpoint:
+            with open(self.checkpoint, 'a') as f:
+                f.write(json.dumps(result) + '\n')
+
+        first, second = result['first'], result['second']
+        score = {1: 1.0, 2: 0.0, 0: 0.5}[result['winner']]
+        expected = 1 / (1 + 10 ** ((self.ratings[second] - self.ratings[first]) / 400))
+        self.ratings[first] += self.k_factor * (score - expected)
+        self.ratings[second] -= self.k_factor * (score - expected)
+
+    def run_matches(self, matches: List[Match]) -> None:
+        """
+        Play all the matches that were not played yet across the worker pool.
+        The largest boards are scheduled first, and each worker takes the next match as soon as it is free,
+        so short matches fill the gaps left by the long ones.
+
+            Parameters:
+                matches (list): The matches to play.
+        """
+        pending = [m for m in matches if m.match_id not in self.results]
+        pending.sort(key=lambda m: m.rows * m.cols, reverse=True)
+        if not pending:
+            return
+
+        start = time.perf_counter()
+        last_report = start
+        moves = 0
+        play = functools.partial(play_match, server=self.server)
+        with concurrent.futures.ProcessPoolExecutor(self.workers) as executor:
+            futures = [executor.submit(play, m) for m in pending]
+            for done, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+                result = future.result()
+                self.record(result)
+                moves += result['moves']
+
+                now = time.perf_counter()
+                if now - last_report >= 5 or done == len(pending):
+                    elapsed = now - start
+                    self.logger.info('{}/{} matches, {:.1f} matches/s, {:.0f} moves/s'.format(
+                        done, len(pending), done / elapsed, moves / elapsed))
+                    last_report = now
+
+    def pair_matches(self, first: str, second: str, games: int, prefix: str) -> List[Match]:
+        """
+        Create the matches between two players on every configuration, alternating the first player.
+
+            Parameters:
+                first (str):    Spec of one player.
+                second (str):   Spec of the other player.
+                games (int):    Number of games per configuration.
+                prefix (str):   Prefix of the match ids.
+
+            Returns:
+                matches (list): The matches.
+        """
+        matches = []
+        for rows, cols, n in self.configs:
+            for g in range(games):
+                a, b = (first, second) if g % 2 == 0 else (second, first)
+                match_id = '{}-{}x{}x{}-{}'.format(prefix, rows, cols, n, g)
+                matches.append(Match(match_id, a, b, rows, cols, n))
+        return matches
+
+    def round_robin(self, games: int = 2) -> None:
+        """
+        Play every pair of players against each other.
+
+            Parameters:
+                games (int): Number of games per pair and configuration, default 2.
+        """
+        matches = []
+        for i, j in itertools.combinations(range(len(self.players)), 2):
+            matches += self.pair_matches(self.players[i], self.players[j], games, 'rr-{}-{}'.format(i, j))
+        self.run_matches(matches)
+
+    def scores(self, match_ids: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """
+        Get the match points of every player, 1 for a win and 0.5 for a tie.
+
+            Parameters:
+                match_ids (list): The matches to count, default None for all the results.
+
+            Returns:
+                scores (dict): Player spec to points.
+        """
+        results = self.results.values() if match_ids is None else (self.results[m] for m in match_ids)
+        scores = {p: 0.0 for p in self.players}
+        for result in results:
+            if result['winner'] == 0:
+                scores[result['first']] += 0.5
+                scores[result['second']] += 0.5
+            else:
+                scores[result['first'] if result['winner'] == 1 else result['second']] += 1
+        return scores
+
+    def swiss(self, rounds: int, games: int = 2) -> None:
+        """
+        Play a Swiss tournament, every round pairs players with similar scores who have not met yet.
+
+            Parameters:
+                rounds (int):   Number of rounds.
+                games (int):    Number of games per pair and configuration, default 2.
+        """
+        index = {p: i for i, p in enumerate(self.players)}
+        met = set()
+        played = []
+        for r in range(rounds):
+            #   only count the previous rounds, so a resumed tournament repeats the same pairings
+            scores = self.scores(played)
+            standing = sorted(self.players, key=lambda p: (-scores[p], index[p]))
+            matches = []
+            while len(standing) > 1:
+                first = standing.pop(0)
+                #   the closest player in the standings that was not met yet, or the closest one if all were met
+                second = next((p for p in standing if (first, p) not in met), standing[0])
+                standing.remove(second)
+                met.update({(first, second), (second, first)})
+                prefix = 'swiss{}-{}-{}'.format(r, index[first], index[second])
+                matches += self.pair_matches(first, second, games, prefix)
+            self.logger.info('round {}'.format(r + 1))
+            self.run_matches(matches)
+            played += [m.match_id for m in matches]
+
+    def bradley_terry(self, iterations: int = 200) -> Dict[str, float]:
+        """
+        Fit Bradley-Terry strengths out of all the results, ties count as half a win for each player.
+        The strengths are reported on the Elo scale, centered at 1500.
+
+            Parameters:
+                iterations (int): Number of minorization-maximization iterations, default 200.
+
+            Returns:
+                ratings (dict): Player spec to rating.
+        """
+        wins = collections.defaultdict(float)
+        games = collections.defaultdict(float)
+        for result in self.results.values():
+            a, b = result['first'], result['second']
+            score = {1: 1.0, 2: 0.0, 0: 0.5}[result['winner']]
+            wins[a] += score
+            wins[b] += 1 - score
+            games[(a, b)] += 1
+            games[(b, a)] += 1
+
+        strength = {p: 1.0 for p in self.players}
+        for _ in range(iterations):
+            for p in self.players:
+                denominator = sum(games[(p, q)] / (strength[p] + strength[q]) for q in self.players if q != p)
+                if denominator > 0:
+                    #   players without a single win keep a small positive strength
+                    strength[p] = max(wins[p], 0.5) / denominator
+            mean = sum(strength.values()) / len(strength)
+            strength = {p: s / mean for p, s in strength.items()}
+
+        return {p: 1500 + 400 * math.log10(s) for p, s in strength.items()}
+
+    def report(self) -> str:
+        """
+        Format the standings table.
+
+            Returns:
+                report (str): The standings, sorted by Elo.
+        """
+        scores = self.scores()
+        bt = self.bradley_terry()
+        lines = ['{:<16} {:>7} {:>8} {:>8}'.format('player', 'points', 'elo', 'bt')]
+        for p in sorted(self.players, key=lambda p: -self.ratings[p]):
+            lines.append('{:<16} {:>7.1f} {:>8.1f} {:>8.1f}'.format(p, scores[p], self.ratings[p], bt[p]))
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play a tournament between AI players.')
+    parser.add_argument('--players', nargs='+', default=['random', 'negamax:2', 'negamax:4'],
+                        help='player specs, i.e. random, negamax:3')
+    parser.add_argument('--configs', nargs='+', default=['6x7x4'], help='board configurations ROWSxCOLSxN')
+    parser.add_argument('--format', default='round_robin', choices=['round_robin', 'swiss'])
+    parser.add_argument('--games', default=2, type=int, help='games per pair and configuration')
+    parser.add_argument('--rounds', default=3, type=int, help='rounds of a swiss tournament')
+    parser.add_argument('--workers', default=None, type=int, help='worker processes, default number of cores')
+    parser.add_argument('--checkpoint', default=None, type=str, help='results file to resume from')
+    parser.add_argument('--server', default=None, type=str, help='play through a multiplexed server HOST:PORT')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)-10s %(levelname)-8s; %(message)s;')
+
+    tournament = Tournament(args.players, [parse_config(c) for c in args.configs], workers=args.workers,
+                            checkpoint=args.checkpoint, server=args.server)
+    if args.format == 'swiss':
+        tournament.swiss(args.rounds, args.games)
+    else:
+        tournament.round_robin(args.games)
+    print(tournament.report())
@@ -0,0 +1,226 @@
+import os
+import socket
+import stat
+import tempfile
+from typing import *
+
+Address = Union[Tuple[str, int], str]
+
+
+def has_local_transport() -> bool:
+    """
+    Check whether the platform supports Unix domain sockets.
+
+        Returns:
+            supported (bool): True if supported, False otherwise.
+    """
+    return hasattr(socket, 'AF_UNIX')
+
+
+def is_owned(info: os.stat_result) -> bool:
+    """
+    Check whether a file belongs to the current user, always True on platforms without users ids.
+
+        Parameters:
+            info (stat_result): The status of the file.
+
+        Returns:
+            owned (bool): True if the file belongs to the current user, False otherwise.
+    """
+    return not hasattr(os, 'getuid') or info.st_uid == os.getuid()
+
+
+def private_dir() -> str:
+    """
+    Get a directory only the current user can access, so other users can not reach the socket files in it.
+    The runtime directory of the user is used when there is one, otherwise a directory per user in the temp folder.
+
+        Returns:
+            path (str): The path of the directory.
+
+        Raises:
+            PermissionError: If the directory belongs to another user or others can access it.
+    """
+    path = os.environ.get('XDG_RUNTIME_DIR')
+    if not path or not os.path.isdir(path):
+        user = os.getuid() if hasattr(os, 'getuid') else os.getlogin()
+        path = os.path.join(tempfile.gettempdir(), 'four_in_a_row-{}'.format(user))
+        os.makedirs(path, mode=0o700, exist_ok=True)
+
+    #   the directory may have been created by someone else before, so it is checked either way
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or not is_owned(info) or stat.S_IMODE(info.st_mode) & 0o077:
+        raise PermissionError('{} is not a private directory'.format(path))
+    return path
+
+
+def local_path(port: int) -> str:
+    """
+    Get the path of the Unix domain socket that serves the clients on the same host.
+
+        Parameters:
+            port (int): The TCP port of the server, so several servers get different paths.
+
+        Returns:
+            path (str): The path of the socket file, in a directory only the current user can access.
+    """
+    return os.path.join(private_dir(), 'four_in_a_row_{}.sock'.format(port))
+
+
+def remove_socket_file(path: str) -> None:
+    """
+    Remove a stale socket file, a file that is not a socket of the current user is never removed.
+
+        Parameters:
+            path (str): The path of the file.
+
+        Raises:
+            FileExistsError: If there is another file at the path.
+    """
+    try:
+        info = os.lstat(path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(info.st_mode) or not is_owned(info):
+        raise FileExistsError('{} is not a socket of the current user'.format(path))
+    os.unlink(path)
+
+
+def create_listener(address: Address) -> socket.socket:
+    """
+    Create a listening socket, a path address is a Unix domain socket and a (host, port) address is TCP.
+
+        Parameters:
+            address (Address): The address to listen on.
+
+        Returns:
+            listener (socket): The listening socket.
+    """
+    if isinstance(address, str):
+        remove_socket_file(address)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        listener = socket.socket()
+    try:
+        listener.bind(address)
+        if isinstance(address, str):
+            #   only the current user may connect, the clients identify with their sequential id alone
+            os.chmod(address, 0o600)
+        listener.listen()
+    except Exception:
+        listener.close()
+        raise
+    return listener
+
+
+def connect(address: Address) -> socket.socket:
+    """
+    Connect to a server, a path address is a Unix domain socket and a (host, port) address is TCP.
+
+        Parameters:
+            address (Address): The address of the server.
+
+        Returns:
+            conn (socket): The connected socket.
+    """
+    if isinstance(address, str):
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        conn = socket.socket()
+    try:
+        conn.connect(address)
+    except Exception:
+        conn.close()
+        raise
+    set_low_latency(conn)
+    return conn
+
+
+def set_low_latency(conn: socket.socket) -> None:
+    """
+    Send the small messages of the game right away instead of waiting to coalesce them, only applies to TCP.
+
+        Parameters:
+            conn (socket): The socket to configure.
+    """
+    if conn.family in (socket.AF_INET, socket.AF_INET6):
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+def describe(conn: socket.socket, peer: bool = True) -> str:
+    """
+    Describe an endpoint of a socket for the logs, 'host:port' for TCP and the path for a Unix domain socket.
+
+        Parameters:
+            conn (socket):  The socket.
+            peer (bool):    Whether to describe the remote endpoint or the local one, default True.
+
+        Returns:
+            name (str): The description of the endpoint.
+    """
+    name = conn.getpeername() if peer else conn.getsockname()
+    if isinstance(name, tuple):
+        return '{}:{}'.format(name[0], name[1])
+    #   one end of a Unix domain socket is unnamed, describe it by the path of the other
+    return 'unix:{}'.format(name or conn.getsockname() or conn.getpeername())
+
+
+def close_listener(listener: socket.socket) -> None:
+    """
+    Close a listening socket, and remove its file if it is a Unix domain socket.
+
+        Parameters:
+            listener (socket): The listening socket.
+    """
+    path = listener.getsockname() if has_local_transport() and listener.family == socket.AF_UNIX else None
+    listener.close()
+    if path:
+        try:
+            remove_socket_file(path)
+        except FileExistsError:
+            pass
+
+
+if __name__ == '__main__':
+    import threading
+    import time
+
+    def benchmark(address: Address, moves: int = 20000) -> float:
+        """
+        Measure the round trip of a move message over a transport.
+
+            Parameters:
+                address (Address):  The address to listen on.
+                moves (int):        Number of round trips, default 20000.
+
+            Returns:
+                round_trip (float): Mean round trip in microseconds.
+        """
+        listener = create_listener(address)
+
+        def echo():
+            conn, _ = listener.accept()
+            set_low_latency(conn)
+            while True:
+                data = conn.recv(1024)
+                if not data:
+                    break
+                conn.send(data)
+            conn.close()
+
+        thread = threading.Thread(target=echo, daemon=True)
+        thread.start()
+        conn = connect(listener.getsockname())
+        start = time.perf_counter()
+        for _ in range(moves):
+            conn.send(b'5')
+            conn.recv(1024)
+        elapsed = time.perf_counter() - start
+        conn.close()
+        thread.join()
+        close_listener(listener)
+        return elapsed / moves * 1e6
+
+    print('tcp  round trip {:.1f}us'.format(benchmark(('127.0.0.1', 0))))
+    if has_local_transport():
+        print('unix round trip {:.1f}us'.format(benchmark(local_path(0))))
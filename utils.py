@@ -5,9 +5,13 @@ import datetime
 import multiprocessing
 import numpy as np
 import socket
+import weakref
 from typing import *
 import os
 
+import geometry
+import profiling
+
 Couple = Union[Tuple[int, int], List[int]]
 
 
@@ -55,6 +59,7 @@ def filter_color(colors_list: List[str], color: str):
     return [c for c in colors_list if c != color]
 
 
+@profiling.timed
 def is_won(board: np.ndarray, target: int, n: Optional[int] = 4) -> bool:
     """
     Check if the target user has n-in-a-row.
@@ -68,90 +73,13 @@ def is_won(board: np.ndarray, target: int, n: Optional[int] = 4) -> bool:
             won (bool): True if there is n-in-a-row, False otherwise.
     """
     #   force to numpy
-    board = np.array(board)
+    board = np.asarray(board)
     if board.ndim != 2:
         return False
 
-    def check_row(row: List[int]) -> bool:
-        """
-        Check if a row has n-in-a-row
-
-            Parameters:
-                row (int): The row to check.
-
-            Returns:
-                won (bool): True if there are n-in-a-row in the specific row.
-        """
-        count = 0
-        #   iterate over the column but the last index
-        for c in range(len(row) - 1):
-            #   if current equals to the next one and to the target, count it, otherwise reset the count
-            if row[c] == target and row[c] == row[c + 1]:
-                count += 1
-            else:
-                count = 0
-
-            #   if matched 'n' values in a row (3 matches means there are 4 values in a row)
-            if count == n - 1:
-                return True
-        return False
-
-    def check_rows(mat: np.ndarray) -> bool:
-        """
-        Check all rows in the board.
-
-            Parameters:
-                mat (np.ndarray): The board to check.
-
-            Returns:
-                won (bool): True if the user has n-in-a-row in one of the rows in the board, False otherwise.
-        """
-        for row in mat:  # iterate over the rows
-            if check_row(row):  # if found a row with n-in-a-row, return true
-                return True
-        return False
-
-    def check_cols(mat: np.ndarray) -> bool:
-        """
-        Check all columns in the board.
-
-            Parameters:
-                mat (np.ndarray): The board to check.
-
-            Returns:
-                won (bool): True if the user has n-in-a-row in one of the columns in the board, False otherwise.
-        """
-        #   transpose the matrix so the columns become rows
-        return check_rows(mat.T)
-
-    def check_diags(mat: np.ndarray) -> bool:
-        """
-        Check all diagonals in the board.
-
-            Parameters:
-                mat (np.ndarray): The board to check.
-
-            Returns:
-                won (bool): True if the user has n-in-a-row in one of the diagonals in the board, False otherwise.
-        """
-        # gets the diagonals as lists so each can be checked as a row, only diagonals with 'n' or more elements will
-        # be checked i.e. for n=4, rows=6   -> need to search from diagonal (-2) up to diagonal (6) so each will
-        # include at least 4 values
-
-        #   calculate the min and max diagonal to check
-        rows, cols = mat.shape
-        min_diag = n - rows
-        max_diag = cols - n
-
-        #   in order to check diagonals in both direction, iterate the original board and the vertically flipped board
-        for b in [mat, np.flip(mat, axis=1)]:
-            for offset in range(min_diag, max_diag + 1):
-                diag = np.diagonal(b, offset=offset)
-                if check_row(diag):
-                    return True
-        return False
-
-    return check_rows(board) or check_cols(board) or check_diags(board)
+    #   every winning line of the configuration is precomputed once, so a check is a single indexing operation
+    rows, cols = board.shape
+    return geometry.get_geometry(rows, cols, n).is_won(board, target)
 
 
 def is_board_full(board: np.ndarray) -> bool:
@@ -167,9 +95,11 @@ def is_board_full(board: np.ndarray) -> bool:
     return not np.any(board == 0)
 
 
+@profiling.timed
 def add_piece(board: np.ndarray, col: int, turn: int) -> Union[np.ndarray, object]:
     """
     Adds a piece in a given column if not column is not full and return the new board.
+    The given board is left untouched, so it can be shared with searches and the undo history.
 
         Parameters:
             board (list of list):   The board to add the piece on.
@@ -183,15 +113,13 @@ def add_piece(board: np.ndarray, col: int, turn: int) -> Union[np.ndarray, objec
     if not cols > col >= 0:
         return None
 
-    #   flip the board so it will be checked from top to bottom
-    flipped_board = np.flip(board, 0)
-    for r in range(rows):
-        if flipped_board[r, col] == 0:
-            flipped_board[r, col] = turn
-            break
+    #   find the lowest empty row of the column
+    empty_rows = np.flatnonzero(board[:, col] == 0)
+    if empty_rows.size == 0:
+        return board
 
-    #   flip the board back to suit fot the game
-    board = np.flip(flipped_board, 0)
+    board = board.copy()
+    board[empty_rows[-1], col] = turn
     return board
 
 
@@ -214,6 +142,74 @@ def is_valid_location(loc: int, board: np.ndarray) -> bool:
     return False
 
 
+#   seconds between the heartbeats of an idle client, the server reaps a connection after missing a few of them
+HEARTBEAT_INTERVAL = 5
+#   every message of a game connection ends with it, so messages that arrive together are still read one by one
+DELIMITER = b'\n'
+
+_buffers = weakref.WeakKeyDictionary()  # socket -> bytes received after its last complete message
+
+
+def send_data(conn: socket.socket, data: Any) -> None:
+    """
+    Send a single message on a given socket.
+
+        Parameters:
+            conn (socket):  The socket to send the message on.
+            data (object):  The message, sent as its string.
+    """
+    conn.sendall(bytes(str(data), 'utf8') + DELIMITER)
+
+
+def push_data(conn: socket.socket, data: bytes) -> None:
+    """
+    Keep data that was received on a given socket outside of read_data, so it reads it first.
+
+        Parameters:
+            conn (socket):  The socket the data was received on.
+            data (bytes):   The data.
+    """
+    _buffers[conn] = data + _buffers.get(conn, b'')
+
+
+def read_data(conn: socket.socket, timeout: Optional[float] = None) -> bytes:
+    """
+    Receive a single message on a given socket, telling a timeout apart from a closed connection.
+    The data received after the message is kept for the next call.
+
+        Parameters:
+            conn (socket):      The sockets to receive data on.
+            timeout: (float):   Amount of time to wait for a timeout, default None.
+
+        Returns:
+            data (bytes): The message that was received from the socket, without its delimiter.
+
+        Raises:
+            TimeoutError:       If no data was received in time, the connection is still usable.
+            ConnectionError:    If the connection was closed or failed.
+    """
+    buffer = _buffers.get(conn, b'')
+    try:
+        while DELIMITER not in buffer:
+            try:
+                conn.settimeout(timeout)
+                data = conn.recv(1024)
+            except socket.timeout:
+                raise TimeoutError('no data in {} seconds'.format(timeout))
+            except OSError as e:
+                raise ConnectionError(str(e))
+            if not data:
+                raise ConnectionError('connection closed')
+            buffer += data
+    finally:
+        #   a message that was partly received is completed by the next call
+        _buffers[conn] = buffer
+
+    data, _, _buffers[conn] = buffer.partition(DELIMITER)
+    return data
+
+
+@profiling.timed
 def wait_for_data(conn: socket.socket, timeout: Optional[float] = None) -> Union[bytes, object]:
     """
     Wait to receive data on a given socket.
@@ -226,13 +222,9 @@ def wait_for_data(conn: socket.socket, timeout: Optional[float] = None) -> Union
             data (object):      The data that was received from the socket or None for error or no data received.
     """
     try:
-        conn.settimeout(timeout)
-        data = conn.recv(1024)
-        if not data:
-            return None
-    except Exception as e:
+        return read_data(conn, timeout)
+    except (TimeoutError, ConnectionError):
         return None
-    return data
 
 
 def logger_listener(queue: multiprocessing.Queue, log_level: int):
@@ -0,0 +1,150 @@
+from typing import *
+
+import numpy as np
+
+import geometry
+
+
+class VecEnv:
+
+    def __init__(self, num_envs: int, size: Tuple[int, int] = (6, 7), n: int = 4) -> None:
+        """
+        Create a batch of games that are all stepped together with a single vector of columns.
+        The rules are the ones the server enforces: a column that is out of the board or full is an illegal location,
+        the board is left untouched and the same player has to play again.
+
+            Parameters:
+                num_envs (int): Number of games in the batch.
+                size (tuple):   The size of the boards, default (6, 7).
+                n (int):        Value for n-in-a-row, default 4.
+        """
+        self.num_envs = num_envs
+        self.rows, self.cols = size
+        self.n = n
+        self.num_cells = self.rows * self.cols
+
+        geo = geometry.get_geometry(self.rows, self.cols, n)
+
+        #   every board has one extra cell that always stays empty, lines padding points at it
+        self.cells = np.zeros((num_envs, self.num_cells + 1), dtype=np.int8)
+        self.boards = self.cells[:, :self.num_cells].reshape(num_envs, self.rows, self.cols)
+        self.heights = np.zeros((num_envs, self.cols), dtype=np.intp)
+        self.turns = np.ones(num_envs, dtype=np.int8)
+        self.counts = np.zeros(num_envs, dtype=np.intp)
+
+        #   the lines through each cell, padded with a line made only of the empty extra cell
+        max_degree = max(len(c) for c in geo.cell_lines)
+        self.lines = np.vstack([geo.lines, np.full((1, n), self.num_cells, dtype=np.intp)])
+        self.cell_lines = np.full((self.num_cells, max_degree), geo.num_lines, dtype=np.intp)
+        for cell, lines in enumerate(geo.cell_lines):
+            self.cell_lines[cell, :len(lines)] = lines
+
+        #   results, overwritten by every step
+        self.rewards = np.zeros(num_envs, dtype=np.float32)
+        self.dones = np.zeros(num_envs, dtype=bool)
+        self.legal = np.ones((num_envs, self.cols), dtype=bool)
+        self.illegal = np.zeros(num_envs, dtype=bool)
+
+        #   scratch buffers, so a step does not allocate
+        self._env_offsets = np.arange(num_envs, dtype=np.intp)
+        self._height_offsets = self._env_offsets * self.cols
+        self._cell_offsets = (self._env_offsets * (self.num_cells + 1))[:, None, None]
+        self._columns = np.zeros(num_envs, dtype=np.intp)
+        self._index = np.zeros(num_envs, dtype=np.intp)
+        self._height = np.zeros(num_envs, dtype=np.intp)
+        self._cell = np.zeros(num_envs, dtype=np.intp)
+        self._value = np.zeros(num_envs, dtype=np.int8)
+        self._mask = np.zeros(num_envs, dtype=bool)
+        self._flag = np.zeros(num_envs, dtype=bool)
+        self._other = np.zeros(num_envs, dtype=np.int8)
+        self._env_lines = np.zeros((num_envs, max_degree), dtype=np.intp)
+        self._line_cells = np.zeros((num_envs, max_degree, n), dtype=np.intp)
+        self._line_values = np.zeros((num_envs, max_degree, n), dtype=np.int8)
+        self._line_equal = np.zeros((num_envs, max_degree, n), dtype=bool)
+        self._line_won = np.zeros((num_envs, max_degree), dtype=bool)
+
+    def reset(self) -> np.ndarray:
+        """
+        Reset all the games.
+
+            Returns:
+                boards (np.ndarray): The boards of shape (num_envs, rows, cols).
+        """
+        self.cells.fill(0)
+        self.heights.fill(0)
+        self.turns.fill(1)
+        self.counts.fill(0)
+        self.legal.fill(True)
+        return self.boards
+
+    def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Play one column in every game, for the player whose turn it is in that game.
+        Finished games are reset in place, so the boards always hold playable positions.
+        The returned arrays are reused and overwritten by the next step.
+
+            Parameters:
+                actions (np.ndarray): The column to play in every game.
+
+            Returns:
+                rewards (np.ndarray):   1 for the player that played if it won, 0 otherwise.
+                dones (np.ndarray):     True for the games that ended by a win or a tie, and were reset.
+                legal (np.ndarray):     Legal columns mask of shape (num_envs, cols), after the step and the resets.
+                illegal (np.ndarray):   True for the games where the column was an illegal location.
+        """
+        actions = np.asarray(actions)
+        valid, columns, height, cell, value = self._mask, self._columns, self._height, self._cell, self._value
+
+        #   a legal location is in the board and its column is not full
+        np.clip(actions, 0, self.cols - 1, out=columns)
+        np.add(self._height_offsets, columns, out=self._index)
+        np.take(self.heights, self._index, out=height)
+        np.equal(actions, columns, out=valid)
+        np.less(height, self.rows, out=self.illegal)
+        np.logical_and(valid, self.illegal, out=valid)
+        np.logical_not(valid, out=self.illegal)
+
+        #   drop the pieces, the games with an illegal location write back their current cell value
+        np.subtract(self.rows - 1, height, out=cell)
+        np.maximum(cell, 0, out=cell)
+        np.multiply(cell, self.cols, out=cell)
+        np.add(cell, columns, out=cell)
+        np.add(height, valid, out=height)
+        np.put(self.heights, self._index, height)
+        np.add(self.counts, valid, out=self.counts)
+
+        np.add(cell, self._cell_offsets[:, 0, 0], out=self._index)
+        np.take(self.cells, self._index, out=value)
+        np.copyto(value, self.turns, where=valid)
+        np.put(self.cells, self._index, value)
+
+        #   check only the lines through the new pieces
+        np.take(self.cell_lines, cell, axis=0, out=self._env_lines)
+        np.take(self.lines, self._env_lines, axis=0, out=self._line_cells)
+        np.add(self._line_cells, self._cell_offsets, out=self._line_cells)
+        np.take(self.cells, self._line_cells, out=self._line_values)
+        np.equal(self._line_values, self.turns[:, None, None], out=self._line_equal)
+        np.all(self._line_equal, axis=2, out=self._line_won)
+        np.any(self._line_won, axis=1, out=self.dones)
+        np.logical_and(self.dones, valid, out=self.dones)
+        self.rewards[:] = self.dones
+
+        #   a full board is a tie
+        np.equal(self.counts, self.num_cells, out=self._flag)
+        np.logical_and(self._flag, valid, out=self._flag)
+        np.logical_or(self.dones, self._flag, out=self.dones)
+
+        #   pass the turn in the games that continue
+        np.subtract(3, self.turns, out=self._other)
+        np.logical_not(self.dones, out=self._flag)
+        np.logical_and(valid, self._flag, out=valid)
+        np.copyto(self.turns, self._other, where=valid)
+
+        if self.dones.any():
+            self.cells[self.dones] = 0
+            self.heights[self.dones] = 0
+            self.turns[self.dones] = 1
+            self.counts[self.dones] = 0
+
+        np.less(self.heights, self.rows, out=self.legal)
+        return self.rewards, self.dones, self.legal, self.illegal
@@ -0,0 +1,158 @@
+import functools
+from typing import *
+
+import numpy as np
+
+#   part of the seed of every table, changing it changes all the keys
+SEED = 0x4F1A5EED
+
+
+class ZobristTable:
+
+    def __init__(self, rows: int, cols: int) -> None:
+        """
+        Create the random keys of a board size, generated deterministically from the size so the keys are stable
+        across processes and restarts. Use get_table to share a single instance per size.
+
+            Parameters:
+                rows (int): Number of rows.
+                cols (int): Number of columns.
+        """
+        self.rows = rows
+        self.cols = cols
+
+        rng = np.random.default_rng([SEED, rows, cols])
+        #   one key per player and cell, player 1 is index 0
+        self.keys = rng.integers(0, 2 ** 64, size=(2, rows * cols), dtype=np.uint64, endpoint=False)
+        self.side = int(rng.integers(0, 2 ** 64, dtype=np.uint64, endpoint=False))
+
+        #   the key of a cell in the left-right mirrored board
+        mirrored_cells = (np.arange(rows)[:, None] * cols + (cols - 1 - np.arange(cols))[None, :]).ravel()
+        self.mirror_keys = self.keys[:, mirrored_cells]
+
+        self.keys.setflags(write=False)
+        self.mirror_keys.setflags(write=False)
+
+        #   python ints are faster than numpy scalars for the incremental updates
+        self.keys_list = [[int(k) for k in player_keys] for player_keys in self.keys]
+        self.mirror_keys_list = [[int(k) for k in player_keys] for player_keys in self.mirror_keys]
+
+    def cell_keys(self, row: int, col: int, player: int) -> Tuple[int, int]:
+        """
+        Get the keys to toggle when a player's piece is added to or removed from a cell.
+
+            Parameters:
+                row (int):      The row of the cell.
+                col (int):      The column of the cell.
+                player (int):   The player id of the piece.
+
+            Returns:
+                keys (tuple): The key and the mirrored key.
+        """
+        cell = row * self.cols + col
+        return self.keys_list[player - 1][cell], self.mirror_keys_list[player - 1][cell]
+
+    def hash_board(self, board: np.ndarray) -> Tuple[int, int]:
+        """
+        Compute the keys of a whole board from scratch.
+
+            Parameters:
+                board (np.ndarray): The board to hash.
+
+            Returns:
+                keys (tuple): The key and the mirrored key.
+        """
+        cells = np.asarray(board).ravel()
+        key, mirror = np.uint64(0), np.uint64(0)
+        for player in (1, 2):
+            taken = cells == player
+            if taken.any():
+                key ^= np.bitwise_xor.reduce(self.keys[player - 1][taken])
+                mirror ^= np.bitwise_xor.reduce(self.mirror_keys[player - 1][taken])
+        return int(key), int(mirror)
+
+
+@functools.lru_cache(maxsize=None)
+def get_table(rows: int, cols: int) -> ZobristTable:
+    """
+    Get the keys table of a board size, created once per process.
+
+        Parameters:
+            rows (int): Number of rows.
+            cols (int): Number of columns.
+
+        Returns:
+            table (ZobristTable): The table of the size.
+    """
+    return ZobristTable(rows, cols)
+
+
+def canonical(key: int, mirror: int) -> int:
+    """
+    Get the key shared by a position and its left-right mirror.
+
+        Parameters:
+            key (int):      The key of the position.
+            mirror (int):   The mirrored key of the position.
+
+        Returns:
+            key (int): The canonical key.
+    """
+    return min(key, mirror)
+
+
+class ZobristHash:
+
+    def __init__(self, rows: int, cols: int) -> None:
+        """
+        Maintain the 64 bits key of a board, and the key of its mirror, incrementally along its moves.
+
+            Parameters:
+                rows (int): Number of rows.
+                cols (int): Number of columns.
+        """
+        self.table = get_table(rows, cols)
+        self.key = 0
+        self.mirror = 0
+        self.history = []
+
+    @property
+    def canonical(self) -> int:
+        """
+        The key shared by the position and its left-right mirror.
+        """
+        return canonical(self.key, self.mirror)
+
+    def push(self, row: int, col: int, player: int) -> None:
+        """
+        Update the keys after a piece was added.
+
+            Parameters:
+                row (int):      The row of the new piece.
+                col (int):      The column of the new piece.
+                player (int):   The player id of the new piece.
+        """
+        self.history.append((self.key, self.mirror))
+        key, mirror = self.table.cell_keys(row, col, player)
+        self.key ^= key
+        self.mirror ^= mirror
+
+    def pop(self) -> bool:
+        """
+        Restore the keys from before the last added piece.
+
+            Returns:
+                performed (bool): True if there was a piece to remove, False otherwise.
+        """
+        if not self.history:
+            return False
+        self.key, self.mirror = self.history.pop()
+        return True
+
+    def reset(self) -> None:
+        """
+        Reset the keys to the empty board.
+        """
+        self.key = 0
+        self.mirror = 0
+        self.history = []